@@ -10,6 +10,7 @@ from dask_geomodeling.geometry import *
 from dask_geomodeling.geometry.aggregate import AggregateRaster
 from dask_geomodeling.geometry.base import GetSeriesBlock, SetSeriesBlock
 from oauth2client.service_account import ServiceAccountCredentials
+from spiceup_labels.config_lizard import labelparameter_blocks
 
 labeltype_uuid = "lizard_uuid"  # e.g. "3d77fb10-1a2c-40ef-8396-f2bc2cd638e1"
 
@@ -81,25 +82,10 @@ labeled_parcels = {
         "geometry",
     ]
 }
-add_to = "parcels"
-for lp in labelparams:
-    if lp == labelparams[-1]:
-        key = "parcels_labeled"
-    else:
-        key = f"parcels_add_{lp}"
-
-    labeled_parcels[key] = [
-        "geoblocks.geometry.sources.AddDjangoFields",
-        add_to,
-        "lizard_nxt",
-        "labelparameter",
-        {"label_type__uuid": "3ab1addf-00e5-47b0-849e-ba55cd3024b9", "name": lp},
-        {"object_id": "object_id"},
-        {"value": lp},
-        "start",
-        "end",
-    ]
-    add_to = key
+# a chain of AddDjangoFields blocks, one join per labelparameter
+labeled_parcels.update(
+    labelparameter_blocks(labelparams, "3ab1addf-00e5-47b0-849e-ba55cd3024b9")
+)
 
 fertilizer_ids_dict = {
     1: ["seriesblock_numeric_1", "seriesblock_numeric_2", "seriesblock_numeric_3"]  # ,
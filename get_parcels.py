@@ -5,20 +5,19 @@ Created on Tue Feb 16 14:55:08 2021
 @author: martijn.krol
 """
 
+import os
 import requests
 import numpy as np
 import pandas as pd
 import geopandas as gpd
-import localsecret
 from shapely.geometry import Point
+from spiceup_labels.lizard_api import lizard_headers
 
-LOGIN = {
-    "username": localsecret.username,
-    "password": localsecret.password,
-    "Content-Type": "application/json",
-}
+LOGIN = lizard_headers()  # credentials from localsecret
 
-baseurl = "https://demo.lizard.net/api/v3/parcels/?in_bbox=103.8,-6.03,119.2,5.4"
+# Lizard, or a local stand-in (see spiceup_labels.server) when LIZARD_URL is set
+lizard_url = os.environ.get("LIZARD_URL", "https://demo.lizard.net")
+baseurl = f"{lizard_url}/api/v3/parcels/?in_bbox=103.8,-6.03,119.2,5.4"
 
 r = requests.get(baseurl, headers=LOGIN)
 
@@ -34,7 +34,20 @@ setup(
             "run-spiceup-labels-warning = spiceup_labels.patch_warning_based_tasks:main",
             "run-spiceup-labels-weather = spiceup_labels.patch_weather_labeltype:main",
             "run-spiceup-labels-startup = spiceup_labels.patch_weather_startup_labeltype:main",
-            "run-spiceup-labels-pd = spiceup_labels.patch_pd_risk_labeltype:main"
+            "run-spiceup-labels-pd = spiceup_labels.patch_pd_risk_labeltype:main",
+            "run-spiceup-labels-change-feed = spiceup_labels.change_feed:main",
+            "run-spiceup-labels-backfill = spiceup_labels.backfill:main",
+            "run-spiceup-labels-grid = spiceup_labels.raster_grid:main",
+            "run-spiceup-labels-shards = spiceup_labels.sharding:main",
+            "run-spiceup-labels-features = spiceup_labels.feature_store:main",
+            "run-spiceup-labels-snapshot = spiceup_labels.snapshots:main",
+            "run-spiceup-labels-server = spiceup_labels.server:main",
+            "run-spiceup-labels-loadtest = spiceup_labels.loadtest:main",
+            "run-spiceup-labels-fetch = spiceup_labels.async_client:main",
+            "run-spiceup-labels-scheduler = spiceup_labels.scheduler:main",
+            "run-spiceup-labels-summary = spiceup_labels.zonal_summary:main",
+            "run-spiceup-labels-sweep = spiceup_labels.sweep:main",
+            "run-spiceup-labels-profile = spiceup_labels.profiler:main",
         ]
     },
 )
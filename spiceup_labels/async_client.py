@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Fetch computed labels for many parcels concurrently (asyncio, aiohttp).
+
+For the B2B dashboard, labels of thousands of parcels are fetched from the
+labeltype compute endpoint. Requests (a batch of parcel ids each) share a
+connection pool and at most `concurrency` are in flight. Failed requests
+(connection errors, 429 and 5xx responses) are retried with exponential,
+jittered backoff. Results are streamed to a label table (Parquet, Arrow or
+NDJSON, see spiceup_labels.label_writer) as they arrive.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+
+import pandas as pd
+
+from spiceup_labels.label_writer import open_writer
+from spiceup_labels.lizard_api import LIZARD_URL, lizard_headers
+from spiceup_labels.loadtest import parse_object_ids
+
+logger = logging.getLogger(__name__)
+
+COMPUTE_URL = "{base_url}/api/v3/labeltypes/{uuid}/compute/"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def _import_aiohttp():
+    try:
+        import aiohttp
+    except ImportError:  # pragma: no cover
+        raise ImportError("The async label client needs aiohttp")
+    return aiohttp
+
+
+def backoff_delay(attempt, backoff=0.5, maximum=30.0):
+    """Full jitter exponential backoff: uniform up to backoff * 2 ** attempt"""
+    return random.uniform(0, min(maximum, backoff * 2**attempt))
+
+
+async def _fetch_batch(session, url, params, retries, backoff):
+    aiohttp = _import_aiohttp()
+    for attempt in range(retries + 1):
+        try:
+            async with session.get(url, params=params) as response:
+                if response.status not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return (await response.json())["results"]
+                retry_after = response.headers.get("Retry-After")
+                error = f"status {response.status}"
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            retry_after, error = None, repr(e)
+        if attempt == retries:
+            raise RuntimeError(
+                f"{url} {params} failed after {retries} retries: {error}"
+            )
+        delay = backoff_delay(attempt, backoff)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        logger.debug("retry %s in %.2f s: %s", attempt + 1, delay, error)
+        await asyncio.sleep(delay)
+
+
+async def fetch_labels(
+    labeltype_uuid,
+    object_ids,
+    base_url=LIZARD_URL,
+    headers=None,
+    batch_size=50,
+    concurrency=16,
+    retries=4,
+    backoff=0.5,
+    time=None,
+    timeout=60,
+):
+    """Yield label tables (DataFrames indexed by object_id) per batch of
+    object_ids, in the order they are fetched"""
+    aiohttp = _import_aiohttp()
+    url = COMPUTE_URL.format(base_url=base_url, uuid=labeltype_uuid)
+    object_ids = list(object_ids)
+    batches = [
+        object_ids[first : first + batch_size]
+        for first in range(0, len(object_ids), batch_size)
+    ]
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def fetch(session, batch):
+        params = {"object_id": ",".join(map(str, batch))}
+        if time is not None:
+            params["time"] = str(time)
+        async with semaphore:
+            return await _fetch_batch(session, url, params, retries, backoff)
+
+    async with aiohttp.ClientSession(
+        headers=headers, connector=connector, timeout=client_timeout
+    ) as session:
+        tasks = [asyncio.ensure_future(fetch(session, batch)) for batch in batches]
+        try:
+            for task in asyncio.as_completed(tasks):
+                results = await task
+                if results:
+                    yield pd.DataFrame(results).set_index("object_id")
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+async def write_fetched_labels(path, labeltype_uuid, object_ids, **kwargs):
+    """Stream the labels of object_ids to path, return the row count"""
+    with open_writer(path) as writer:
+        async for table in fetch_labels(labeltype_uuid, object_ids, **kwargs):
+            writer.write(table)
+    return writer.rows
+
+
+def get_parser():
+    """Return argument parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("labeltype", help="labeltype uuid")
+    parser.add_argument("object_ids", help="parcel ids, e.g. 1-5000 or 1,2,3")
+    parser.add_argument("output", help="label table (.parquet, .arrow, .ndjson)")
+    parser.add_argument("-u", "--url", default=LIZARD_URL, help="Lizard url")
+    parser.add_argument("-t", "--time", default=None, help="time (default now)")
+    parser.add_argument("-b", "--batch-size", type=int, default=50)
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-r", "--retries", type=int, default=4)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        dest="verbose",
+        default=False,
+        help="Verbose output",
+    )
+    return parser
+
+
+def main():  # pragma: no cover
+    """Fetch computed labels of many parcels and write them to a file"""
+    options = get_parser().parse_args()
+    log_level = logging.DEBUG if options.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(levelname)s: %(message)s")
+    rows = asyncio.run(
+        write_fetched_labels(
+            options.output,
+            options.labeltype,
+            parse_object_ids(options.object_ids),
+            base_url=options.url,
+            headers=lizard_headers(),
+            batch_size=options.batch_size,
+            concurrency=options.concurrency,
+            retries=options.retries,
+            time=options.time,
+        )
+    )
+    logger.info("%s labels written to %s", rows, options.output)
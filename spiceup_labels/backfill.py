@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""Backfill historical labels, resumable after interruption.
+
+The work (all parcels x all days) is split into units of a date range and a
+parcel partition. Each unit is evaluated in one vectorized pass (see
+spiceup_labels.timeline) and written to its own label table in the output
+directory. Completed units are recorded in a checkpoint manifest
+(manifest.json), so a rerun skips them and continues where it stopped. The
+manifest also records the run (labeltype source, parcels, date range, days
+and partitions) the units belong to: a rerun with other settings is refused.
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from spiceup_labels.label_writer import write_labels
+from spiceup_labels.local_data import (
+    read_labelparameters,
+    read_parcels,
+    read_rasters,
+    read_source,
+)
+from spiceup_labels.manifest import load_manifest, manifest_path, write_manifest
+from spiceup_labels.result_cache import graph_hash
+from spiceup_labels.timeline import evaluate_date_range
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_units(start, end, days, parcels, partitions):
+    """Yield (unit id, dates, parcels) units covering start up to end"""
+    if days < 1 or partitions < 1:
+        raise ValueError(
+            f"days ({days}) and partitions ({partitions}) must be at least 1"
+        )
+    dates = pd.date_range(start, end, freq="D")
+    dates = dates[dates < pd.Timestamp(end)]
+    object_ids = np.sort(parcels.index.to_numpy())
+    parts = np.array_split(object_ids, min(partitions, max(len(object_ids), 1)))
+    for first in range(0, len(dates), days):
+        unit_dates = dates[first : first + days]
+        for n, part in enumerate(parts, 1):
+            unit_id = "{:%Y%m%d}-{:%Y%m%d}-p{:04d}of{:04d}".format(
+                unit_dates[0], unit_dates[-1], n, len(parts)
+            )
+            yield unit_id, unit_dates, parcels.loc[part]
+
+
+def parcels_hash(parcels):
+    """Hash of the object ids of parcels"""
+    object_ids = np.sort(parcels.index.to_numpy(dtype="int64"))
+    return hashlib.sha256(object_ids.tobytes()).hexdigest()
+
+
+def backfill_run(source, parcels, start, end, days, partitions):
+    """The settings of a backfill run, which its unit ids depend on"""
+    return {
+        "source_hash": graph_hash(source),
+        "parcels_hash": parcels_hash(parcels),
+        "start": pd.Timestamp(start).isoformat(),
+        "end": pd.Timestamp(end).isoformat(),
+        "days": days,
+        "partitions": partitions,
+    }
+
+
+def read_manifest(output_dir, run):
+    """Checkpoint manifest of output_dir, a new one if it does not exist.
+
+    run is the backfill_run the manifest should belong to."""
+    manifest = load_manifest(output_dir)
+    if manifest is None:
+        return {**run, "units": {}}
+    other = sorted(key for key, value in run.items() if manifest.get(key) != value)
+    if other:
+        raise ValueError(
+            f"{manifest_path(output_dir)} belongs to another backfill "
+            f"({', '.join(other)} differ), use a new output dir"
+        )
+    return manifest
+
+
+def backfill(
+    source,
+    parcels,
+    start,
+    end,
+    output_dir,
+    days=30,
+    partitions=1,
+    extension=".parquet",
+    **kwargs,
+):
+    """Evaluate and write all units that are not in the manifest yet.
+
+    kwargs (labelparameters, rasters) are passed to evaluate. Returns the
+    manifest."""
+    units = list(backfill_units(start, end, days, parcels, partitions))
+    os.makedirs(output_dir, exist_ok=True)
+    run = backfill_run(source, parcels, start, end, days, partitions)
+    manifest = read_manifest(output_dir, run)
+    for number, (unit_id, dates, unit_parcels) in enumerate(units, 1):
+        filename = unit_id + extension
+        if unit_id in manifest["units"] and os.path.exists(
+            os.path.join(output_dir, filename)
+        ):
+            continue
+        logger.info("unit %s/%s: %s", number, len(units), unit_id)
+        labels = evaluate_date_range(source, unit_parcels, dates, **kwargs)
+        path = os.path.join(output_dir, filename)
+        tmp_path = os.path.join(output_dir, "tmp_" + filename)
+        rows = write_labels([labels], tmp_path)
+        os.replace(tmp_path, path)
+        manifest["units"][unit_id] = {"file": filename, "rows": rows}
+        write_manifest(output_dir, manifest)
+    return manifest
+
+
+def get_parser():
+    """Return argument parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("source", help="labeltype source (.json)")
+    parser.add_argument("parcels", help="parcels (.shp, .geojson, .csv, .parquet)")
+    parser.add_argument("start", help="first date, e.g. 2019-01-01")
+    parser.add_argument("end", help="end date (exclusive), e.g. 2021-01-01")
+    parser.add_argument("output_dir", help="directory for labels and manifest")
+    parser.add_argument(
+        "-l", "--labelparameters", default=None, help="labelparameters (.csv)"
+    )
+    parser.add_argument(
+        "-r", "--rasters", default=None, help="raster stand-ins per uuid (.json)"
+    )
+    parser.add_argument(
+        "-d", "--days", type=int, default=30, help="days per unit (default 30)"
+    )
+    parser.add_argument(
+        "-p", "--partitions", type=int, default=1, help="parcel partitions"
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        default=".parquet",
+        choices=[".parquet", ".arrow", ".ndjson"],
+        help="label table format",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        dest="verbose",
+        default=False,
+        help="Verbose output",
+    )
+    return parser
+
+
+def main():  # pragma: no cover
+    """Backfill labels of a labeltype source for a date range"""
+    options = get_parser().parse_args()
+    log_level = logging.DEBUG if options.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(levelname)s: %(message)s")
+    labelparameters = None
+    if options.labelparameters:
+        labelparameters = read_labelparameters(options.labelparameters)
+    manifest = backfill(
+        read_source(options.source),
+        read_parcels(options.parcels),
+        options.start,
+        options.end,
+        options.output_dir,
+        days=options.days,
+        partitions=options.partitions,
+        extension=options.format,
+        labelparameters=labelparameters,
+        rasters=read_rasters(options.rasters) if options.rasters else None,
+    )
+    logger.info("backfill complete: %s units", len(manifest["units"]))
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""Diff today's computed labels against yesterday's snapshot.
+
+Farmers only need a notification when their (warning based or calendar) task
+actually changes. Instead of comparing full tables, a snapshot keeps one hash
+per parcel and column. The change feed lists per parcel the changed columns
+and their new values, so push notifications and dashboards process deltas.
+"""
+
+import argparse
+import logging
+
+import numpy as np
+import pandas as pd
+import simplejson
+
+from spiceup_labels.label_writer import read_labels
+
+logger = logging.getLogger(__name__)
+
+
+def _type_tag(value):
+    """Type of a value for hashing: missing, number, bool, str, or its type"""
+    if isinstance(value, (bool, np.bool_)):
+        return "bool"
+    if value is None or (np.ndim(value) == 0 and pd.isna(value)):
+        return "missing"
+    if isinstance(value, (int, float, np.number)):
+        return "number"
+    return "str" if isinstance(value, str) else type(value).__name__
+
+
+def hash_column(values):
+    """Hash values with their type, so None and "None" differ. Numbers hash
+    by value (int16 2001 equals float 2001.0) and missing values (None, NaN)
+    are equal."""
+    values = np.asarray(values)
+    if values.dtype.kind in "iuf":
+        numbers = values.astype("float64")
+        tags = np.where(np.isnan(numbers), "missing", "number").astype(object)
+    elif values.dtype.kind == "b":
+        numbers = values.astype("float64")
+        tags = np.full(len(values), "bool", dtype=object)
+    else:
+        tags = np.array([_type_tag(value) for value in values], dtype=object)
+        numbers = np.full(len(values), np.nan)
+        is_number = (tags == "number") | (tags == "bool")
+        numbers[is_number] = values[is_number].astype("float64")
+    hashes = pd.util.hash_array(numbers, categorize=False)
+    other = ~np.isin(tags, ["number", "bool", "missing"])
+    if other.any():
+        strings = values[other].astype(str).astype(object)
+        hashes[other] = pd.util.hash_array(strings, categorize=False)
+    hashes[tags == "missing"] = 0
+    return hashes ^ pd.util.hash_array(tags, categorize=False)
+
+
+def label_hashes(table, columns=None):
+    """DataFrame with a uint64 hash per parcel (index) and column"""
+    columns = list(columns or table.columns)
+    return pd.DataFrame(
+        {column: hash_column(table[column].to_numpy()) for column in columns},
+        index=table.index,
+    )
+
+
+def save_snapshot(table, path, columns=None):
+    """Persist the label hashes of table (a .npz file) as snapshot"""
+    hashes = label_hashes(table, columns)
+    np.savez_compressed(
+        path,
+        object_id=hashes.index.to_numpy(dtype="int64"),
+        columns=np.asarray(hashes.columns, dtype=str),
+        hashes=hashes.to_numpy(dtype="uint64"),
+    )
+    return hashes
+
+
+def load_snapshot(path):
+    """Label hashes of a snapshot written by save_snapshot"""
+    with np.load(path, allow_pickle=False) as data:
+        return pd.DataFrame(
+            data["hashes"],
+            index=pd.Index(data["object_id"], name="object_id"),
+            columns=list(data["columns"]),
+        )
+
+
+def change_feed(table, previous_hashes, columns=None):
+    """Yield changes of table compared to the hashes of the previous run.
+
+    Every change is a dict with object_id, the changed columns and their new
+    values. New parcels have all columns changed, removed parcels are
+    reported with removed=True."""
+    hashes = label_hashes(table, columns)
+    previous = previous_hashes.reindex(
+        index=hashes.index, columns=hashes.columns, fill_value=0
+    ).to_numpy(dtype="uint64")
+    changed = hashes.to_numpy() != previous
+    changed[~hashes.index.isin(previous_hashes.index)] = True
+    changed[:, ~hashes.columns.isin(previous_hashes.columns)] = True
+    names = np.asarray(hashes.columns)
+    for position in np.flatnonzero(changed.any(axis=1)):
+        object_id = hashes.index[position]
+        changed_columns = names[changed[position]].tolist()
+        row = table.iloc[position]
+        yield {
+            "object_id": object_id,
+            "changed": changed_columns,
+            "values": {column: row[column] for column in changed_columns},
+        }
+    for object_id in previous_hashes.index.difference(hashes.index):
+        yield {"object_id": object_id, "removed": True}
+
+
+def write_change_feed(changes, path):
+    """Write changes as newline delimited json, return the number of changes"""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for change in changes:
+            f.write(simplejson.dumps(change, ignore_nan=True, default=_json) + "\n")
+            count += 1
+    return count
+
+
+def _json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def get_parser():
+    """Return argument parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("labels", help="today's label table (.parquet, .ndjson)")
+    parser.add_argument("output", help="change feed to write (.ndjson)")
+    parser.add_argument(
+        "-p", "--previous", help="snapshot of the previous run (.npz)", default=None
+    )
+    parser.add_argument(
+        "-s", "--snapshot", help="save today's snapshot here (.npz)", default=None
+    )
+    parser.add_argument(
+        "-c",
+        "--columns",
+        nargs="+",
+        default=None,
+        help="only compare these columns (default all)",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        dest="verbose",
+        default=False,
+        help="Verbose output",
+    )
+    return parser
+
+
+def main():  # pragma: no cover
+    """Write the change feed of a label table compared to the previous run"""
+    options = get_parser().parse_args()
+    log_level = logging.DEBUG if options.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(levelname)s: %(message)s")
+    table = read_labels(options.labels)
+    if options.previous:
+        previous = load_snapshot(options.previous)
+    else:
+        previous = pd.DataFrame(index=pd.Index([], name="object_id"))
+    changes = change_feed(table, previous, options.columns)
+    count = write_change_feed(changes, options.output)
+    logger.info("%s of %s parcels changed", count, len(table))
+    if options.snapshot:
+        save_snapshot(table, options.snapshot, options.columns)
@@ -5,6 +5,8 @@ from dask_geomodeling.raster import *
 from dask_geomodeling.geometry import *
 from dask_geomodeling.geometry.aggregate import AggregateRaster
 from dask_geomodeling.geometry.base import GetSeriesBlock, SetSeriesBlock
+from spiceup_labels.lizard_api import LIZARD_URL, lizard_headers
+
 
 # ----------------------------------------------------------
 def mimic_rasters(lizard_rasters):
@@ -44,11 +46,150 @@ def raster_seriesblocks(dg_rasters, parcels):
     return sb_objects
 
 
-def get_labeltype_source(result_seriesblock, graph_rasters, labeled_parcels):
-    """Serialize result and replace mimic data with Lizard data. 
-    Return dg_source, the lizard labeltype config"""
+ADD_DJANGO_FIELDS = "geoblocks.geometry.sources.AddDjangoFields"
+PIVOT_LABELPARAMETERS = "spiceup_labels.evaluate.PivotLabelparameters"
+
+
+def labelparameter_blocks(
+    labelparams,
+    label_type_uuid,
+    source="parcels",
+    key="parcels_labeled",
+    prefix="parcels_add_",
+    pivot=False,
+    filters=None,
+    block=ADD_DJANGO_FIELDS,
+):
+    """Blocks that add labelparameters (dict name: column, or list of names)
+    to the parcels of block source, with the result in block key.
+
+    label_type_uuid is a uuid, or a dict with the uuid per labelparameter.
+    By default a chain of AddDjangoFields blocks is returned, one per
+    labelparameter (keys prefix + name). With pivot=True, a single
+    PivotLabelparameters block joins all labelparameters at once. That only
+    speeds up local evaluation (spiceup_labels.evaluate): Lizard does not
+    know the block, so get_labeltype_source and patch_labeltype expand it to
+    the chain again and Lizard still joins per labelparameter."""
+    if not isinstance(labelparams, dict):
+        labelparams = {lp: lp for lp in labelparams}
+    joins = []
+    for name, column in labelparams.items():
+        uuid = label_type_uuid
+        if isinstance(label_type_uuid, dict):
+            uuid = label_type_uuid[name]
+        query = {"label_type__uuid": uuid, "name": name, **(filters or {})}
+        joins.append(
+            [
+                block,
+                "lizard_nxt",
+                "labelparameter",
+                query,
+                {"object_id": "object_id"},
+                {"value": column},
+                "start",
+                "end",
+            ]
+        )
+    if pivot:
+        return {key: [PIVOT_LABELPARAMETERS, source, joins]}
+    blocks = {}
+    add_to = source
+    for number, (name, join) in enumerate(zip(labelparams, joins), 1):
+        block_key = key if number == len(joins) else f"{prefix}{name}"
+        blocks[block_key] = [join[0], add_to, *join[1:]]
+        add_to = block_key
+    return blocks
+
+
+def expand_labelparameter_pivots(dg_source):
+    """Replace PivotLabelparameters blocks with chained AddDjangoFields"""
+    graph = {}
+    for key, (path, *args) in dg_source["graph"].items():
+        if path != PIVOT_LABELPARAMETERS:
+            graph[key] = [path, *args]
+            continue
+        add_to, joins = args
+        for number, join in enumerate(joins, 1):
+            block_key = key if number == len(joins) else f"{key}_add_{number}"
+            graph[block_key] = [join[0], add_to, *join[1:]]
+            add_to = block_key
+    return {**dg_source, "graph": graph}
+
+
+AGGREGATE_RASTER = "dask_geomodeling.geometry.aggregate.AggregateRaster"
+LIZARD_RASTER_SOURCE = "lizard_nxt.blocks.LizardRasterSource"
+DAYS_SINCE_EPOCH = "spiceup_labels.evaluate.DaysSinceEpoch"
+CLOCK_PIXEL_SIZE = 1.0  # degrees, the clock raster is the same everywhere
+
+
+def clock_inputs(dg_source, clock_uuid):
+    """Replace aggregations of the days since epoch raster (clock_uuid), a
+    value that only depends on the time, with DaysSinceEpoch blocks"""
+    graph = dict(dg_source["graph"])
+    clock_keys = {
+        key
+        for key, (path, *args) in graph.items()
+        if path == LIZARD_RASTER_SOURCE and args[0] == clock_uuid
+    }
+    for key, (path, *args) in graph.items():
+        if path.endswith(".AggregateRaster") and args[1] in clock_keys:
+            column_name = args[6] if len(args) > 6 else "agg"
+            graph[key] = [DAYS_SINCE_EPOCH, args[0], clock_uuid, column_name]
+    used = {
+        arg for block in graph.values() for arg in block[1:] if isinstance(arg, str)
+    }
+    for key in clock_keys - used:
+        del graph[key]
+    return {**dg_source, "graph": graph}
+
+
+def expand_clock_inputs(dg_source):
+    """Replace DaysSinceEpoch blocks with the cheapest Lizard equivalent: a
+    coarse (one pixel per parcel) aggregation of the days since epoch raster.
+
+    Lizard still reads the raster on every evaluation; it has no constant
+    block yet that could replace it."""
+    graph = {}
+    for key, (path, *args) in dg_source["graph"].items():
+        if path != DAYS_SINCE_EPOCH:
+            graph[key] = [path, *args]
+            continue
+        source, uuid, column_name = args
+        graph[f"{key}_raster"] = [LIZARD_RASTER_SOURCE, uuid]
+        graph[key] = [
+            AGGREGATE_RASTER,
+            source,
+            f"{key}_raster",
+            "max",
+            "EPSG:4326",
+            CLOCK_PIXEL_SIZE,
+            None,
+            column_name,
+        ]
+    return {**dg_source, "graph": graph}
+
+
+def _replace_references(value, keys, key):
+    """Replace references to blocks keys in a block definition by key"""
+    if isinstance(value, list):
+        return [_replace_references(item, keys, key) for item in value]
+    if isinstance(value, str) and value in keys:
+        return key
+    return value
+
+
+def get_labeltype_source(
+    result_seriesblock, graph_rasters, labeled_parcels, clock_raster=None
+):
+    """Serialize result and replace mimic data with Lizard data.
+    Return dg_source, the lizard labeltype config.
+
+    PivotLabelparameters blocks are expanded to AddDjangoFields chains, so
+    dg_source can be written and uploaded as it is. The days since epoch
+    raster (uuid clock_raster) is replaced by a clock input, see
+    clock_inputs."""
     dg_source = result_seriesblock.serialize()
-    parcels_with_labelparameters = False
+    labeled_blocks = set()  # mimic blocks of the parcels with labelparameters
     parcels_block = "parcels"
     for block in dg_source["graph"]:
         block_value = dg_source["graph"][block]
@@ -66,39 +207,42 @@ def get_labeltype_source(result_seriesblock, graph_rasters, labeled_parcels):
                 dg_source["graph"][block] = labeled_parcels["parcels"]
                 parcels_block = block
             if "labelparameters.geojson" in block_value[1]:
-                dg_source["graph"][block] = labeled_parcels["parcels_labeled"]
-                parcels_with_labelparameters = True
+                labeled_blocks.add(block)
             if "sources.GeometryWKTSource" in block_value[0]:
-                dg_source["graph"][block] = labeled_parcels["parcels_labeled"]
+                labeled_blocks.add(block)
             if "MergeGeometryBlocks" in block:
-                dg_source["graph"][block] = labeled_parcels["parcels_labeled"]
-
-    # replace mimic parcels with Lizard parcels
-    add_labeled_parcels = dict(
-        (k, labeled_parcels[k]) for k in tuple(labeled_parcels.keys())[1:-1]
-    )
+                labeled_blocks.add(block)
 
-    if parcels_with_labelparameters:
-        add_labeled_parcels = dict(
-            (k, labeled_parcels[k]) for k in tuple(labeled_parcels.keys())[1:-1]
-        )
-        add_labeled_parcels[list(add_labeled_parcels.keys())[0]][1] = parcels_block
-        dg_source["graph"] = {**dg_source["graph"], **add_labeled_parcels}
+    if labeled_blocks:
+        # all mimic blocks refer to the one parcels_labeled block (a chain of
+        # AddDjangoFields blocks, or a pivot that is expanded once on PATCH)
+        graph = {
+            key: _replace_references(value, labeled_blocks, "parcels_labeled")
+            for key, value in dg_source["graph"].items()
+            if key not in labeled_blocks
+        }
+        add_labeled_parcels = dict(tuple(labeled_parcels.items())[1:])
+        # the first labelparameter block, the pivot if there is no chain
+        first_block = next(iter(add_labeled_parcels))
+        add_labeled_parcels[first_block] = list(add_labeled_parcels[first_block])
+        add_labeled_parcels[first_block][1] = parcels_block
+        dg_source["graph"] = {**graph, **add_labeled_parcels}
+    dg_source = expand_labelparameter_pivots(dg_source)
+    if clock_raster:
+        dg_source = clock_inputs(dg_source, clock_raster)
     return dg_source
 
 
-def patch_labeltype(dg_source, username, password, labeltype_uuid):
+def patch_labeltype(dg_source, username, password, labeltype_uuid, lizard_url=None):
     """Serialize model (to json form) and replace raster file sources with lizard raster sources
     Set final json and PATCH the labeltype"""
+    dg_source = expand_clock_inputs(expand_labelparameter_pivots(dg_source))
     source = {"source": dg_source}
     # specify credentials for Lizard
-    headers = {
-        "username": username,
-        "password": password,
-        "Content-Type": "application/json",
-    }
+    headers = lizard_headers(username, password)
     # PATCH the labeltype
-    labeltype_url = f"https://spiceup.lizard.net/api/v3/labeltypes/{labeltype_uuid}/"
+    lizard_url = lizard_url or LIZARD_URL
+    labeltype_url = f"{lizard_url}/api/v3/labeltypes/{labeltype_uuid}/"
 
     response = requests.patch(
         url=labeltype_url,
@@ -107,6 +251,7 @@ def patch_labeltype(dg_source, username, password, labeltype_uuid):
     )
     return response
 
+
 def configure_logger(loglevel):
     logger = logging.getLogger("labellogger")
     logger.setLevel(loglevel)
@@ -114,4 +259,4 @@ def configure_logger(loglevel):
     sh = logging.StreamHandler()
     sh.setLevel(loglevel)
     sh.setFormatter(formatter)
-    logger.addHandler(sh)
\ No newline at end of file
+    logger.addHandler(sh)
@@ -0,0 +1,695 @@
+# -*- coding: utf-8 -*-
+"""Evaluate serialized labeltype models locally, without Lizard.
+
+The labeltype source that we PATCH to Lizard ({"graph": ..., "name": ...}) is
+interpreted block by block on pandas series. Lizard specific blocks are
+replaced by local data:
+
+- parcels (GeoDjangoSource, GeometryFileSource) by a DataFrame indexed by
+  object_id, with x and y columns for the parcel location
+- labelparameters (AddDjangoFields) by a long DataFrame with the columns
+  object_id, name, value, start and end (and optionally label_type), or by a
+  dict with per labelparameter name a value for all parcels (or an array with
+  a value per parcel)
+- rasters (LizardRasterSource, AggregateRaster) by a raster sampler
+- the days since epoch raster, if the builder replaced its aggregation by a
+  DaysSinceEpoch block, by the evaluation time
+
+Labels are computed at a time, either one time for all parcels or a time per
+parcel row (see spiceup_labels.timeline for evaluation over a date range).
+
+Numeric intermediate results are float64 by default (the "float path"). With
+compact=True, blocks of which the value range is known to be integral (from
+Classify labels, Round and constants) are carried as int16 / int32 instead.
+"""
+
+import functools
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+BLOCKS = {}  # block class name: function(context, *args)
+
+RasterRef = namedtuple("RasterRef", ["uuid", "shift"])
+ValueRange = namedtuple("ValueRange", ["low", "high", "integral"])
+
+COMPACT_DTYPES = (np.dtype("int16"), np.dtype("int32"))
+
+BOOLEAN_BLOCKS = {
+    "Equal",
+    "NotEqual",
+    "Greater",
+    "GreaterEqual",
+    "Less",
+    "LessEqual",
+    "And",
+    "Or",
+    "Xor",
+    "Invert",
+}
+
+
+def block(*names):
+    """Register a function as local implementation of one or more blocks"""
+
+    def register(func):
+        for name in names:
+            BLOCKS[name] = func
+        return func
+
+    return register
+
+
+def block_name(path):
+    """Class name of a block, e.g. 'Classify' for
+    'dask_geomodeling.geometry.field_operations.Classify'"""
+    return path.rsplit(".", 1)[-1]
+
+
+class Context:
+    """Local stand-ins for the Lizard data a labeltype is evaluated on"""
+
+    def __init__(self, parcels, labelparameters=None, rasters=None, time=None):
+        self.parcels = parcels
+        if labelparameters is None:
+            labelparameters = pd.DataFrame(
+                columns=["object_id", "name", "value", "start", "end"]
+            )
+        self.labelparameters = labelparameters
+        self.sample_raster = raster_sampler(rasters)
+        self.time = as_timestamp(time)
+        self.key = None  # key of the block that is being evaluated
+
+
+def as_timestamp(time=None):
+    """Naive UTC pandas Timestamp from a datetime or string, default now.
+
+    A sequence of times (one per parcel row) becomes a DatetimeIndex."""
+    if time is None:
+        return pd.Timestamp.now(tz="UTC").tz_localize(None)
+    if np.ndim(time) == 1:
+        time = pd.DatetimeIndex(time)
+    else:
+        time = pd.Timestamp(time)
+    if time.tzinfo is not None:
+        time = time.tz_convert("UTC").tz_localize(None)
+    return time
+
+
+def days_since_epoch(time):
+    """Whole days since 1970-01-01 (the value of the days since epoch raster)"""
+    days = (time - pd.Timestamp("1970-01-01")) // pd.Timedelta(days=1)
+    return np.asarray(days, dtype=float)
+
+
+def raster_sampler(rasters=None):
+    """Return a function(uuid, parcels, statistic, time) that samples rasters.
+
+    rasters is either such a function or a dict with raster uuids as keys and
+    as values a constant, an array with a value per parcel or a
+    function(parcels, time). time is a Timestamp or a DatetimeIndex with a
+    time per parcel row."""
+    if callable(rasters):
+        return rasters
+    rasters = rasters or {}
+
+    def sample(uuid, parcels, statistic, time):
+        try:
+            value = rasters[uuid]
+        except KeyError:
+            raise KeyError(f"No local data for raster {uuid}")
+        if callable(value):
+            value = value(parcels, time)
+        if np.ndim(value) == 0:
+            return np.full(len(parcels), value, dtype=float)
+        return np.asarray(value, dtype=float)
+
+    return sample
+
+
+def _resolve(arg, graph, results):
+    """Replace references to other blocks with their results (like dask)"""
+    if isinstance(arg, str) and arg in graph:
+        return results[arg]
+    if isinstance(arg, list):
+        return [_resolve(a, graph, results) for a in arg]
+    return arg
+
+
+def _dependencies(args, graph):
+    deps = []
+    for arg in args:
+        if isinstance(arg, str) and arg in graph:
+            deps.append(arg)
+        elif isinstance(arg, list):
+            deps.extend(_dependencies(arg, graph))
+    return deps
+
+
+def evaluation_order(graph, name):
+    """Keys of the blocks needed to compute name, dependencies first"""
+    order, done = [], set()
+    stack = [(name, False)]
+    while stack:
+        key, expanded = stack.pop()
+        if key in done:
+            continue
+        if expanded:
+            done.add(key)
+            order.append(key)
+            continue
+        stack.append((key, True))
+        for dep in reversed(_dependencies(graph[key][1:], graph)):
+            if dep not in done:
+                stack.append((dep, False))
+    return order
+
+
+def evaluate(
+    source,
+    parcels,
+    labelparameters=None,
+    rasters=None,
+    time=None,
+    compact=False,
+    ranges=None,
+    hook=None,
+):
+    """Compute the result of a labeltype source for the given parcels.
+
+    Returns the result of the endpoint block, for labeltypes the table
+    (DataFrame indexed by object_id) of the final SetSeriesBlock. See
+    infer_ranges for ranges, the known value ranges of inputs, and
+    evaluate_graph for hook."""
+    context = Context(parcels, labelparameters, rasters, time)
+    return evaluate_graph(
+        source["graph"], source["name"], context, compact, ranges, hook
+    )
+
+
+def evaluate_chunks(source, parcels, chunk_size=10000, **kwargs):
+    """Evaluate a labeltype source per chunk of parcels, yield the results.
+
+    kwargs are passed to evaluate. Use spiceup_labels.label_writer to write
+    the chunks as they are produced."""
+    labelparameters = kwargs.pop("labelparameters", None)
+    if labelparameters is not None and np.ndim(kwargs.get("time")) == 0:
+        # select the valid records once instead of per chunk
+        time = kwargs["time"] = as_timestamp(kwargs.get("time"))
+        labelparameters = as_of(labelparameters, time)
+    rasters = kwargs.pop("rasters", None)
+    for start in range(0, len(parcels), chunk_size):
+        chunk = parcels.iloc[start : start + chunk_size]
+        yield evaluate(
+            source,
+            chunk,
+            labelparameters=labelparameters,
+            rasters=_chunk_rasters(rasters, start, start + chunk_size),
+            **kwargs,
+        )
+
+
+def _chunk_rasters(rasters, start, stop):
+    """Rasters of the parcels start up to stop: arrays with a value per parcel
+    are sliced, constants and functions are passed as they are"""
+    if rasters is None or callable(rasters):
+        return rasters
+    return {
+        uuid: (
+            value
+            if callable(value) or np.ndim(value) == 0
+            else np.asarray(value)[start:stop]
+        )
+        for uuid, value in rasters.items()
+    }
+
+
+def evaluate_graph(graph, name, context, compact=False, ranges=None, hook=None):
+    """Evaluate block name of graph within context.
+
+    If given, hook(key, path, compute) is called for every block instead of
+    compute() and returns its result, e.g. to profile the blocks."""
+    dtypes = {}
+    if compact:
+        dtypes = infer_dtypes({"graph": graph, "name": name}, ranges)
+    results = {}
+    for key in evaluation_order(graph, name):
+        path, *args = graph[key]
+        try:
+            func = BLOCKS[block_name(path)]
+        except KeyError:
+            raise NotImplementedError(f"Block {path} ({key}) is not supported locally")
+        context.key = key
+        args = [_resolve(arg, graph, results) for arg in args]
+        compute = functools.partial(func, context, *args)
+        result = compute() if hook is None else hook(key, path, compute)
+        results[key] = _cast(result, dtypes.get(key), compact)
+    return results[name]
+
+
+def _cast(result, dtype, compact):
+    """Carry numeric series as float64, or as dtype if compact"""
+    if not isinstance(result, pd.Series) or result.dtype == bool:
+        return result
+    if not pd.api.types.is_numeric_dtype(result.dtype):
+        return result
+    if compact:
+        if dtype is not None and not result.isna().any():
+            return result.astype(dtype)
+        if result.dtype.kind in "iu":
+            return result
+    return result.astype("float64")
+
+
+# ----------------------------------------------------------
+# value range (and dtype) inference
+def _constant_range(value):
+    if isinstance(value, (bool, int, float, np.number)) and np.isfinite(value):
+        return ValueRange(value, value, float(value).is_integer())
+    return None
+
+
+def _classify_range(bins, labels, right=True):
+    try:
+        labels = np.asarray(labels, dtype=float)
+    except (TypeError, ValueError):
+        return None  # string labels
+    integral = bool(np.all(np.mod(labels, 1) == 0))
+    return ValueRange(labels.min(), labels.max(), integral)
+
+
+def _binary_range(name, left, right):
+    if name == "Modulo" and right is not None and right.low == right.high > 0:
+        if left is not None and left.integral and right.integral:
+            return ValueRange(0, right.low - 1, True)
+        return ValueRange(0, right.low, False)
+    if left is None or right is None:
+        return None
+    integral = left.integral and right.integral
+    if name == "Add":
+        return ValueRange(left.low + right.low, left.high + right.high, integral)
+    if name == "Subtract":
+        return ValueRange(left.low - right.high, left.high - right.low, integral)
+    if name == "Multiply":
+        products = [a * b for a in left[:2] for b in right[:2]]
+        return ValueRange(min(products), max(products), integral)
+    return None
+
+
+def infer_ranges(source, ranges=None):
+    """Infer the value range of every block in a labeltype source.
+
+    ranges optionally gives known ValueRanges per key or column name (for
+    GetSeriesBlock). Returns a dict with a ValueRange (or None if unknown)
+    per key."""
+    graph, known = source["graph"], dict(ranges or {})
+    result = {}
+
+    def arg_range(arg):
+        if isinstance(arg, str) and arg in graph:
+            return result.get(arg)
+        return _constant_range(arg)
+
+    for key in evaluation_order(graph, source["name"]):
+        path, *args = graph[key]
+        name = block_name(path)
+        if key in known:
+            result[key] = ValueRange(*known[key])
+        elif name in BOOLEAN_BLOCKS:
+            result[key] = ValueRange(0, 1, True)
+        elif name == "Classify":
+            result[key] = _classify_range(*args[1:])
+        elif name == "Round":
+            source_range = arg_range(args[0])
+            decimals = args[1] if len(args) > 1 else 0
+            if source_range is not None and decimals == 0:
+                result[key] = ValueRange(
+                    round(source_range.low), round(source_range.high), True
+                )
+        elif name in ("Mask", "Where"):
+            values, other = arg_range(args[0]), arg_range(args[2])
+            if args[2] is None:
+                result[key] = values
+            elif values is not None and other is not None:
+                result[key] = ValueRange(
+                    min(values.low, other.low),
+                    max(values.high, other.high),
+                    values.integral and other.integral,
+                )
+        elif name == "GetSeriesBlock" and args[1] in known:
+            result[key] = ValueRange(*known[args[1]])
+        elif name in ("Add", "Subtract", "Multiply", "Modulo"):
+            result[key] = _binary_range(name, arg_range(args[0]), arg_range(args[1]))
+        result.setdefault(key, None)
+    return result
+
+
+def compact_dtype(value_range):
+    """Smallest of int16 / int32 that holds an integral value range"""
+    if value_range is None or not value_range.integral:
+        return None
+    for dtype in COMPACT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= value_range.low and value_range.high <= info.max:
+            return dtype
+    return None
+
+
+def infer_dtypes(source, ranges=None):
+    """Compact integer dtypes per (non boolean) block of a labeltype source"""
+    dtypes = {}
+    for key, value_range in infer_ranges(source, ranges).items():
+        if block_name(source["graph"][key][0]) in BOOLEAN_BLOCKS:
+            continue
+        dtype = compact_dtype(value_range)
+        if dtype is not None:
+            dtypes[key] = dtype
+    return dtypes
+
+
+def assert_bit_exact(compact_result, float_result):
+    """Check that a compact result equals the float path result value for
+    value: NaN equals NaN and -0.0 equals 0.0 (an int16 zero can not keep the
+    sign of a float zero)"""
+    if isinstance(float_result, pd.DataFrame):
+        assert list(compact_result.columns) == list(float_result.columns)
+        for column in float_result.columns:
+            assert_bit_exact(compact_result[column], float_result[column])
+        return
+    expected = float_result.to_numpy()
+    actual = compact_result.to_numpy()
+    if expected.dtype.kind == "f":
+        assert actual.dtype.kind in "iuf", f"{actual.dtype} is not numeric"
+        actual = actual.astype("float64")
+        assert np.array_equal(actual, expected, equal_nan=True)
+    else:
+        assert (pd.isna(actual) == pd.isna(expected)).all()
+        assert (actual[~pd.isna(expected)] == expected[~pd.isna(expected)]).all()
+
+
+# ----------------------------------------------------------
+# parcel and labelparameter sources
+@block("GeoDjangoSource")
+def _geodjango_source(context, app, model, fields=None, *args):
+    parcels = context.parcels.rename(columns=fields or {})
+    if "object_id" not in parcels.columns:
+        parcels["object_id"] = _object_ids(parcels)
+    return parcels
+
+
+@block("GeometryFileSource")
+def _geometry_file_source(context, url, *args, **kwargs):
+    return context.parcels
+
+
+def _filter_labelparameters(labelparameters, filters):
+    selection = np.ones(len(labelparameters), dtype=bool)
+    for field, value in filters.items():
+        column = field.replace("__uuid", "")
+        if column not in labelparameters.columns:
+            continue
+        if value is None:
+            selection &= labelparameters[column].isna().to_numpy()
+        else:
+            selection &= (labelparameters[column] == value).to_numpy()
+    return labelparameters[selection]
+
+
+def _object_ids(table):
+    """object_id per row, also for tables with a (object_id, time) index"""
+    return table.index.get_level_values(0)
+
+
+def as_of(labelparameters, time):
+    """Labelparameter records valid at time, the latest start per object"""
+    start = pd.to_datetime(labelparameters["start"])
+    end = pd.to_datetime(labelparameters["end"])
+    valid = (start <= time) & (end.isna() | (end > time))
+    records = labelparameters[valid.to_numpy()]
+    records = records.sort_values("start", kind="stable")
+    return records.drop_duplicates(subset=["object_id", "name"], keep="last")
+
+
+@block("AddDjangoFields")
+def _add_django_fields(
+    context, source, app, model, filters, join_on, fields, *start_end
+):
+    table = source.copy()
+    if isinstance(context.labelparameters, dict):
+        value = context.labelparameters.get(filters.get("name"), np.nan)
+        for column in fields.values():
+            table[column] = value
+        return table
+    records = _filter_labelparameters(context.labelparameters, filters)
+    if isinstance(context.time, pd.DatetimeIndex):
+        values = as_of_rows(records, _object_ids(table), context.time, fields)
+        for field, column in fields.items():
+            table[column] = values[field]
+        return table
+    records = as_of(records, context.time).set_index("object_id")
+    for field, column in fields.items():
+        table[column] = records[field].reindex(_object_ids(table)).to_numpy()
+    return table
+
+
+@block("PivotLabelparameters")
+def _pivot_labelparameters(context, source, joins):
+    """The AddDjangoFields joins (blocks without their source) all at once.
+
+    Records of all joins are selected together, the latest valid record per
+    parcel and column is taken in one pass and pivoted to columns."""
+    if isinstance(context.labelparameters, dict) or isinstance(
+        context.time, pd.DatetimeIndex
+    ):
+        table = source
+        for path, *args in joins:
+            table = _add_django_fields(context, table, *args)
+        return table
+    groups = {}  # filters other than name: (filters, [(name, field, column)])
+    for path, app, model, filters, join_on, fields, *start_end in joins:
+        other = {k: v for k, v in filters.items() if k != "name"}
+        group = groups.setdefault(repr(sorted(other.items())), (other, []))
+        for field, column in fields.items():
+            group[1].append((filters.get("name"), field, column))
+    selections = []
+    for other, mapping in groups.values():
+        mapping = pd.DataFrame(mapping, columns=["name", "field", "column"])
+        records = _filter_labelparameters(context.labelparameters, other)
+        records = records[records["name"].isin(mapping["name"]).to_numpy()]
+        records = records.merge(mapping, on="name")
+        fields = mapping["field"].unique()  # usually only "value"
+        values = records[fields[0]]
+        for field in fields[1:]:
+            values = values.where(records["field"] != field, records[field])
+        records["pivot_value"] = values
+        selections.append(
+            records[["object_id", "column", "pivot_value", "start", "end"]]
+        )
+    records = pd.concat(selections, ignore_index=True).rename(
+        columns={"column": "name", "pivot_value": "value"}
+    )
+    records = as_of(records, context.time)
+    pivoted = records.pivot(index="object_id", columns="name", values="value")
+    pivoted = pivoted.reindex(_object_ids(source))
+    table = source.copy()
+    for path, app, model, filters, join_on, fields, *start_end in joins:
+        for column in fields.values():
+            if column in pivoted.columns:
+                table[column] = pivoted[column].to_numpy()
+            else:
+                table[column] = np.nan
+    return table
+
+
+def as_of_rows(labelparameters, object_ids, times, fields):
+    """Values of fields valid per row of (object_id, time), in one merge"""
+    rows = pd.DataFrame(
+        {"object_id": np.asarray(object_ids), "row": np.arange(len(object_ids))}
+    )
+    rows["time"] = np.asarray(times)
+    records = labelparameters[["object_id", "start", "end"] + list(fields)]
+    merged = rows.merge(records, on="object_id")
+    start = pd.to_datetime(merged["start"])
+    end = pd.to_datetime(merged["end"])
+    valid = (start <= merged["time"]) & (end.isna() | (end > merged["time"]))
+    merged = merged[valid.to_numpy()].sort_values("start", kind="stable")
+    merged = merged.drop_duplicates(subset="row", keep="last")
+    values = {}
+    for field in fields:
+        found = merged[field].to_numpy()
+        dtype = float if found.dtype.kind in "iufb" else object
+        values[field] = np.full(len(rows), np.nan, dtype=dtype)
+        values[field][merged["row"].to_numpy()] = found
+    return values
+
+
+@block("MergeGeometryBlocks")
+def _merge_geometry_blocks(context, left, right, how="inner", suffixes=("", "_right")):
+    right = right.drop(columns=["x", "y"], errors="ignore")
+    return left.join(right, how=how, lsuffix=suffixes[0], rsuffix=suffixes[1])
+
+
+# ----------------------------------------------------------
+# rasters
+@block("LizardRasterSource")
+def _lizard_raster_source(context, uuid, *args):
+    return RasterRef(uuid, pd.Timedelta(0))
+
+
+@block("RasterizeWKT")
+def _rasterize_wkt(context, *args):
+    return RasterRef(context.key, pd.Timedelta(0))
+
+
+@block("Shift")
+def _shift(context, store, time):
+    return RasterRef(store.uuid, store.shift + pd.Timedelta(milliseconds=time))
+
+
+@block("AggregateRaster")
+def _aggregate_raster(
+    context,
+    source,
+    raster,
+    statistic="sum",
+    projection=None,
+    pixel_size=None,
+    max_pixels=None,
+    column_name="agg",
+    *args,
+):
+    table = source.copy()
+    time = context.time - raster.shift
+    values = context.sample_raster(raster.uuid, table, statistic, time)
+    table[column_name] = values
+    return table
+
+
+@block("DaysSinceEpoch")
+def _days_since_epoch(context, source, uuid, column_name="agg"):
+    # the days since epoch raster (uuid) has the same value everywhere
+    table = source.copy()
+    table[column_name] = days_since_epoch(context.time)
+    return table
+
+
+# ----------------------------------------------------------
+# series
+@block("GetSeriesBlock")
+def _get_series_block(context, source, name):
+    return source[name]
+
+
+@block("SetSeriesBlock")
+def _set_series_block(context, source, *args):
+    table = source.copy()
+    for column, value in zip(args[::2], args[1::2]):
+        if isinstance(value, pd.Series):
+            value = value.reindex(table.index)
+        table[column] = value
+    return table
+
+
+def _operand(value):
+    """Widen integer series so integer arithmetic cannot overflow"""
+    if isinstance(value, pd.Series) and value.dtype.kind in "iu":
+        return value.astype("int64")
+    return value
+
+
+def _field_operation(func):
+    def process(context, source, other):
+        return func(_operand(source), _operand(other))
+
+    return process
+
+
+for _name, _func in {
+    "Add": lambda a, b: a + b,
+    "Subtract": lambda a, b: a - b,
+    "Multiply": lambda a, b: a * b,
+    "Divide": lambda a, b: a / b,
+    "FloorDivide": lambda a, b: a // b,
+    "Power": lambda a, b: a**b,
+    "Modulo": lambda a, b: a % b,
+    "Equal": lambda a, b: a == b,
+    "NotEqual": lambda a, b: a != b,
+    "Greater": lambda a, b: a > b,
+    "GreaterEqual": lambda a, b: a >= b,
+    "Less": lambda a, b: a < b,
+    "LessEqual": lambda a, b: a <= b,
+    "And": lambda a, b: a & b,
+    "Or": lambda a, b: a | b,
+    "Xor": lambda a, b: a ^ b,
+}.items():
+    block(_name)(_field_operation(_func))
+
+
+@block("Invert")
+def _invert(context, source):
+    return ~source
+
+
+@block("Round")
+def _round(context, source, decimals=0):
+    return source.round(decimals)
+
+
+@block("Where")
+def _where(context, source, cond, other):
+    return source.where(cond, other)
+
+
+@block("Mask")
+def _mask(context, source, cond, other):
+    return source.mask(cond, other)
+
+
+@block("Interp")
+def _interp(context, source, xp, fp, left=None, right=None):
+    return pd.Series(np.interp(source, xp, fp, left, right), index=source.index)
+
+
+def classify(values, bins, labels, right=True):
+    """Vectorized equivalent of dask-geomodeling's Classify (pd.cut)"""
+    values = np.asarray(values, dtype=float)
+    bins = np.asarray(bins, dtype=float)
+    indices = np.searchsorted(bins, values, side="left" if right else "right")
+    valid = ~np.isnan(values)
+    if len(labels) != len(bins) + 1:
+        indices -= 1
+        valid &= (indices >= 0) & (indices < len(labels))
+    try:
+        labels = np.asarray(labels, dtype=float)
+        result = np.full(len(values), np.nan)
+    except (TypeError, ValueError):
+        labels = np.asarray(labels, dtype=object)
+        result = np.full(len(values), np.nan, dtype=object)
+    result[valid] = labels[indices[valid]]
+    return result
+
+
+@block("Classify")
+def _classify(context, source, bins, labels, right=True):
+    return pd.Series(classify(source, bins, labels, right), index=source.index)
+
+
+@block("ClassifyFromColumns")
+def _classify_from_columns(
+    context, source, value_column, bin_columns, labels, right=True
+):
+    values = np.asarray(source[value_column], dtype=float)
+    bins = source[bin_columns].to_numpy(dtype=float)
+    with np.errstate(invalid="ignore"):
+        if right:
+            indices = np.sum(values[:, np.newaxis] > bins, axis=1)
+        else:
+            indices = np.sum(values[:, np.newaxis] >= bins, axis=1)
+    if len(labels) == len(bin_columns) + 1:
+        indices[np.isnan(values)] = len(labels)
+    else:
+        indices -= 1
+        indices[indices == -1] = len(labels)
+    result = pd.Series(labels + [np.nan]).to_numpy()[indices]
+    return pd.Series(result, index=source.index)
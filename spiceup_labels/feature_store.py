@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Daily raster feature table, shared by all labeltypes.
+
+Several labeltypes aggregate the same rasters (days_since_epoch, the season
+onset rasters, soil moisture, the pest rasters). A daily job collects the
+distinct raster inputs (raster uuid, statistic and time shift) of all
+labeltype sources, samples each of them once for all parcels and writes a
+dated feature table (features_YYYYMMDD.parquet) with a column per input.
+
+Evaluations read their raster inputs from the feature table instead of
+aggregating the rasters again: feature_sampler is a raster sampler for
+spiceup_labels.evaluate. Rasters are daily, a column holds the values of a
+raster and statistic at a day. With a raster cache (see raster_cache), only
+rasters that published a new timestamp are sampled again.
+"""
+
+import argparse
+import json
+import logging
+import os
+
+import pandas as pd
+
+from spiceup_labels.evaluate import (
+    Context,
+    as_timestamp,
+    block_name,
+    evaluate_graph,
+    raster_sampler,
+)
+from spiceup_labels.label_writer import read_labels, write_labels
+from spiceup_labels.local_data import read_parcels, read_rasters, read_source
+from spiceup_labels.raster_cache import RasterCache, lizard_raster_timestamps
+
+logger = logging.getLogger(__name__)
+
+
+def feature_column(uuid, statistic, time):
+    """Feature table column of a raster and statistic at (the day of) time"""
+    return f"{uuid}/{statistic}/{as_timestamp(time):%Y-%m-%d}"
+
+
+def raster_inputs(sources):
+    """Distinct (uuid, statistic, shift) of the AggregateRaster blocks"""
+    inputs = set()
+    context = Context(pd.DataFrame(index=pd.Index([], name="object_id")))
+    for source in sources:
+        graph = source["graph"]
+        for key, (path, *args) in graph.items():
+            if block_name(path) != "AggregateRaster":
+                continue
+            raster = evaluate_graph(graph, args[1], context)
+            statistic = args[2] if len(args) > 2 else "sum"
+            inputs.add((raster.uuid, statistic, raster.shift))
+    return sorted(inputs)
+
+
+def build_features(sources, parcels, rasters, time=None):
+    """Feature table (indexed by object_id) with each raster input of the
+    sources sampled once, for evaluations at time"""
+    time = as_timestamp(time)
+    sample = raster_sampler(rasters)
+    columns = {}
+    for uuid, statistic, shift in raster_inputs(sources):
+        column = feature_column(uuid, statistic, time - shift)
+        if column not in columns:
+            logger.debug("sampling %s", column)
+            columns[column] = sample(uuid, parcels, statistic, time - shift)
+    return pd.DataFrame(columns, index=parcels.index)
+
+
+def features_path(directory, time=None):
+    return os.path.join(directory, f"features_{as_timestamp(time):%Y%m%d}.parquet")
+
+
+def write_features(features, directory, time=None):
+    """Write a feature table to the dated file in directory, return the path"""
+    os.makedirs(directory, exist_ok=True)
+    path = features_path(directory, time)
+    write_labels([features], path + ".tmp.parquet")
+    os.replace(path + ".tmp.parquet", path)
+    return path
+
+
+def feature_sampler(features, fallback=None):
+    """Raster sampler reading from feature tables (one or a list of them).
+
+    Inputs missing in the feature tables (or parcels missing, or a time per
+    parcel row) are sampled with fallback (see raster_sampler), if given."""
+    if isinstance(features, pd.DataFrame):
+        features = [features]
+    features = pd.concat(features, axis=1)
+    fallback = raster_sampler(fallback) if fallback is not None else None
+
+    def sample(uuid, parcels, statistic, time):
+        if not isinstance(time, pd.DatetimeIndex):
+            column = feature_column(uuid, statistic, time)
+            if column in features.columns and parcels.index.isin(features.index).all():
+                values = features[column].reindex(parcels.index.get_level_values(0))
+                return values.to_numpy(dtype=float)
+        if fallback is None:
+            raise KeyError(f"No feature for raster {uuid} ({statistic}) at {time}")
+        return fallback(uuid, parcels, statistic, time)
+
+    return sample
+
+
+def read_features(directory, time=None):
+    """The feature table of the day of time from directory"""
+    return read_labels(features_path(directory, time))
+
+
+def get_parser():
+    """Return argument parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("parcels", help="parcels (.shp, .geojson, .csv, .parquet)")
+    parser.add_argument("rasters", help="raster stand-ins per uuid (.json)")
+    parser.add_argument("output_dir", help="directory for the feature tables")
+    parser.add_argument("sources", nargs="+", help="labeltype sources (.json)")
+    parser.add_argument("-t", "--time", default=None, help="time (default now)")
+    parser.add_argument(
+        "-c", "--raster-cache", default=None, help="raster cache (.sqlite)"
+    )
+    parser.add_argument(
+        "--raster-timestamps",
+        default=None,
+        help="timestamps per raster uuid for the cache (.json), default from Lizard",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        dest="verbose",
+        default=False,
+        help="Verbose output",
+    )
+    return parser
+
+
+def main():  # pragma: no cover
+    """Sample the raster inputs of labeltypes once and write the features"""
+    options = get_parser().parse_args()
+    log_level = logging.DEBUG if options.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(levelname)s: %(message)s")
+    sources = [read_source(path) for path in options.sources]
+    rasters = read_rasters(options.rasters)
+    if options.raster_cache:
+        if options.raster_timestamps:
+            with open(options.raster_timestamps) as f:
+                timestamps = json.load(f)
+        else:
+            uuids = {uuid for uuid, statistic, shift in raster_inputs(sources)}
+            timestamps = lizard_raster_timestamps(uuids)
+        cache = RasterCache(options.raster_cache)
+        rasters = cache.sampler(rasters, timestamps)
+    features = build_features(
+        sources, read_parcels(options.parcels), rasters, options.time
+    )
+    if options.raster_cache:
+        logger.info("%s values sampled, %s cached", cache.sampled, cache.hits)
+    path = write_features(features, options.output_dir, options.time)
+    logger.info("%s features written to %s", len(features.columns), path)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Recompute labels only for parcels of which labelparameters changed.
+
+The app posts labelparameters (farm_area, live_support, pepper_variety, health
+observations, task completion), which labeltypes join to the parcels with
+AddDjangoFields blocks. Walking a labeltype graph tells which labelparameters
+its labels are computed from. Given a stream of labelparameter changes, only
+the labeltypes depending on the changed labelparameters are recomputed, and
+only for the parcels that changed.
+
+Columns a labeltype merely passes through (the labelparameter columns of the
+parcels in its result table) do not count as a dependency.
+"""
+
+import itertools
+
+import pandas as pd
+
+from spiceup_labels.evaluate import block_name, evaluate, evaluation_order
+
+
+def labelparameter_columns(source):
+    """{column: labelparameter name} of the AddDjangoFields (and
+    PivotLabelparameters) blocks of a source"""
+    columns = {}
+    for path, *args in source["graph"].values():
+        if block_name(path) == "PivotLabelparameters":
+            joins = [join[1:] for join in args[1]]
+        elif block_name(path) == "AddDjangoFields":
+            joins = [args[1:]]
+        else:
+            continue
+        for app, model, filters, join_on, fields, *start_end in joins:
+            if model != "labelparameter":
+                continue
+            for column in fields.values():
+                columns[column] = filters.get("name", column)
+    return columns
+
+
+def columns_read(source):
+    """Names of the columns that the blocks of the endpoint read"""
+    graph, read = source["graph"], set()
+    for key in evaluation_order(graph, source["name"]):
+        path, *args = graph[key]
+        name = block_name(path)
+        if name == "GetSeriesBlock":
+            read.add(args[1])
+        elif name == "ClassifyFromColumns":
+            read.add(args[1])
+            read.update(args[2])
+    return read
+
+
+def labelparameter_dependencies(source):
+    """Names of the labelparameters the labels of a labeltype depend on"""
+    columns = labelparameter_columns(source)
+    return {columns[column] for column in columns_read(source) if column in columns}
+
+
+def affected_parcels(changes, sources):
+    """{labeltype: object_ids} to recompute after labelparameter changes.
+
+    changes are records (dicts) with at least object_id and name, sources a
+    dict with the labeltype sources."""
+    changes = pd.DataFrame(list(changes))
+    affected = {}
+    if changes.empty:
+        return affected
+    for labeltype, source in sources.items():
+        names = labelparameter_dependencies(source)
+        object_ids = changes.loc[changes["name"].isin(names), "object_id"]
+        if len(object_ids):
+            affected[labeltype] = pd.unique(object_ids)
+    return affected
+
+
+def incremental_recompute(
+    changes, sources, parcels, labelparameters=None, batch_size=1000, **kwargs
+):
+    """Recompute labels for a stream of labelparameter changes.
+
+    Changes are consumed in batches of batch_size. Changes that carry a value
+    (with start and end) are added to labelparameters before recomputing.
+    Yields (labeltype, label table of the affected parcels); kwargs are passed
+    to evaluate."""
+    changes = iter(changes)
+    while True:
+        batch = list(itertools.islice(changes, batch_size))
+        if not batch:
+            return
+        records = pd.DataFrame(batch)
+        if "value" in records.columns:
+            labelparameters = pd.concat(
+                [labelparameters, records[records["value"].notna()]],
+                ignore_index=True,
+            )
+        for labeltype, object_ids in affected_parcels(batch, sources).items():
+            selection = parcels.index.intersection(object_ids)
+            if len(selection) == 0:
+                continue
+            table = evaluate(
+                sources[labeltype],
+                parcels.loc[selection],
+                labelparameters=labelparameters,
+                **kwargs,
+            )
+            yield labeltype, table
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""Write computed label tables incrementally, chunk by chunk.
+
+Label tables are the (SetSeriesBlock) results of a labeltype, as computed by
+spiceup_labels.evaluate: DataFrames indexed by object_id. Each chunk is
+appended to the output as it is produced, nothing is concatenated in memory.
+
+Formats (chosen by file extension):
+
+- .parquet: Apache Parquet, one row group per chunk (needs pyarrow)
+- .arrow: Arrow IPC file, one record batch per chunk (needs pyarrow)
+- .ndjson / .jsonl: newline delimited json, one parcel per line
+"""
+
+import numpy as np
+import pandas as pd
+import simplejson
+
+ARROW_FORMATS = (".parquet", ".arrow")
+NDJSON_FORMATS = (".ndjson", ".jsonl")
+# schema metadata key of the index columns (json list) of Arrow label tables
+INDEX_METADATA = b"index_columns"
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:  # pragma: no cover
+        raise ImportError("Writing .parquet or .arrow label tables needs pyarrow")
+    return pyarrow
+
+
+def _columns(table, columns=None):
+    """(name, values) of the index (object_id, time) and the selected columns"""
+    names = []
+    for level, name in enumerate(table.index.names):
+        names.append(name or "object_id")
+        yield names[-1], table.index.get_level_values(level).to_numpy()
+    for column in columns or table.columns:
+        if column not in names:  # e.g. object_id, also a column of parcels
+            yield column, table[column].to_numpy()
+
+
+class NDJSONWriter:
+    """Append label tables to a newline delimited json file"""
+
+    def __init__(self, path, columns=None):
+        self.path = path
+        self.columns = columns
+        self.rows = 0
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, table):
+        names, values = zip(*_columns(table, self.columns))
+        lines = []
+        for row in zip(*(v.tolist() for v in values)):
+            record = dict(zip(names, row))
+            lines.append(simplejson.dumps(record, ignore_nan=True, default=str))
+        if lines:
+            self._file.write("\n".join(lines) + "\n")
+        self.rows += len(table)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ArrowWriter:
+    """Append label tables to a Parquet or Arrow IPC file.
+
+    Columns are wrapped as Arrow arrays straight from the evaluation buffers
+    (zero-copy for numeric columns without NaN). The schema is taken from the
+    first chunk, unless given, with the types of dtypes (column: numpy dtype)
+    taking precedence. Chunks with columns that are all null (and not in
+    dtypes) are held back until a chunk gives their type; at close the still
+    untyped columns are written as strings. Later chunks are cast to the
+    schema, so an int16 column that holds NaN in some chunk is written as
+    int16 with nulls. The index columns are stored in the schema metadata,
+    also when no chunk is written at all."""
+
+    def __init__(self, path, columns=None, schema=None, dtypes=None):
+        self.pa = _import_pyarrow()
+        self.path = path
+        self.columns = columns
+        self.schema = schema
+        self.dtypes = dtypes or {}
+        self.rows = 0
+        self._writer = None
+        self._pending = []
+
+    def _array(self, values):
+        pa = self.pa
+        try:
+            return pa.array(values, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # mixed objects (e.g. geometries), write their string representation
+            return pa.array([None if pd.isna(v) else str(v) for v in values])
+
+    def _type(self, name, default):
+        if name in self.dtypes:
+            return self.pa.from_numpy_dtype(np.dtype(self.dtypes[name]))
+        return default
+
+    def _declare(self, schema, index):
+        """schema with the declared dtypes and the index columns as metadata"""
+        pa = self.pa
+        fields = [
+            field.with_type(self._type(field.name, field.type)) for field in schema
+        ]
+        metadata = {INDEX_METADATA: simplejson.dumps(index)}
+        return pa.schema(fields, metadata=metadata)
+
+    def _empty_schema(self):
+        """Schema of a file without chunks: object_id and the declared columns"""
+        pa = self.pa
+        names = ["object_id"] + [
+            c for c in self.columns or self.dtypes if c != "object_id"
+        ]
+        fields = [pa.field("object_id", self._type("object_id", pa.int64()))]
+        fields += [pa.field(name, self._type(name, pa.string())) for name in names[1:]]
+        return self._declare(pa.schema(fields), ["object_id"])
+
+    def _promote_nulls(self, schema):
+        """Schema with string fields for the columns still without a type"""
+        pa = self.pa
+        return pa.schema(
+            [
+                field.with_type(pa.string()) if field.type == pa.null() else field
+                for field in schema
+            ],
+            metadata=schema.metadata,
+        )
+
+    def _open(self, schema):
+        pa = self.pa
+        if str(self.path).endswith(".parquet"):
+            import pyarrow.parquet
+
+            return pyarrow.parquet.ParquetWriter(self.path, schema)
+        return pa.ipc.new_file(self.path, schema)
+
+    def _cast(self, batch):
+        pa = self.pa
+        if batch.schema == self.schema:
+            return batch
+        arrays = [
+            column.cast(field.type) if column.type != field.type else column
+            for column, field in zip(batch.columns, self.schema)
+        ]
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def _flush(self):
+        if self._writer is None:
+            self._writer = self._open(self.schema)
+        for batch in self._pending:
+            self._writer.write_batch(self._cast(batch))
+        self._pending = []
+
+    def write(self, table):
+        pa = self.pa
+        names, values = zip(*_columns(table, self.columns))
+        batch = pa.RecordBatch.from_arrays([self._array(v) for v in values], names)
+        self._pending.append(batch)
+        self.rows += len(table)
+        if self._writer is None:
+            schema = self._declare(batch.schema, list(names[: table.index.nlevels]))
+            if self.schema is None:
+                self.schema = schema
+            elif pa.null() in self.schema.types:
+                # take the types of columns that were all null so far
+                self.schema = pa.schema(
+                    [
+                        new if field.type == pa.null() else field
+                        for field, new in zip(self.schema, schema)
+                    ],
+                    metadata=self.schema.metadata,
+                )
+            if pa.null() in self.schema.types:
+                return  # hold the chunk back until its columns have a type
+        self._flush()
+
+    def close(self):
+        if self._writer is None:
+            if self.schema is None:
+                self.schema = self._empty_schema()
+            self.schema = self._promote_nulls(self.schema)
+            self._flush()
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_writer(path, columns=None, dtypes=None):
+    """Label table writer for path, the format follows from the extension.
+
+    dtypes (column: numpy dtype) declares the column types of Arrow files,
+    e.g. for columns that may be all null in the first chunk."""
+    path = str(path)
+    if path.endswith(ARROW_FORMATS):
+        return ArrowWriter(path, columns, dtypes=dtypes)
+    if path.endswith(NDJSON_FORMATS):
+        return NDJSONWriter(path, columns)
+    raise ValueError(f"Unknown label table format: {path}")
+
+
+def write_labels(chunks, path, columns=None, dtypes=None):
+    """Write label table chunks (an iterable of DataFrames) to path.
+
+    Returns the number of rows written."""
+    with open_writer(path, columns, dtypes) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return writer.rows
+
+
+def _read_arrow(path):
+    """Label table and index columns (from the schema metadata) of an Arrow
+    or Parquet file"""
+    pa = _import_pyarrow()
+    if path.endswith(".parquet"):
+        import pyarrow.parquet
+
+        table = pyarrow.parquet.read_table(path)
+    else:
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+    metadata = table.schema.metadata or {}
+    index = metadata.get(INDEX_METADATA)
+    return table.to_pandas(), index and simplejson.loads(index)
+
+
+def read_labels(path, columns=None):
+    """Read a label table written by write_labels, indexed by its index columns:
+    object_id, or (object_id, time) for label tables of several times.
+
+    Arrow and Parquet files store the index columns in their metadata. NDJSON
+    files have no metadata, their index is object_id, and time when the second
+    column is named time."""
+    path = str(path)
+    if path.endswith(ARROW_FORMATS):
+        table, index = _read_arrow(path)
+    elif path.endswith(NDJSON_FORMATS):
+        table = pd.read_json(path, lines=True, dtype=False)
+        if table.empty:
+            table = pd.DataFrame(columns=["object_id"])
+        index = None
+    else:
+        raise ValueError(f"Unknown label table format: {path}")
+    if index is None:
+        index = list(table.columns[:1])
+        if list(table.columns[1:2]) == ["time"]:  # a (object_id, time) index
+            index.append("time")
+    if "time" in index:
+        table["time"] = pd.to_datetime(table["time"])
+    table = table.set_index(index)
+    if columns is not None:
+        table = table[[c for c in columns if c in table.columns]]
+    return table
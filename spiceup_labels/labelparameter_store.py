@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Embedded (SQLite) labelparameter store with as-of-time joins.
+
+Local stand-in for the Lizard labelparameter table, for local and batch
+evaluation. Records (object_id, label_type, name, value, start, end) are
+ingested in bulk and indexed on (object_id, name, start). At a given time,
+all labelparameters of all parcels are selected in one query and pivoted to
+a table with a column per labelparameter name, instead of joining them one
+by one.
+
+A record is valid from start up to (not including) end, an empty end means
+valid until further notice. If several records of a parcel and name are
+valid, the one with the latest start wins (as in spiceup_labels.evaluate).
+"""
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from spiceup_labels.evaluate import as_timestamp
+
+COLUMNS = ["object_id", "label_type", "name", "value", "start", "end"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS labelparameter (
+    object_id INTEGER NOT NULL,
+    label_type TEXT,
+    name TEXT NOT NULL,
+    value,
+    start TEXT NOT NULL,
+    "end" TEXT
+);
+CREATE INDEX IF NOT EXISTS labelparameter_object_name_start
+    ON labelparameter (object_id, name, start);
+CREATE INDEX IF NOT EXISTS labelparameter_name_start
+    ON labelparameter (name, start);
+"""
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _text(times):
+    """ISO text (sortable in SQL) of times, None for NaT"""
+    times = pd.to_datetime(pd.Series(times))
+    return times.dt.strftime(TIME_FORMAT).astype(object).where(times.notna(), None)
+
+
+class LabelparameterStore:
+    """Labelparameter records in a SQLite database (default in memory)"""
+
+    def __init__(self, path=":memory:"):
+        self.connection = sqlite3.connect(str(path))
+        self.connection.executescript(SCHEMA)
+
+    def __len__(self):
+        query = "SELECT COUNT(*) FROM labelparameter"
+        return self.connection.execute(query).fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def ingest(self, records, chunk_size=100000):
+        """Bulk insert a long labelparameter table, return the row count"""
+        records = pd.DataFrame(records).reindex(columns=COLUMNS)
+        count = 0
+        with self.connection:
+            for first in range(0, len(records), chunk_size):
+                chunk = records.iloc[first : first + chunk_size]
+                rows = zip(
+                    chunk["object_id"].astype("int64").tolist(),
+                    chunk["label_type"]
+                    .astype(object)
+                    .where(chunk["label_type"].notna(), None),
+                    chunk["name"].tolist(),
+                    chunk["value"].astype(object).where(chunk["value"].notna(), None),
+                    _text(chunk["start"]),
+                    _text(chunk["end"]),
+                )
+                self.connection.executemany(
+                    "INSERT INTO labelparameter VALUES (?, ?, ?, ?, ?, ?)", rows
+                )
+                count += len(chunk)
+        return count
+
+    def records(self, time=None, names=None, label_type=None):
+        """Long table of the records valid at time (latest start per parcel,
+        label_type and name), usable as labelparameters for evaluate"""
+        query = (
+            'SELECT object_id, label_type, name, value, start, "end" '
+            'FROM labelparameter WHERE start <= ? AND ("end" IS NULL OR "end" > ?)'
+        )
+        time = as_timestamp(time).strftime(TIME_FORMAT)
+        params = [time, time]
+        if names is not None:
+            names = list(names)
+            query += " AND name IN ({})".format(", ".join("?" * len(names)))
+            params += names
+        if label_type is not None:
+            query += " AND label_type = ?"
+            params.append(label_type)
+        query += " ORDER BY object_id, label_type, name, start"
+        records = pd.read_sql_query(query, self.connection, params=params)
+        records = records.drop_duplicates(
+            subset=["object_id", "label_type", "name"], keep="last"
+        )
+        for column in ("start", "end"):
+            records[column] = pd.to_datetime(records[column])
+        return records.reset_index(drop=True)
+
+    def pivot(self, time=None, names=None, label_type=None, object_ids=None):
+        """Table indexed by object_id with the value per labelparameter name
+        valid at time, NaN where a parcel has no valid record. Without
+        label_type, a name of several label_types takes the latest record."""
+        records = self.records(time, names, label_type)
+        records = records.sort_values("start", kind="stable").drop_duplicates(
+            subset=["object_id", "name"], keep="last"
+        )
+        table = records.pivot(index="object_id", columns="name", values="value")
+        table.columns.name = None
+        if names is not None:
+            table = table.reindex(columns=list(names))
+        if object_ids is not None:
+            table = table.reindex(np.asarray(object_ids))
+            table.index.name = "object_id"
+        return table
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""Lizard API location and credentials, shared by the scripts and clients"""
+
+import os
+
+# Lizard, or a local stand-in (see spiceup_labels.server)
+LIZARD_URL = os.environ.get("LIZARD_URL", "https://spiceup.lizard.net")
+
+# the labeltypes the farmer app computes (see README)
+APP_LABELTYPES = {
+    "calendar": "3d77fb10-1a2c-40ef-8396-f2bc2cd638e1",
+    "warning": "025a748d-4507-4b13-98af-ecae696bbeac",
+    "weather_home": "8ef4c780-6995-4935-8bd3-73440a689fc3",
+    "weather_all": "a686583a-da6c-40da-a001-32ed7412655b",
+}
+
+
+def lizard_headers(username=None, password=None):
+    """Request headers with Lizard credentials, by default from localsecret"""
+    if username is None or password is None:
+        import localsecret
+
+        username, password = localsecret.username, localsecret.password
+    return {
+        "username": username,
+        "password": password,
+        "Content-Type": "application/json",
+    }
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""Replay mobile app compute traffic against a labeltype compute endpoint.
+
+When the app opens, it requests the labels of the app labeltypes (calendar
+tasks, warning based tasks, weather info) for a parcel: a burst of compute
+calls. App opens arrive at a target rate (a Poisson process) for random
+parcels, or are replayed from a traffic log (ndjson lines with offset in
+seconds, labeltype uuid and object_id).
+
+Requests are sent on schedule (open loop) by a pool of workers, so a slow
+server shows as growing latency instead of a lower request rate. Latency
+counts from the scheduled send time, so requests waiting for a free worker
+or connection are not left out (coordinated omission); the time they waited
+is reported as send lag. The report has the p50 / p95 / p99 latency, the
+p99 send lag, throughput and error rate, overall and per labeltype. Use
+spiceup_labels.server as the endpoint to size the effect of graph changes
+before deploying. Against Lizard, pass credentials (--username and
+--password) and, for other endpoints, the request url template (--url).
+"""
+
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+
+from spiceup_labels.lizard_api import APP_LABELTYPES, lizard_headers
+
+logger = logging.getLogger(__name__)
+
+COMPUTE_URL = "{base_url}/api/v3/labeltypes/{uuid}/compute/?object_id={object_id}"
+
+
+def app_sessions(object_ids, labeltypes, rate, duration, seed=0):
+    """Schedule of (offset, labeltype uuid, object_id) for app opens at rate
+    per second during duration seconds, a burst of all labeltypes each"""
+    rng = np.random.default_rng(seed)
+    offset, schedule = 0.0, []
+    while True:
+        offset += rng.exponential(1 / rate)
+        if offset >= duration:
+            return schedule
+        object_id = int(rng.choice(object_ids))
+        for uuid in labeltypes:
+            schedule.append((offset, uuid, object_id))
+
+
+def read_traffic(path):
+    """Schedule from a traffic log with offset, labeltype and object_id"""
+    schedule = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                schedule.append(
+                    (record["offset"], record["labeltype"], int(record["object_id"]))
+                )
+    return sorted(schedule)
+
+
+def run_load(base_url, schedule, workers=32, timeout=30, headers=None, url=COMPUTE_URL):
+    """Send the requests of schedule on time, return a DataFrame with per
+    request the labeltype, status (0 for connection errors), scheduled send
+    time, latency from the scheduled send time and send lag"""
+    session = requests.Session()
+    session.headers.update(headers or {})
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def send(offset, uuid, object_id, started):
+        scheduled = started + offset
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        t0 = time.perf_counter()
+        try:
+            status = session.get(
+                url.format(base_url=base_url, uuid=uuid, object_id=object_id),
+                timeout=timeout,
+            ).status_code
+        except requests.RequestException:
+            status = 0
+        return uuid, status, offset, time.perf_counter() - scheduled, t0 - scheduled
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(send, *request, started) for request in schedule]
+        results = [future.result() for future in futures]
+    columns = ["labeltype", "status", "sent", "latency", "lag"]
+    return pd.DataFrame(results, columns=columns)
+
+
+def _stats(results):
+    ok = results["status"].between(200, 299)
+    latency = results["latency"] * 1000
+    lag = results["lag"] * 1000
+    span = (results["sent"] + results["latency"]).max() - results["sent"].min()
+    return {
+        "requests": len(results),
+        "errors": int((~ok).sum()),
+        "error_rate": float((~ok).mean()) if len(results) else 0.0,
+        "throughput": len(results) / span if span > 0 else float(len(results)),
+        "p50_ms": float(np.percentile(latency, 50)) if len(results) else None,
+        "p95_ms": float(np.percentile(latency, 95)) if len(results) else None,
+        "p99_ms": float(np.percentile(latency, 99)) if len(results) else None,
+        "p99_lag_ms": float(np.percentile(lag, 99)) if len(results) else None,
+    }
+
+
+def summarize(results):
+    """Latency percentiles, throughput (requests / s) and error rate,
+    overall and per labeltype"""
+    return {
+        "overall": _stats(results),
+        "labeltypes": {
+            labeltype: _stats(group)
+            for labeltype, group in results.groupby("labeltype")
+        },
+    }
+
+
+def parse_object_ids(text):
+    """Parcel ids from a range (1-5000) or a list (1,2,3)"""
+    if "-" in text:
+        first, last = map(int, text.split("-"))
+        return list(range(first, last + 1))
+    return [int(i) for i in text.split(",")]
+
+
+def get_parser():
+    """Return argument parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("base_url", help="e.g. http://localhost:8000")
+    parser.add_argument(
+        "-o", "--object-ids", help="parcel ids, e.g. 1-5000 or 1,2,3", default="1-100"
+    )
+    parser.add_argument(
+        "-l",
+        "--labeltype",
+        action="append",
+        default=None,
+        help="labeltype uuids (default the app labeltypes)",
+    )
+    parser.add_argument(
+        "-r", "--rate", type=float, default=5.0, help="app opens per second"
+    )
+    parser.add_argument(
+        "-d", "--duration", type=float, default=60.0, help="duration (seconds)"
+    )
+    parser.add_argument("--traffic", default=None, help="replay this traffic log")
+    parser.add_argument("-w", "--workers", type=int, default=32)
+    parser.add_argument("--report", default=None, help="JSON report to write")
+    parser.add_argument(
+        "--url",
+        default=COMPUTE_URL,
+        help="request url template with {base_url}, {uuid} and {object_id}",
+    )
+    parser.add_argument("--username", default=None, help="Lizard username")
+    parser.add_argument("--password", default=None, help="Lizard password")
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        dest="verbose",
+        default=False,
+        help="Verbose output",
+    )
+    return parser
+
+
+def main():  # pragma: no cover
+    """Replay app compute traffic and report latency and throughput"""
+    options = get_parser().parse_args()
+    log_level = logging.DEBUG if options.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(levelname)s: %(message)s")
+    if options.traffic:
+        schedule = read_traffic(options.traffic)
+    else:
+        schedule = app_sessions(
+            parse_object_ids(options.object_ids),
+            options.labeltype or list(APP_LABELTYPES.values()),
+            options.rate,
+            options.duration,
+        )
+    headers = None
+    if options.username:
+        headers = lizard_headers(options.username, options.password)
+    logger.info("sending %s requests", len(schedule))
+    results = run_load(
+        options.base_url, schedule, options.workers, headers=headers, url=options.url
+    )
+    report = summarize(results)
+    print(json.dumps(report, indent=2))
+    if options.report:
+        with open(options.report, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Read local stand-ins for Lizard data, for local and batch evaluation.
+
+- labeltype sources: the json files the patch scripts write (e.g.
+  calender_tasks.json), either a source or {"source": source}
+- parcels: a table with object_id (or id) and x, y or a point geometry, e.g.
+  the Shapes/parcels.shp written by get_parcels.py
+- labelparameters: a table with object_id, name, value, start and end
+- rasters: a json file with per raster uuid a constant, a GeoTIFF path or
+  "days_since_epoch"
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from spiceup_labels.evaluate import days_since_epoch
+
+
+def read_source(path):
+    """Labeltype source ({"graph": ..., "name": ...}) from a json file"""
+    with open(path) as f:
+        source = json.load(f)
+    if "graph" not in source and "source" in source:
+        source = source["source"]
+    return source
+
+
+def _read_table(path):
+    path = str(path)
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    if path.endswith(".csv"):
+        return pd.read_csv(path)
+    import geopandas  # shapefiles, geojson
+
+    return geopandas.read_file(path)
+
+
+def read_parcels(path):
+    """Parcels DataFrame indexed by object_id with x and y columns"""
+    parcels = _read_table(path)
+    if "geometry" in parcels.columns and "x" not in parcels.columns:
+        points = parcels.geometry.representative_point()
+        parcels = pd.DataFrame(parcels.drop(columns="geometry"))
+        parcels["x"], parcels["y"] = points.x.to_numpy(), points.y.to_numpy()
+    id_column = "object_id" if "object_id" in parcels.columns else "id"
+    parcels = parcels.set_index(parcels[id_column].astype("int64"))
+    parcels.index.name = "object_id"
+    return parcels
+
+
+def read_labelparameters(path):
+    """Long labelparameter table (object_id, name, value, start, end)"""
+    labelparameters = _read_table(path)
+    for column in ("start", "end"):
+        labelparameters[column] = pd.to_datetime(labelparameters[column])
+    return labelparameters
+
+
+def geotiff_sampler(path):
+    """Function(parcels, time) that samples a (static) GeoTIFF at x, y"""
+    from osgeo import gdal
+
+    dataset = gdal.Open(path)
+    band = dataset.GetRasterBand(1)
+    data = band.ReadAsArray().astype(float)
+    nodata = band.GetNoDataValue()
+    if nodata is not None:
+        data[data == nodata] = np.nan
+    x0, dx, _, y0, _, dy = dataset.GetGeoTransform()
+
+    def sample(parcels, time):
+        i = np.floor((parcels["y"].to_numpy() - y0) / dy).astype(int)
+        j = np.floor((parcels["x"].to_numpy() - x0) / dx).astype(int)
+        inside = (i >= 0) & (i < data.shape[0]) & (j >= 0) & (j < data.shape[1])
+        values = np.full(len(parcels), np.nan)
+        values[inside] = data[i[inside], j[inside]]
+        return values
+
+    return sample
+
+
+def read_rasters(path):
+    """Raster stand-ins for evaluate (see raster_sampler) from a json file"""
+    with open(path) as f:
+        config = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    rasters = {}
+    for uuid, value in config.items():
+        if value == "days_since_epoch":
+            rasters[uuid] = lambda parcels, time: days_since_epoch(time)
+        elif isinstance(value, str):
+            rasters[uuid] = geotiff_sampler(os.path.join(base, value))
+        else:
+            rasters[uuid] = value
+    return rasters
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Read and atomically write the manifest (manifest.json) of an output dir.
+
+Used by backfill (its checkpoint manifest) and sharding (the shards)."""
+
+import json
+import os
+
+MANIFEST = "manifest.json"
+
+
+def manifest_path(directory):
+    return os.path.join(directory, MANIFEST)
+
+
+def load_manifest(directory):
+    """Manifest of directory, None if it has none"""
+    path = manifest_path(directory)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(directory, manifest):
+    """Atomically replace the manifest of directory"""
+    path = manifest_path(directory)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
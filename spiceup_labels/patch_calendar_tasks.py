@@ -703,7 +703,12 @@ def main():  # pragma: no cover
     )
 
     logging.info("serialize model and replace local data with lizard data")
-    dg_source = get_labeltype_source(result_seriesblock, graph_rasters, labeled_parcels)
+    dg_source = get_labeltype_source(
+        result_seriesblock,
+        graph_rasters,
+        labeled_parcels,
+        clock_raster=lizard_rasters.get("days_since_epoch_raster"),
+    )
     with open('calender_tasks.json', 'w+') as f:
         json.dump(dg_source, f)
     logging.info("Send to Lizard")
@@ -22,7 +22,7 @@ from growth_health_tasks_config import (
     health_codes,
 )
 
-from spiceup_labels.config_lizard import patch_labeltype
+from spiceup_labels.config_lizard import labelparameter_blocks, patch_labeltype
 
 
 def get_parser():
@@ -69,37 +69,18 @@ def main():  # pragma: no cover
         raise Exception("Bounds and periods sheets have a different amount of columns")
 
     # Add labelparameters
-    labelparam_counter = 2
-
     labelparams = list(periods.index) + list(health.index)
-
-    for lp in labelparams:
-        labelparam_counter += 1
-        if lp == labelparams[-1]:
-            key = "parcels.all.labelparams"
-        else:
-            key = "parcels.add.labelparams.{}".format(labelparam_counter)
-
-        query = {
-            "label_type__uuid": "495706f7-0f59-4eaf-a4d8-bf65946b7c62",
-            "name": lp.replace(".","_"),
-            "end": None,
-        }
-        matchdic = {"object_id": "object_id"}
-        coldic = {"value": lp.replace(".","_")}
-        l = [
-            "geoblocks.geometry.sources.AddDjangoFields",
-            "parcels.add.labelparams.{}".format(labelparam_counter - 1),
-            "lizard_nxt",
-            "labelparameter",
-            query,
-            matchdic,
-            coldic,
-            "start",
-            "end",
-        ]
-
-        graph[key] = l
+    columns = {lp.replace(".", "_"): lp.replace(".", "_") for lp in labelparams}
+    graph.update(
+        labelparameter_blocks(
+            columns,
+            "495706f7-0f59-4eaf-a4d8-bf65946b7c62",
+            source="parcels.add.labelparams.2",
+            key="parcels.all.labelparams",
+            prefix="parcels.add.labelparams.",
+            filters={"end": None},
+        )
+    )
 
     # Create seriesblocks
     for lp in labelparams:
@@ -9,34 +9,25 @@ import json
 import logging
 import pandas as pd
 from localsecret import username, password
-from spiceup_labels.config_lizard import patch_labeltype, configure_logger
+from spiceup_labels.config_lizard import (
+    configure_logger,
+    labelparameter_blocks,
+    patch_labeltype,
+)
 
 #%%
 
-def create_labelparam(name, labelparam_uuid, prev, number):
-    key = f"labelparams.{number}"
-    value = [
-            "django_geoblocks.blocks.sources.AddDjangoFields",
-            prev,
-            "lizard_nxt",
-            "labelparameter",
-            {
-                "name": name,
-                "label_type__uuid": labelparam_uuid
-            },
-            {
-                "object_id": "object_id"
-            },
-            {
-                "value": "{}_reports".format(name)
-            },
-            "start",
-            "end"
-        ]
-    
-    return {key: value}
-    
-    
+def create_labelparams(labelparams, labelparam_uuid, prev, key):
+    """Join labelparams (name: column) in a chain of labelparameter blocks"""
+    return labelparameter_blocks(
+        labelparams,
+        labelparam_uuid,
+        source=prev,
+        key=key,
+        prefix="labelparams.",
+        block="django_geoblocks.blocks.sources.AddDjangoFields",
+    )
+
 
 def create_lizardrastersource(code, uuid):
     key = code
@@ -167,16 +158,11 @@ def main():
     
     
     logger.info("Adding labelparams")
-    for i, rast in enumerate(rasters.keys()):
-        if i == 0:
-            prev = "parcels"
-        else:
-            prev = f"labelparams.{i}"
-            
-        labelparam = create_labelparam(rast, labelparam_uuid, prev, i+1)
-        graph.update(labelparam)
-    
-    sourceblock = next(iter(labelparam.keys()))
+    sourceblock = f"labelparams.{len(rasters)}"
+    labelparams = {rast: f"{rast}_reports" for rast in rasters}
+    graph.update(
+        create_labelparams(labelparams, labelparam_uuid, "parcels", sourceblock)
+    )
     logger.info(f"Building rest of block with sourceblock {sourceblock}")
     
     logger.info("adding aggregate")
@@ -194,13 +180,13 @@ def main():
         mask = create_mask(code)
         graph.update(mask)
         
-        if i!=0:
+        if i == 0:
+            prev = next(iter(mask.keys()))
+        else:
             current = next(iter(mask.keys()))
             sumblock = add_sum(i, current, prev)
             graph.update(sumblock)
-            prev = next(iter(sumblock.keys()))    
-        else: 
-            prev = next(iter(mask.keys()))
+            prev = next(iter(sumblock.keys()))
     
     classify = {"overall.pd.report": [
         "dask_geomodeling.geometry.field_operations.Classify",
@@ -220,7 +220,12 @@ def main():  # pragma: no cover
     result_seriesblock = SetSeriesBlock(*sb_parcels)
 
     logger.info("serialize model and replace local data with lizard data")
-    dg_source = get_labeltype_source(result_seriesblock, graph_rasters, labeled_parcels)
+    dg_source = get_labeltype_source(
+        result_seriesblock,
+        graph_rasters,
+        labeled_parcels,
+        clock_raster=lizard_rasters.get("days_since_epoch_raster"),
+    )
     logger.info("update the labeltype model")
     with open("warning_based_tasks.json", "w+") as f:
         json.dump(dg_source ,f)
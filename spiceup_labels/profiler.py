@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""Profile the evaluation of a labeltype graph per block and per block type.
+
+The labeltype graph is evaluated locally (see spiceup_labels.evaluate) on a
+sample of parcels. For every block the wall time, the peak memory allocated
+while computing it (tracemalloc) and the size of its output are recorded. The
+report is a table sorted by any of these, per block or per block type, and
+can be saved as JSON.
+"""
+
+import argparse
+import json
+import logging
+import time
+import tracemalloc
+
+import pandas as pd
+
+from spiceup_labels.evaluate import block_name, evaluate
+from spiceup_labels.local_data import (
+    read_labelparameters,
+    read_parcels,
+    read_rasters,
+    read_source,
+)
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["key", "block", "seconds", "peak_bytes", "output_bytes", "rows"]
+
+
+def output_size(result):
+    """(bytes, rows) of a block result"""
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(deep=True).sum()), len(result)
+    if isinstance(result, pd.Series):
+        return int(result.memory_usage(deep=True)), len(result)
+    return 0, 0
+
+
+def _reset_peak():
+    """Reset the traced peak memory. tracemalloc.reset_peak is new in Python
+    3.9, before that clear_traces resets the peak (and the traces)"""
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    else:  # pragma: no cover
+        tracemalloc.clear_traces()
+
+
+class BlockProfiler:
+    """Evaluation hook recording time, memory and output size per block"""
+
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, key, path, compute):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        _reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        try:
+            result = compute()
+        finally:
+            seconds = time.perf_counter() - t0
+            peak = tracemalloc.get_traced_memory()[1] - before
+            if started:
+                tracemalloc.stop()
+        output_bytes, rows = output_size(result)
+        self.records.append(
+            (key, block_name(path), seconds, max(peak, 0), output_bytes, rows)
+        )
+        return result
+
+    def table(self, sort_by="seconds"):
+        """Per block DataFrame, sorted descending by sort_by"""
+        table = pd.DataFrame(self.records, columns=COLUMNS)
+        return table.sort_values(sort_by, ascending=False, ignore_index=True)
+
+    def by_block_type(self, sort_by="seconds"):
+        """Per block type totals (peak_bytes is the maximum), sorted by sort_by"""
+        table = pd.DataFrame(self.records, columns=COLUMNS)
+        grouped = table.groupby("block").agg(
+            count=("key", "size"),
+            seconds=("seconds", "sum"),
+            peak_bytes=("peak_bytes", "max"),
+            output_bytes=("output_bytes", "sum"),
+        )
+        return grouped.sort_values(sort_by, ascending=False).reset_index()
+
+    def report(self):
+        """JSON serializable report"""
+        return {
+            "total_seconds": float(sum(record[2] for record in self.records)),
+            "blocks": self.table().to_dict(orient="records"),
+            "block_types": self.by_block_type().to_dict(orient="records"),
+        }
+
+
+def profile(source, parcels, repeat=1, **kwargs):
+    """Evaluate source on parcels repeat times, return the BlockProfiler.
+
+    kwargs (labelparameters, rasters, time) are passed to evaluate."""
+    profiler = BlockProfiler()
+    for _ in range(repeat):
+        evaluate(source, parcels, hook=profiler, **kwargs)
+    return profiler
+
+
+def get_parser():
+    """Return argument parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("source", help="labeltype source (.json)")
+    parser.add_argument("parcels", help="parcels (.shp, .geojson, .csv, .parquet)")
+    parser.add_argument(
+        "-l", "--labelparameters", default=None, help="labelparameters (.csv)"
+    )
+    parser.add_argument(
+        "-r", "--rasters", default=None, help="raster stand-ins per uuid (.json)"
+    )
+    parser.add_argument("-t", "--time", default=None, help="time (default now)")
+    parser.add_argument(
+        "-n", "--sample", type=int, default=None, help="profile a parcel sample"
+    )
+    parser.add_argument(
+        "-s",
+        "--sort",
+        default="seconds",
+        choices=["seconds", "peak_bytes", "output_bytes"],
+        help="sort the table by (default seconds)",
+    )
+    parser.add_argument(
+        "--by-type", action="store_true", help="show totals per block type"
+    )
+    parser.add_argument("--top", type=int, default=30, help="table rows to show")
+    parser.add_argument("-o", "--output", default=None, help="JSON report to write")
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        dest="verbose",
+        default=False,
+        help="Verbose output",
+    )
+    return parser
+
+
+def main():  # pragma: no cover
+    """Profile a labeltype source per block"""
+    options = get_parser().parse_args()
+    log_level = logging.DEBUG if options.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(levelname)s: %(message)s")
+    parcels = read_parcels(options.parcels)
+    if options.sample and options.sample < len(parcels):
+        parcels = parcels.sample(options.sample, random_state=0)
+    labelparameters = None
+    if options.labelparameters:
+        labelparameters = read_labelparameters(options.labelparameters)
+    profiler = profile(
+        read_source(options.source),
+        parcels,
+        labelparameters=labelparameters,
+        rasters=read_rasters(options.rasters) if options.rasters else None,
+        time=options.time,
+    )
+    if options.by_type:
+        table = profiler.by_block_type(options.sort)
+    else:
+        table = profiler.table(options.sort)
+    print(table.head(options.top).to_string(index=False))
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(profiler.report(), f, indent=2)
+        logger.info("report written to %s", options.output)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""Disk cache of sampled raster values per parcel, keyed by raster timestamp.
+
+Most raster inputs change slowly: the season onset rasters
+(doy_start_dry_season_raster, doy_start_rainy_season_raster) are monthly
+predictions and the NPK fertilizer rasters are static. A RasterCache stores
+the sampled values per (raster uuid, statistic, raster timestamp) and parcel
+in a SQLite database. Its sampler wraps a raster sampler (see
+spiceup_labels.evaluate.raster_sampler): parcels already sampled for the
+current timestamp of a raster are read from the cache (a hash lookup after
+the first read), so a daily run only samples rasters that published a new
+timestamp, and new parcels.
+
+The timestamp of a raster at a time comes from timestamps: a dict with per
+raster uuid its timestamps (one, or a list of them; the latest one up to the
+time is used) or STATIC, or a function(uuid, time). Rasters without
+timestamp, and times per parcel row, are sampled without cache. Values are
+cached per object_id: clear a raster when parcel geometries change.
+"""
+
+import sqlite3
+
+import pandas as pd
+import requests
+
+from spiceup_labels.evaluate import as_timestamp, raster_sampler
+from spiceup_labels.lizard_api import LIZARD_URL, lizard_headers
+
+STATIC = "static"  # timestamp of rasters that never change
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS raster_value (
+    uuid TEXT NOT NULL,
+    statistic TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    object_id INTEGER NOT NULL,
+    value REAL,
+    PRIMARY KEY (uuid, statistic, timestamp, object_id)
+);
+"""
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def raster_timestamp(timestamps, uuid, time):
+    """Timestamp (text) of the raster value at time, None if unknown"""
+    if callable(timestamps):
+        timestamp = timestamps(uuid, time)
+    else:
+        timestamp = timestamps.get(uuid)
+        if isinstance(timestamp, (list, tuple)):
+            earlier = [as_timestamp(t) for t in timestamp if as_timestamp(t) <= time]
+            timestamp = max(earlier, default=None)
+        elif timestamp not in (None, STATIC) and as_timestamp(timestamp) > time:
+            timestamp = None  # the raster value at time is not the latest one
+    if timestamp is None or timestamp == STATIC:
+        return timestamp
+    return as_timestamp(timestamp).strftime(TIME_FORMAT)
+
+
+def lizard_raster_timestamps(uuids, lizard_url=None, username=None, password=None):
+    """{uuid: last timestamp, or STATIC for non temporal rasters} from Lizard"""
+    headers = lizard_headers(username, password)
+    lizard_url = lizard_url or LIZARD_URL
+    timestamps = {}
+    for uuid in uuids:
+        response = requests.get(f"{lizard_url}/api/v3/rasters/{uuid}/", headers=headers)
+        response.raise_for_status()
+        raster = response.json()
+        if raster.get("temporal"):
+            timestamps[uuid] = raster["last_value_timestamp"]
+        else:
+            timestamps[uuid] = STATIC
+    return timestamps
+
+
+class RasterCache:
+    """Sampled raster values in a SQLite database (default in memory)"""
+
+    def __init__(self, path=":memory:"):
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self._values = {}  # (uuid, statistic, timestamp): Series by object_id
+        self.hits = 0  # parcel values read from the cache
+        self.sampled = 0  # parcel values sampled
+
+    def __len__(self):
+        query = "SELECT COUNT(*) FROM raster_value"
+        return self.connection.execute(query).fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, uuid, statistic, timestamp):
+        """Cached values (Series indexed by object_id) of a raster timestamp"""
+        key = (uuid, statistic, timestamp)
+        if key not in self._values:
+            rows = self.connection.execute(
+                "SELECT object_id, value FROM raster_value "
+                "WHERE uuid = ? AND statistic = ? AND timestamp = ?",
+                key,
+            ).fetchall()
+            object_ids, values = zip(*rows) if rows else ((), ())
+            self._values[key] = pd.Series(
+                values, index=pd.Index(object_ids, name="object_id"), dtype=float
+            )
+        return self._values[key]
+
+    def put(self, uuid, statistic, timestamp, values):
+        """Add values (Series indexed by object_id) of a raster timestamp"""
+        values = pd.Series(values, dtype=float)
+        rows = zip(
+            [uuid] * len(values),
+            [statistic] * len(values),
+            [timestamp] * len(values),
+            values.index.astype("int64").tolist(),
+            values.astype(object).where(values.notna(), None).tolist(),
+        )
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO raster_value VALUES (?, ?, ?, ?, ?)", rows
+            )
+        cached = self.get(uuid, statistic, timestamp)
+        cached = pd.concat([cached[~cached.index.isin(values.index)], values])
+        self._values[(uuid, statistic, timestamp)] = cached
+        return cached
+
+    def timestamps(self, uuid):
+        """Cached timestamps of a raster, sorted"""
+        rows = self.connection.execute(
+            "SELECT DISTINCT timestamp FROM raster_value WHERE uuid = ? "
+            "ORDER BY timestamp",
+            (uuid,),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def prune(self, uuid, keep=1):
+        """Remove all but the keep latest timestamps of a raster"""
+        old = [t for t in self.timestamps(uuid) if t != STATIC][:-keep]
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM raster_value WHERE uuid = ? AND timestamp = ?",
+                [(uuid, timestamp) for timestamp in old],
+            )
+        for key in list(self._values):
+            if key[0] == uuid and key[2] in old:
+                del self._values[key]
+        return len(old)
+
+    def clear(self, uuid):
+        """Remove all cached values of a raster"""
+        with self.connection:
+            self.connection.execute("DELETE FROM raster_value WHERE uuid = ?", (uuid,))
+        for key in list(self._values):
+            if key[0] == uuid:
+                del self._values[key]
+
+    def sampler(self, rasters, timestamps):
+        """Raster sampler reading from the cache, sampling only parcels that
+        are not cached for the current timestamp of a raster with rasters
+        (see raster_sampler)"""
+        sample = raster_sampler(rasters)
+
+        def cached_sample(uuid, parcels, statistic, time):
+            if isinstance(time, pd.DatetimeIndex):
+                return sample(uuid, parcels, statistic, time)
+            timestamp = raster_timestamp(timestamps, uuid, as_timestamp(time))
+            if timestamp is None:
+                return sample(uuid, parcels, statistic, time)
+            object_ids = parcels.index.get_level_values(0)
+            cached = self.get(uuid, statistic, timestamp)
+            missing = ~object_ids.isin(cached.index)
+            if missing.any():
+                values = sample(uuid, parcels[missing], statistic, time)
+                values = pd.Series(values, index=object_ids[missing])
+                cached = self.put(uuid, statistic, timestamp, values)
+            self.sampled += int(missing.sum())
+            self.hits += int(len(object_ids) - missing.sum())
+            return cached.reindex(object_ids).to_numpy(dtype=float)
+
+        return cached_sample
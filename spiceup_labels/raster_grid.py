@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""Evaluate labeltypes over a raster grid, for dashboard maps.
+
+The B2B dashboard shows area wide maps of warnings and suitability. Every
+pixel becomes a virtual parcel (at the pixel center), with the same
+labelparameter values for all pixels. The grid is evaluated per block of
+rows, vectorized over all pixels of the block, and the numeric label columns
+are written as (tiled) GeoTIFFs.
+"""
+
+import argparse
+import logging
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from spiceup_labels.evaluate import evaluate
+from spiceup_labels.local_data import read_rasters, read_source
+
+logger = logging.getLogger(__name__)
+
+# geotransform like: x0, y0 of the upper left corner, dy negative
+Grid = namedtuple("Grid", ["x0", "y0", "dx", "dy", "width", "height", "projection"])
+
+
+def grid_from_bbox(bbox, pixel_size, projection="EPSG:4326"):
+    """Grid covering bbox (min_x, min_y, max_x, max_y)"""
+    min_x, min_y, max_x, max_y = bbox
+    # round first, so a bbox of 0.5 wide with 0.1 pixels is 5 (not 6) wide
+    width = int(np.ceil(np.round((max_x - min_x) / pixel_size, 6)))
+    height = int(np.ceil(np.round((max_y - min_y) / pixel_size, 6)))
+    return Grid(min_x, max_y, pixel_size, -pixel_size, width, height, projection)
+
+
+def pixel_parcels(grid, first_row, rows):
+    """Virtual parcels for rows of the grid, object_id is the pixel number"""
+    i, j = np.divmod(np.arange(rows * grid.width), grid.width)
+    i += first_row
+    return pd.DataFrame(
+        {
+            "x": grid.x0 + (j + 0.5) * grid.dx,
+            "y": grid.y0 + (i + 0.5) * grid.dy,
+        },
+        index=pd.Index(i * grid.width + j, name="object_id"),
+    )
+
+
+def evaluate_grid(source, grid, columns, block_rows=256, **kwargs):
+    """Yield (first row, {column: 2D array}) per block of grid rows.
+
+    kwargs are passed to evaluate, e.g. labelparameters as a dict with a
+    value per labelparameter name."""
+    for first_row in range(0, grid.height, block_rows):
+        rows = min(block_rows, grid.height - first_row)
+        labels = evaluate(source, pixel_parcels(grid, first_row, rows), **kwargs)
+        yield first_row, {
+            column: labels[column].to_numpy(dtype="float32").reshape(rows, grid.width)
+            for column in columns
+        }
+
+
+def write_geotiffs(blocks, grid, paths, nodata=-9999.0):
+    """Write the blocks of evaluate_grid, a GeoTIFF per column in paths"""
+    from osgeo import gdal, osr
+
+    srs = osr.SpatialReference()
+    srs.SetFromUserInput(grid.projection)
+    driver = gdal.GetDriverByName("GTiff")
+    datasets = {}
+    for column, path in paths.items():
+        dataset = driver.Create(
+            path,
+            grid.width,
+            grid.height,
+            1,
+            gdal.GDT_Float32,
+            options=["TILED=YES", "COMPRESS=DEFLATE"],
+        )
+        dataset.SetGeoTransform((grid.x0, grid.dx, 0, grid.y0, 0, grid.dy))
+        dataset.SetProjection(srs.ExportToWkt())
+        dataset.GetRasterBand(1).SetNoDataValue(nodata)
+        datasets[column] = dataset
+    for first_row, arrays in blocks:
+        logger.debug("writing rows from %s", first_row)
+        for column, dataset in datasets.items():
+            array = np.where(np.isnan(arrays[column]), nodata, arrays[column])
+            dataset.GetRasterBand(1).WriteArray(array, 0, first_row)
+    for dataset in datasets.values():
+        dataset.FlushCache()
+
+
+def get_parser():
+    """Return argument parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("source", help="labeltype source (.json)")
+    parser.add_argument("rasters", help="raster stand-ins per uuid (.json)")
+    parser.add_argument(
+        "-c",
+        "--column",
+        nargs=2,
+        action="append",
+        metavar=("COLUMN", "GEOTIFF"),
+        required=True,
+        help="numeric label column and the GeoTIFF to write it to",
+    )
+    parser.add_argument(
+        "-b",
+        "--bbox",
+        nargs=4,
+        type=float,
+        required=True,
+        metavar=("MIN_X", "MIN_Y", "MAX_X", "MAX_Y"),
+    )
+    parser.add_argument("-s", "--pixel-size", type=float, default=0.01)
+    parser.add_argument("--projection", default="EPSG:4326")
+    parser.add_argument(
+        "-l",
+        "--labelparameter",
+        nargs=2,
+        action="append",
+        default=[],
+        metavar=("NAME", "VALUE"),
+        help="labelparameter value for all pixels, e.g. live_support 1",
+    )
+    parser.add_argument("-t", "--time", default=None, help="time (default now)")
+    parser.add_argument("--block-rows", type=int, default=256)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        dest="verbose",
+        default=False,
+        help="Verbose output",
+    )
+    return parser
+
+
+def main():  # pragma: no cover
+    """Evaluate a labeltype over a raster grid and write GeoTIFFs"""
+    options = get_parser().parse_args()
+    log_level = logging.DEBUG if options.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(levelname)s: %(message)s")
+    grid = grid_from_bbox(options.bbox, options.pixel_size, options.projection)
+    paths = dict(options.column)
+    logger.info("evaluating %s x %s pixels", grid.width, grid.height)
+    blocks = evaluate_grid(
+        read_source(options.source),
+        grid,
+        list(paths),
+        block_rows=options.block_rows,
+        labelparameters={name: float(value) for name, value in options.labelparameter},
+        rasters=read_rasters(options.rasters),
+        time=options.time,
+    )
+    write_geotiffs(blocks, grid, paths)
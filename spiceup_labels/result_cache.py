@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Cache computed labels per parcel, with TTL and LRU eviction.
+
+The mobile app computes labels per parcel, often several times a day for the
+same parcel, while the inputs change daily or less often. Results are cached
+by (labeltype graph hash, parcel id, input version stamp): as long as the
+graph and the inputs are unchanged, a repeated request skips evaluation.
+Alternatively, horizon_evaluate reuses the labels of a parcel until their
+valid_until horizon (see validity), instead of for a fixed version. Posted
+labelparameters are an input valid_until cannot foresee: invalidate_changes
+drops the labels of the parcels they affect.
+"""
+
+import hashlib
+import threading
+import time as _time
+from collections import OrderedDict
+
+import pandas as pd
+import simplejson
+
+from spiceup_labels.evaluate import as_timestamp, evaluate
+from spiceup_labels.incremental import affected_parcels
+from spiceup_labels.validity import VALID_UNTIL, valid_until
+
+_MISSING = object()
+
+
+def graph_hash(source):
+    """Stable hash of a labeltype source (graph and endpoint name)"""
+    text = simplejson.dumps(
+        [source["graph"], source["name"]], sort_keys=True, ignore_nan=True
+    )
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def daily_stamp(time=None):
+    """Input version stamp for inputs that change (at most) daily"""
+    return as_timestamp(time).strftime("%Y-%m-%d")
+
+
+class ResultCache:
+    """Thread safe LRU cache of which the entries expire after ttl seconds"""
+
+    def __init__(self, maxsize=100000, ttl=3600, clock=_time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key: (expires, value)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            expires, value = self._entries.get(key, (None, _MISSING))
+            if value is not _MISSING and expires <= self.clock():
+                del self._entries[key]
+                value = _MISSING
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        """Remove an entry, return whether it was cached"""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def hit_rate(self):
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def stats(self):
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
+
+
+def cached_evaluate(cache, source, parcels, version, **kwargs):
+    """Labels for parcels from cache, evaluating only the parcels missing in it.
+
+    version is the input version stamp (e.g. daily_stamp(time)), kwargs are
+    passed to evaluate. Returns the label table in the order of parcels."""
+    source_hash = graph_hash(source)
+    rows = {}
+    for object_id in parcels.index:
+        row = cache.get((source_hash, object_id, version))
+        if row is not None:
+            rows[object_id] = row
+    missing = parcels.index.difference(list(rows), sort=False)
+    if len(missing):
+        result = evaluate(source, parcels.loc[missing], **kwargs)
+        for position, object_id in enumerate(result.index):
+            row = result.iloc[[position]]
+            cache.put((source_hash, object_id, version), row)
+            rows[object_id] = row
+    return pd.concat([rows[object_id] for object_id in parcels.index])
+
+
+def horizon_ttl(time, until):
+    """Seconds from time until valid_until, no expiry for an unknown horizon"""
+    if pd.isna(until):
+        return float("inf")
+    return max((until - time).total_seconds(), 0.0)
+
+
+def horizon_evaluate(
+    cache,
+    source,
+    parcels,
+    time=None,
+    labelparameters=None,
+    raster_updates=None,
+    season_onsets=None,
+    **kwargs
+):
+    """Labels for parcels at time, reusing cached labels until valid_until.
+
+    Cached labels of a parcel are used from the time they were computed up
+    to their valid_until (see validity.valid_until for raster_updates and
+    season_onsets), so
+    only parcels of which an input changed are evaluated. Cache entries
+    expire after the time until valid_until instead of after the cache ttl.
+    kwargs are passed to evaluate. Returns the label table (with a
+    valid_until column) in the order of parcels."""
+    time = as_timestamp(time)
+    source_hash = graph_hash(source)
+    rows = {}
+    for object_id in parcels.index:
+        entry = cache.get((source_hash, object_id))
+        if entry is None:
+            continue
+        computed, until, row = entry
+        if computed <= time and (pd.isna(until) or time < until):
+            rows[object_id] = row
+    missing = parcels.index.difference(list(rows), sort=False)
+    if len(missing):
+        result = evaluate(
+            source,
+            parcels.loc[missing],
+            labelparameters=labelparameters,
+            time=time,
+            **kwargs,
+        )
+        until = valid_until(
+            source, result, time, labelparameters, raster_updates, season_onsets
+        )
+        result[VALID_UNTIL] = until
+        for position, object_id in enumerate(result.index):
+            row = result.iloc[[position]]
+            entry = (time, until.iloc[position], row)
+            cache.put((source_hash, object_id), entry, horizon_ttl(time, entry[1]))
+            rows[object_id] = row
+    return pd.concat([rows[object_id] for object_id in parcels.index])
+
+
+def invalidate_changes(cache, changes, sources):
+    """Remove the horizon_evaluate labels of parcels of which labelparameters
+    changed (records with at least object_id and name, see
+    incremental.affected_parcels). sources is a dict with the labeltype
+    sources. Returns {labeltype: object_ids} of the affected parcels."""
+    affected = affected_parcels(changes, sources)
+    for labeltype, object_ids in affected.items():
+        source_hash = graph_hash(sources[labeltype])
+        for object_id in object_ids:
+            cache.discard((source_hash, object_id))
+    return affected
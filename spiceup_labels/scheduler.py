@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""Spread the daily all-parcel computes over a time window, under a budget.
+
+Instead of computing every labeltype for every parcel at 06:00, the work of
+a run (labeltype, batch of parcel ids) is put in a persistent (SQLite) queue
+and sent at a limited rate: the requests per second budget, or less if the
+work fits in the time window at a lower rate. Warning based tasks go first,
+then weather and then calendar tasks, so warnings are fresh first.
+
+The queue survives restarts: a restarted scheduler continues with the work
+of the run that is not done yet. Failed work is retried a few times.
+"""
+
+import argparse
+import logging
+import sqlite3
+import time
+
+import requests
+
+from spiceup_labels.lizard_api import APP_LABELTYPES, LIZARD_URL, lizard_headers
+from spiceup_labels.loadtest import parse_object_ids
+
+logger = logging.getLogger(__name__)
+
+# labeltype names (see APP_LABELTYPES) in order of priority
+PRIORITY = ["warning", "weather_home", "weather_all", "calendar"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS task (
+    id INTEGER PRIMARY KEY,
+    run TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    labeltype TEXT NOT NULL,
+    object_ids TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS task_run_status ON task (run, status, priority, id);
+"""
+
+
+class TokenBucket:
+    """Allow rate events per second on average, bursts of at most capacity"""
+
+    def __init__(self, rate, capacity=1.0, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+
+    def acquire(self):
+        """Wait until a token is available and take it"""
+        while True:
+            now = self.clock()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            self.sleep((1 - self.tokens) / self.rate)
+
+
+class ComputeQueue:
+    """Persistent queue of compute tasks (labeltype, parcel ids) per run"""
+
+    def __init__(self, path=":memory:"):
+        self.connection = sqlite3.connect(str(path))
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def enqueue(self, run, labeltypes, object_ids, batch_size=50):
+        """Add the tasks of a run (once), labeltypes in order of priority.
+        Returns the number of tasks added."""
+        with self.connection:
+            query = "SELECT COUNT(*) FROM task WHERE run = ?"
+            if self.connection.execute(query, (run,)).fetchone()[0]:
+                return 0
+            object_ids = list(object_ids)
+            rows = [
+                (run, priority, labeltype, ",".join(map(str, batch)))
+                for priority, labeltype in enumerate(labeltypes)
+                for batch in (
+                    object_ids[first : first + batch_size]
+                    for first in range(0, len(object_ids), batch_size)
+                )
+            ]
+            self.connection.executemany(
+                "INSERT INTO task (run, priority, labeltype, object_ids) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def resume(self, run):
+        """Put tasks that were running when the scheduler stopped back"""
+        with self.connection:
+            self.connection.execute(
+                "UPDATE task SET status = 'pending' "
+                "WHERE run = ? AND status = 'running'",
+                (run,),
+            )
+
+    def next_task(self, run):
+        """(id, labeltype, object_ids) of the first pending task, or None"""
+        with self.connection:
+            row = self.connection.execute(
+                "SELECT id, labeltype, object_ids FROM task "
+                "WHERE run = ? AND status = 'pending' ORDER BY priority, id LIMIT 1",
+                (run,),
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE task SET status = 'running' WHERE id = ?", (row[0],)
+            )
+        return row[0], row[1], [int(i) for i in row[2].split(",")]
+
+    def done(self, task_id):
+        with self.connection:
+            self.connection.execute(
+                "UPDATE task SET status = 'done' WHERE id = ?", (task_id,)
+            )
+
+    def failed(self, task_id, error, max_attempts=3):
+        """Put a failed task back, or mark it failed after max_attempts"""
+        with self.connection:
+            self.connection.execute(
+                "UPDATE task SET attempts = attempts + 1, error = ?, "
+                "status = CASE WHEN attempts + 1 >= ? THEN 'failed' "
+                "ELSE 'pending' END WHERE id = ?",
+                (str(error), max_attempts, task_id),
+            )
+
+    def counts(self, run):
+        """{status: number of tasks} of a run"""
+        rows = self.connection.execute(
+            "SELECT status, COUNT(*) FROM task WHERE run = ? GROUP BY status", (run,)
+        )
+        return dict(rows.fetchall())
+
+
+def run_schedule(
+    queue,
+    run,
+    compute,
+    rate,
+    window=None,
+    max_attempts=3,
+    clock=time.monotonic,
+    sleep=time.sleep,
+):
+    """Process the pending tasks of run with compute(labeltype, object_ids).
+
+    Tasks are sent at rate per second, or slower if the pending tasks fit in
+    window seconds. Returns the task counts per status."""
+    queue.resume(run)
+    pending = queue.counts(run).get("pending", 0)
+    if window and pending:
+        rate = min(rate, pending / window)
+    bucket = TokenBucket(rate, clock=clock, sleep=sleep)
+    logger.info("%s: %s tasks at %.2f per second", run, pending, rate)
+    while True:
+        task = queue.next_task(run)
+        if task is None:
+            return queue.counts(run)
+        task_id, labeltype, object_ids = task
+        bucket.acquire()
+        try:
+            compute(labeltype, object_ids)
+        except Exception as e:
+            logger.warning("task %s (%s) failed: %s", task_id, labeltype, e)
+            queue.failed(task_id, e, max_attempts)
+        else:
+            queue.done(task_id)
+
+
+def http_compute(base_url=LIZARD_URL, headers=None, timeout=60):
+    """compute(labeltype, object_ids) requesting the labeltype compute endpoint"""
+    session = requests.Session()
+    session.headers.update(headers or {})
+
+    def compute(labeltype, object_ids):
+        response = session.get(
+            f"{base_url}/api/v3/labeltypes/{labeltype}/compute/",
+            params={"object_id": ",".join(map(str, object_ids))},
+            timeout=timeout,
+        )
+        response.raise_for_status()
+
+    return compute
+
+
+def get_parser():
+    """Return argument parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("queue", help="queue database (.sqlite)")
+    parser.add_argument("run", help="run id, e.g. the date 2021-03-01")
+    parser.add_argument("object_ids", help="parcel ids, e.g. 1-5000 or 1,2,3")
+    parser.add_argument("-u", "--url", default=LIZARD_URL, help="Lizard url")
+    parser.add_argument(
+        "-r", "--rate", type=float, default=2.0, help="requests per second budget"
+    )
+    parser.add_argument(
+        "-w", "--window", type=float, default=None, help="time window (seconds)"
+    )
+    parser.add_argument("-b", "--batch-size", type=int, default=50)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        dest="verbose",
+        default=False,
+        help="Verbose output",
+    )
+    return parser
+
+
+def main():  # pragma: no cover
+    """Compute all app labeltypes for all parcels, spread over a window"""
+    options = get_parser().parse_args()
+    log_level = logging.DEBUG if options.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(levelname)s: %(message)s")
+    queue = ComputeQueue(options.queue)
+    labeltypes = [APP_LABELTYPES[name] for name in PRIORITY]
+    queue.enqueue(
+        options.run,
+        labeltypes,
+        parse_object_ids(options.object_ids),
+        options.batch_size,
+    )
+    counts = run_schedule(
+        queue,
+        options.run,
+        http_compute(options.url, lizard_headers()),
+        options.rate,
+        options.window,
+    )
+    logger.info("%s: %s", options.run, counts)
+    queue.close()
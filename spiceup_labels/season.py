@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Season state of parcel-days as a vectorized NumPy kernel.
+
+The calendar and warning labeltypes derive the season state from the day of
+year, the season onset rasters and the plant month with chains of Modulo,
+Round and Classify blocks (season_conditions, season_state and
+ideal_season_state in patch_calendar_tasks, check_rainy_season in
+patch_warning_based_tasks). season_kernel computes the same values for plain
+arrays, e.g. for analytics over millions of parcel-days without evaluating a
+graph. The tests cross-check it against the graphs those builders construct.
+"""
+
+import numpy as np
+
+from spiceup_labels.evaluate import classify
+
+YEAR = 365.25
+
+# season (bool name): (onset, Classify bins and labels of days since onset)
+SEASON_CONDITIONS = {
+    "dry": ("dry", [0, 120, 242, 366], [2, 4, 0]),
+    "dry_early": ("dry", [0, 14, 120, 176, 366], [1, 2, 4, 0]),
+    "dry_late": ("dry", [0, 106, 120, 295, 366], [2, 3, 4, 0]),
+    "rainy": ("rainy", [0, 120, 242, 366], [6, 7, 4]),
+    "rainy_early": ("rainy", [0, 14, 190, 366], [5, 6, 4]),
+    "rainy_late": ("rainy", [0, 106, 120, 295, 366], [4, 7, 8, 0]),
+}
+
+# edges of the dry and rainy conditions in days since onset
+SEASON_EDGES = {
+    "dry": [0, 14, 106, 120, 176, 242, 295],
+    "rainy": [0, 14, 106, 120, 190, 242, 295],
+}
+
+# the state of a season when it is ideal
+IDEAL_STATES = {
+    "dry": 2,
+    "dry_early": 1,
+    "dry_late": 3,
+    "rainy": 6,
+    "rainy_early": 5,
+    "rainy_late": 7,
+}
+
+
+def day_of_year(days_since_epoch):
+    """Day of year as the labeltypes derive it from the epoch raster"""
+    return np.round(np.mod(np.asarray(days_since_epoch, dtype=float), YEAR))
+
+
+def days_since_onset(doy, onset):
+    """Days since the (rounded) onset day of year of a season, 0 - 365"""
+    days_until_jan_1 = np.asarray(doy, dtype=float) * -1 + YEAR
+    pos_days_until_onset = days_until_jan_1 + np.round(np.asarray(onset, dtype=float))
+    return np.mod(pos_days_until_onset * -1 + YEAR, YEAR)
+
+
+def season_conditions(doy, dry_onset, rainy_onset):
+    """{season: condition} of the (early / late) dry and rainy seasons"""
+    days_since = {
+        "dry": days_since_onset(doy, dry_onset),
+        "rainy": days_since_onset(doy, rainy_onset),
+    }
+    return {
+        season: classify(days_since[onset], bins, labels, False)
+        for season, (onset, bins, labels) in SEASON_CONDITIONS.items()
+    }
+
+
+def days_until_season_change(doy, dry_onset, rainy_onset):
+    """Days until the next edge of any season condition, the season state
+    cannot change before (see validity.season_horizon)"""
+    days_until_change = []
+    for season, onset in (("dry", dry_onset), ("rainy", rainy_onset)):
+        edges = SEASON_EDGES[season]
+        days_since = days_since_onset(doy, onset)
+        next_edge = classify(days_since, edges + [366], edges[1:] + [YEAR], False)
+        days_until_change.append(next_edge - days_since)
+    dry, rainy = days_until_change
+    with np.errstate(invalid="ignore"):
+        return np.where(dry < rainy, dry, rainy)
+
+
+def season_flags(plant_month, plant_months, months_ideal):
+    """{season: 0 / 1} per months_ideal entry, like season_state builds them.
+
+    plant_months and months_ideal are the calendar_tasks_plant_months and
+    months_ideal of months_n_days."""
+    plant_month = np.asarray(plant_month, dtype=float)
+    flags = {}
+    for c_label, c_months in months_ideal.items():
+        season = c_label.replace("months_ideal_", "").replace("_season", "")
+        ideal_months = classify(plant_month, plant_months, c_months, False)
+        with np.errstate(invalid="ignore"):
+            masked = np.where(ideal_months < 100, 1, plant_month)
+            flags[season] = (masked < 1000) * 1
+    return flags
+
+
+def season_kernel(doy, dry_onset, rainy_onset, plant_month, plant_months, months_ideal):
+    """Season state, ideal state and rainy season flag of parcel-days.
+
+    doy, dry_onset, rainy_onset and plant_month are equally long arrays (or
+    scalars); plant_months and months_ideal come from months_n_days. Returns
+    a dict of arrays:
+
+    - state_season: actual season state 1 - 8 (Dry early ... Rainy late)
+    - ideal_state_season: ideal season state for the plant month
+    - season_state: 0 below, 100 ideal, 200 above ideal (the
+      season_below_0_ideal_100_above_200 of ideal_season_state)
+    - rainy_season: whether the rainy season started after the dry season
+    """
+    doy, dry_onset, rainy_onset, plant_month = np.broadcast_arrays(
+        *[
+            np.asarray(values, dtype=float)
+            for values in (doy, dry_onset, rainy_onset, plant_month)
+        ]
+    )
+    shape = doy.shape
+    doy, dry_onset, rainy_onset, plant_month = [
+        values.ravel() for values in (doy, dry_onset, rainy_onset, plant_month)
+    ]
+    conditions = season_conditions(doy, dry_onset, rainy_onset)
+    flags = season_flags(plant_month, plant_months, months_ideal)
+    ideal_state = sum(flags[season] * IDEAL_STATES[season] for season in IDEAL_STATES)
+    state = sum(flags[season] * conditions[season] for season in IDEAL_STATES)
+    with np.errstate(invalid="ignore"):
+        season_state = ((state == ideal_state) * 1 + (state > ideal_state) * 2) * 100
+        rainy_season = days_since_onset(doy, rainy_onset) < days_since_onset(
+            doy, dry_onset
+        )
+    result = {
+        "state_season": state,
+        "ideal_state_season": ideal_state,
+        "season_state": season_state,
+        "rainy_season": rainy_season,
+    }
+    return {name: values.reshape(shape) for name, values in result.items()}
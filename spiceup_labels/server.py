@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""Local stand-in for the Lizard API endpoints we depend on.
+
+A small HTTP server that mimics:
+
+- api/v3/labeltypes/{uuid}/ (GET, PATCH): the labeltype with its source
+- api/v3/labeltypes/{uuid}/compute/?object_id=..&time=..: labels of parcels,
+  evaluated locally (spiceup_labels.evaluate) on the PATCHed source
+- api/v3/parcels/?in_bbox=..&page=..&page_size=..: paginated parcels
+
+Point patch_labeltype and get_parcels.py at it with the LIZARD_URL
+environment variable (e.g. http://localhost:8000), to run them hermetically
+and to measure the latency and throughput of labeltypes end to end. Every
+response has an X-Compute-Time header with the server side seconds.
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import numpy as np
+import simplejson
+
+from spiceup_labels.evaluate import evaluate
+from spiceup_labels.local_data import (
+    read_labelparameters,
+    read_parcels,
+    read_rasters,
+    read_source,
+)
+
+logger = logging.getLogger(__name__)
+
+LABELTYPE_URL = re.compile(r"^/api/v3/labeltypes/([\w-]+)/(compute/)?$")
+PARCELS_URL = "/api/v3/parcels/"
+PARCEL_SIZE = 0.0001  # degrees, parcels are served as squares around x, y
+
+
+class LabeltypeServer(ThreadingHTTPServer):
+    """Server holding the labeltypes, parcels and evaluation inputs.
+
+    kwargs (labelparameters, rasters) are passed to evaluate. If store_dir
+    is given, PATCHed labeltypes are kept there as {uuid}.json."""
+
+    daemon_threads = True
+
+    def __init__(self, address, parcels, store_dir=None, organisation="", **kwargs):
+        super().__init__(address, RequestHandler)
+        self.parcels = parcels
+        self.store_dir = store_dir
+        self.organisation = organisation
+        self.kwargs = kwargs
+        self.labeltypes = {}
+        self.lock = threading.Lock()
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+            for name in os.listdir(store_dir):
+                if name.endswith(".json"):
+                    uuid = name[: -len(".json")]
+                    source = read_source(os.path.join(store_dir, name))
+                    self.labeltypes[uuid] = source
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def patch_labeltype(self, uuid, source):
+        with self.lock:
+            self.labeltypes[uuid] = source
+            if self.store_dir:
+                path = os.path.join(self.store_dir, uuid + ".json")
+                with open(path + ".tmp", "w") as f:
+                    simplejson.dump(source, f, ignore_nan=True)
+                os.replace(path + ".tmp", path)
+
+    def compute(self, uuid, object_ids, time=None):
+        """Label records of parcels object_ids"""
+        source = self.labeltypes[uuid]
+        parcels = self.parcels.loc[self.parcels.index.intersection(object_ids)]
+        labels = evaluate(source, parcels, time=time, **self.kwargs)
+        if not hasattr(labels, "columns"):  # a labeltype with a series endpoint
+            labels = labels.to_frame("label")
+        labels = labels.drop(columns=labels.index.names, errors="ignore")
+        return [
+            {"object_id": object_id, **dict(zip(labels.columns, row))}
+            for object_id, row in zip(
+                labels.index.tolist(), labels.itertuples(index=False, name=None)
+            )
+        ]
+
+    def parcel_page(self, query):
+        """Paginated parcels (GeoJSON features) like api/v3/parcels/"""
+        parcels = self.parcels
+        if "in_bbox" in query:
+            min_x, min_y, max_x, max_y = map(float, query["in_bbox"].split(","))
+            x, y = parcels["x"].to_numpy(), parcels["y"].to_numpy()
+            parcels = parcels[(x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y)]
+        page, page_size = int(query.get("page", 1)), int(query.get("page_size", 100))
+        selection = parcels.iloc[(page - 1) * page_size : page * page_size]
+        features = [
+            self.parcel_feature(object_id, row)
+            for object_id, row in zip(selection.index, selection.to_dict("records"))
+        ]
+
+        def link(page):
+            return PARCELS_URL + "?" + urlencode({**query, "page": page})
+
+        pages = int(np.ceil(len(parcels) / page_size))
+        return {
+            "count": len(parcels),
+            "next": link(page + 1) if page < pages else None,
+            "previous": link(page - 1) if page > 1 else None,
+            "results": {"type": "FeatureCollection", "features": features},
+        }
+
+    def parcel_feature(self, object_id, row):
+        x, y, d = row["x"], row["y"], PARCEL_SIZE / 2
+        ring = [[x - d, y - d], [x + d, y - d], [x + d, y + d], [x - d, y + d]]
+        return {
+            "id": int(object_id),
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [ring + ring[:1]]},
+            "properties": {
+                "organisation": {"name": row.get("organisation", self.organisation)},
+                "code": row.get("code", ""),
+                "name": row.get("name", ""),
+                "external_id": row.get("external_id", ""),
+            },
+        }
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_PATCH(self):
+        self.handle_request("PATCH")
+
+    def handle_request(self, method):
+        started = time.perf_counter()
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            status, body = self.route(method, url.path, query)
+        except Exception as e:  # report, like Lizard, as server error
+            logger.exception("%s %s failed", method, self.path)
+            status, body = 500, {"detail": str(e)}
+        data = simplejson.dumps(body, ignore_nan=True, default=_json).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-Compute-Time", f"{time.perf_counter() - started:.6f}")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def route(self, method, path, query):
+        if path == PARCELS_URL and method == "GET":
+            return 200, self.server.parcel_page(query)
+        match = LABELTYPE_URL.match(path)
+        if match is None:
+            return 404, {"detail": "Not found."}
+        uuid, compute = match.groups()
+        if method == "PATCH" and not compute:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if "source" not in body:
+                return 400, {"source": ["This field is required."]}
+            self.server.patch_labeltype(uuid, body["source"])
+        if uuid not in self.server.labeltypes:
+            return 404, {"detail": "Not found."}
+        if not compute:
+            source = self.server.labeltypes[uuid]
+            return 200, {"uuid": uuid, "source": source}
+        object_ids = [int(i) for i in query.get("object_id", "").split(",") if i]
+        results = self.server.compute(uuid, object_ids, query.get("time"))
+        return 200, {"count": len(results), "results": results}
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def _json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def get_parser():
+    """Return argument parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("parcels", help="parcels (.shp, .geojson, .csv, .parquet)")
+    parser.add_argument(
+        "-l", "--labelparameters", default=None, help="labelparameters (.csv)"
+    )
+    parser.add_argument(
+        "-r", "--rasters", default=None, help="raster stand-ins per uuid (.json)"
+    )
+    parser.add_argument(
+        "-s", "--store-dir", default=None, help="keep PATCHed labeltypes here"
+    )
+    parser.add_argument("--organisation", default="G4AW SpiceUp")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("-p", "--port", type=int, default=8000)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        dest="verbose",
+        default=False,
+        help="Verbose output",
+    )
+    return parser
+
+
+def main():  # pragma: no cover
+    """Serve the local stand-in Lizard API"""
+    options = get_parser().parse_args()
+    log_level = logging.DEBUG if options.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(levelname)s: %(message)s")
+    labelparameters = None
+    if options.labelparameters:
+        labelparameters = read_labelparameters(options.labelparameters)
+    server = LabeltypeServer(
+        (options.host, options.port),
+        read_parcels(options.parcels),
+        store_dir=options.store_dir,
+        organisation=options.organisation,
+        labelparameters=labelparameters,
+        rasters=read_rasters(options.rasters) if options.rasters else None,
+    )
+    logger.info("serving on %s (export LIZARD_URL=%s)", server.url, server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
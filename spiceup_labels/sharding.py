@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""Split parcels into spatially coherent shards, and process a shard.
+
+Parcels are ordered by a space filling curve key (Morton / Z-order) of their
+coordinates, or by grid cell, and split into shards of (about) equal size.
+Parcels that are close together end up in the same shard, which keeps the
+raster working set of a worker small. Each shard is written as its own
+parcels file, listed in a manifest (manifest.json) with its size, bounding
+box and key range.
+
+A worker processes one shard independently: it reads the shard's parcels,
+evaluates a labeltype and writes the labels next to the shard. Nightly runs
+can be spread over machines by giving each a different shard id.
+"""
+
+import argparse
+import logging
+import os
+
+import numpy as np
+
+from spiceup_labels.evaluate import evaluate_chunks
+from spiceup_labels.label_writer import write_labels
+from spiceup_labels.local_data import (
+    read_labelparameters,
+    read_parcels,
+    read_rasters,
+    read_source,
+)
+from spiceup_labels.manifest import load_manifest, write_manifest
+
+logger = logging.getLogger(__name__)
+
+
+MAX_BITS = 16  # per axis, the interleaved key of both fits in 32 bits
+
+
+def _spread_bits(values):
+    """Insert a zero bit between the (lower 16) bits of uint32 values"""
+    values = values.astype("uint64") & 0xFFFF
+    values = (values | (values << 8)) & 0x00FF00FF
+    values = (values | (values << 4)) & 0x0F0F0F0F
+    values = (values | (values << 2)) & 0x33333333
+    values = (values | (values << 1)) & 0x55555555
+    return values
+
+
+def _cells(values, low, high, cells):
+    scaled = (values - low) / max(high - low, 1e-12) * cells
+    return np.clip(np.floor(scaled), 0, cells - 1).astype("uint64")
+
+
+def morton_keys(x, y, bbox=None, bits=16):
+    """Z-order key of x, y within bbox (default the extent of x, y).
+
+    Both axes are scaled alike (over the largest side of bbox), so that the
+    key order is equally coherent in both directions. bits (the cells per
+    axis are 2**bits) can be at most 16."""
+    if not 1 <= bits <= MAX_BITS:
+        raise ValueError(f"bits ({bits}) must be between 1 and {MAX_BITS}")
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if bbox is None:
+        bbox = (x.min(), y.min(), x.max(), y.max())
+    size = max(bbox[2] - bbox[0], bbox[3] - bbox[1])
+    cells = 2**bits
+    i = _cells(x, bbox[0], bbox[0] + size, cells)
+    j = _cells(y, bbox[1], bbox[1] + size, cells)
+    return _spread_bits(i) | (_spread_bits(j) << 1)
+
+
+def grid_keys(x, y, cell_size):
+    """Row major key of the grid cell (of cell_size degrees) of x, y"""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    column = np.floor((x - x.min()) / cell_size).astype("int64")
+    row = np.floor((y - y.min()) / cell_size).astype("int64")
+    return row * (column.max() + 1) + column
+
+
+def shard_parcels(parcels, shards, method="morton", cell_size=0.1):
+    """Yield (key range, parcels) of shards, ordered by spatial key.
+
+    With method="grid", the parcels of a grid cell are never split over
+    shards, so shards can differ in size."""
+    x, y = parcels["x"].to_numpy(), parcels["y"].to_numpy()
+    if method == "morton":
+        keys = morton_keys(x, y).astype("int64")
+    elif method == "grid":
+        keys = grid_keys(x, y, cell_size)
+    else:
+        raise ValueError(f"Unknown shard method {method}")
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    bounds = np.linspace(0, len(keys), shards + 1).astype(int)
+    if method == "grid":
+        bounds = np.unique(
+            np.searchsorted(keys, keys[np.minimum(bounds, len(keys) - 1)])
+        )
+        bounds = np.append(bounds[bounds < len(keys)], len(keys))
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if end > start:
+            key_range = (int(keys[start]), int(keys[end - 1]))
+            yield key_range, parcels.iloc[order[start:end]]
+
+
+def write_shards(parcels, output_dir, shards, method="morton", cell_size=0.1):
+    """Write shard parcel files (.parquet) and the manifest, return it"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {"method": method, "shards": {}}
+    if method == "grid":
+        manifest["cell_size"] = cell_size
+    for number, (key_range, shard) in enumerate(
+        shard_parcels(parcels, shards, method, cell_size), 1
+    ):
+        shard_id = f"shard-{number:04d}"
+        filename = shard_id + ".parquet"
+        shard.reset_index().to_parquet(os.path.join(output_dir, filename))
+        manifest["shards"][shard_id] = {
+            "file": filename,
+            "parcels": len(shard),
+            "key_range": key_range,
+            "bbox": [
+                float(shard["x"].min()),
+                float(shard["y"].min()),
+                float(shard["x"].max()),
+                float(shard["y"].max()),
+            ],
+        }
+    write_manifest(output_dir, manifest)
+    return manifest
+
+
+def process_shard(shard_dir, shard_id, source, extension=".parquet", **kwargs):
+    """Evaluate source for the parcels of a shard, write the labels.
+
+    The labels are written next to the shard (shard id + "_labels" +
+    extension); kwargs are passed to evaluate_chunks. Returns the path."""
+    shard = load_manifest(shard_dir)["shards"][shard_id]
+    parcels = read_parcels(os.path.join(shard_dir, shard["file"]))
+    path = os.path.join(shard_dir, shard_id + "_labels" + extension)
+    tmp_path = os.path.join(shard_dir, "tmp_" + shard_id + "_labels" + extension)
+    rows = write_labels(evaluate_chunks(source, parcels, **kwargs), tmp_path)
+    os.replace(tmp_path, path)
+    logger.info("%s: %s labels written to %s", shard_id, rows, path)
+    return path
+
+
+def get_parser():
+    """Return argument parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        dest="verbose",
+        default=False,
+        help="Verbose output",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    split = commands.add_parser("split", help="write shards and manifest")
+    split.add_argument("parcels", help="parcels (.shp, .geojson, .csv, .parquet)")
+    split.add_argument("shard_dir", help="directory for shards and manifest")
+    split.add_argument("-n", "--shards", type=int, default=8, help="shard count")
+    split.add_argument("-m", "--method", default="morton", choices=["morton", "grid"])
+    split.add_argument(
+        "--cell-size", type=float, default=0.1, help="grid cell size (degrees)"
+    )
+    work = commands.add_parser("work", help="process one shard")
+    work.add_argument("shard_dir", help="directory with shards and manifest")
+    work.add_argument("shard_id", help="shard to process, e.g. shard-0001")
+    work.add_argument("source", help="labeltype source (.json)")
+    work.add_argument(
+        "-l", "--labelparameters", default=None, help="labelparameters (.csv)"
+    )
+    work.add_argument(
+        "-r", "--rasters", default=None, help="raster stand-ins per uuid (.json)"
+    )
+    work.add_argument("-t", "--time", default=None, help="time (default now)")
+    work.add_argument(
+        "-f",
+        "--format",
+        default=".parquet",
+        choices=[".parquet", ".arrow", ".ndjson"],
+        help="label table format",
+    )
+    return parser
+
+
+def main():  # pragma: no cover
+    """Split parcels into shards or process a shard"""
+    options = get_parser().parse_args()
+    log_level = logging.DEBUG if options.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(levelname)s: %(message)s")
+    if options.command == "split":
+        manifest = write_shards(
+            read_parcels(options.parcels),
+            options.shard_dir,
+            options.shards,
+            options.method,
+            options.cell_size,
+        )
+        logger.info("%s shards written", len(manifest["shards"]))
+        return
+    labelparameters = None
+    if options.labelparameters:
+        labelparameters = read_labelparameters(options.labelparameters)
+    process_shard(
+        options.shard_dir,
+        options.shard_id,
+        read_source(options.source),
+        extension=options.format,
+        labelparameters=labelparameters,
+        rasters=read_rasters(options.rasters) if options.rasters else None,
+        time=options.time,
+    )
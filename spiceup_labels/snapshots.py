@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""Nightly label snapshots, served without recomputation.
+
+The nightly precompute evaluates each labeltype for all parcels and writes a
+versioned snapshot (<labeltype>/<version>.parquet) plus a pointer to the
+current version (<labeltype>/current.json, with the graph hash of the
+labeltype source). Older versions are kept for a number of nights.
+
+A SnapshotReader serves label lookups per parcel from the current snapshot
+(a dict lookup), and computes labels live for parcels that are not in it,
+e.g. parcels created after the snapshot, or of which the labels expired:
+snapshots have a valid_until column (see validity) and labels are not
+served after it, or after a labelparameter they depend on changed (see
+SnapshotReader.invalidate). A snapshot of another version of the labeltype
+graph is not served.
+"""
+
+import argparse
+import json
+import logging
+import os
+
+from spiceup_labels.evaluate import as_timestamp, evaluate
+from spiceup_labels.incremental import affected_parcels
+from spiceup_labels.label_writer import read_labels, write_labels
+from spiceup_labels.local_data import (
+    read_labelparameters,
+    read_parcels,
+    read_rasters,
+    read_source,
+)
+from spiceup_labels.result_cache import graph_hash
+from spiceup_labels.validity import VALID_UNTIL, valid_until
+
+logger = logging.getLogger(__name__)
+
+CURRENT = "current.json"
+
+
+def write_snapshot(
+    source,
+    parcels,
+    directory,
+    labeltype,
+    time=None,
+    keep=7,
+    raster_updates=None,
+    season_onsets=None,
+    **kwargs,
+):
+    """Evaluate source for parcels and write it as the current snapshot.
+
+    kwargs are passed to evaluate, raster_updates and season_onsets to
+    valid_until. Only the
+    keep latest versions are kept. Returns the snapshot metadata."""
+    time = as_timestamp(time)
+    labeltype_dir = os.path.join(directory, labeltype)
+    os.makedirs(labeltype_dir, exist_ok=True)
+    version = f"{time:%Y%m%dT%H%M%S}"
+    filename = version + ".parquet"
+    labels = evaluate(source, parcels, time=time, **kwargs)
+    labels[VALID_UNTIL] = valid_until(
+        source,
+        labels,
+        time,
+        kwargs.get("labelparameters"),
+        raster_updates,
+        season_onsets,
+    )
+    tmp_path = os.path.join(labeltype_dir, "tmp_" + filename)
+    rows = write_labels([labels], tmp_path)
+    os.replace(tmp_path, os.path.join(labeltype_dir, filename))
+    metadata = {
+        "version": version,
+        "file": filename,
+        "time": time.isoformat(),
+        "rows": rows,
+        "source_hash": graph_hash(source),
+    }
+    path = os.path.join(labeltype_dir, CURRENT)
+    with open(path + ".tmp", "w") as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(path + ".tmp", path)
+    versions = sorted(
+        name
+        for name in os.listdir(labeltype_dir)
+        if name.endswith(".parquet") and not name.startswith("tmp_")
+    )
+    for name in versions[:-keep]:
+        os.remove(os.path.join(labeltype_dir, name))
+    return metadata
+
+
+class SnapshotReader:
+    """Label lookups per parcel from the current snapshot of a labeltype.
+
+    Parcels missing in the snapshot or of which the labels expired are
+    computed live with evaluate(source, parcels, **kwargs), if parcels (a
+    DataFrame indexed by object_id, or a function(object_ids) returning one)
+    are given. raster_updates and season_onsets are passed to valid_until."""
+
+    def __init__(
+        self,
+        directory,
+        labeltype,
+        source,
+        parcels=None,
+        raster_updates=None,
+        season_onsets=None,
+        **kwargs,
+    ):
+        self.labeltype = labeltype
+        self.source = source
+        self.parcels = parcels
+        self.raster_updates = raster_updates
+        self.season_onsets = season_onsets
+        self.kwargs = kwargs
+        self.metadata = None
+        self.columns = []
+        self.rows = {}
+        path = os.path.join(directory, labeltype, CURRENT)
+        if not os.path.exists(path):
+            logger.warning("No snapshot of %s, computing live", labeltype)
+            return
+        with open(path) as f:
+            metadata = json.load(f)
+        if metadata["source_hash"] != graph_hash(source):
+            logger.warning("Snapshot of %s is of another graph, ignored", labeltype)
+            return
+        labels = read_labels(os.path.join(directory, labeltype, metadata["file"]))
+        self.metadata = metadata
+        self.columns = list(labels.columns)
+        self.rows = dict(zip(labels.index, labels.itertuples(index=False, name=None)))
+
+    @property
+    def version(self):
+        return self.metadata and self.metadata["version"]
+
+    def invalidate(self, changes):
+        """Stop serving the snapshot labels of parcels of which labelparameters
+        changed (records with at least object_id and name), so they are
+        computed live, with the labelparameters of kwargs. Returns the
+        object_ids of the affected parcels."""
+        affected = affected_parcels(changes, {self.labeltype: self.source})
+        object_ids = affected.get(self.labeltype, [])
+        for object_id in object_ids:
+            self.rows.pop(object_id, None)
+        return object_ids
+
+    def get(self, object_id, time=None):
+        """Labels (dict) of a parcel, None if it cannot be found"""
+        return self.lookup([object_id], time).get(object_id)
+
+    def lookup(self, object_ids, time=None):
+        """{object_id: labels} from the snapshot, missing parcels and parcels
+        of which the labels expired at time (default the time of kwargs, or
+        now) computed live"""
+        time = as_timestamp(self.kwargs.get("time") if time is None else time)
+        expires = None
+        if VALID_UNTIL in self.columns:
+            expires = self.columns.index(VALID_UNTIL)
+        result, missing = {}, []
+        for object_id in object_ids:
+            row = self.rows.get(object_id)
+            if row is None or (expires is not None and row[expires] <= time):
+                missing.append(object_id)
+            else:
+                result[object_id] = dict(zip(self.columns, row))
+        if missing and self.parcels is not None:
+            result.update(self.compute(missing, time))
+        return result
+
+    def compute(self, object_ids, time=None):
+        if callable(self.parcels):
+            parcels = self.parcels(object_ids)
+        else:
+            parcels = self.parcels.loc[self.parcels.index.intersection(object_ids)]
+        if len(parcels) == 0:
+            return {}
+        kwargs = dict(self.kwargs, time=as_timestamp(time or self.kwargs.get("time")))
+        labels = evaluate(self.source, parcels, **kwargs)
+        labels[VALID_UNTIL] = valid_until(
+            self.source,
+            labels,
+            kwargs["time"],
+            kwargs.get("labelparameters"),
+            self.raster_updates,
+            self.season_onsets,
+        )
+        # the same columns as a snapshot (object_id is not a column there)
+        labels = labels.drop(columns=labels.index.names, errors="ignore")
+        columns = list(labels.columns)
+        return {
+            object_id: dict(zip(columns, row))
+            for object_id, row in zip(
+                labels.index, labels.itertuples(index=False, name=None)
+            )
+        }
+
+
+def get_parser():
+    """Return argument parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("parcels", help="parcels (.shp, .geojson, .csv, .parquet)")
+    parser.add_argument("output_dir", help="directory for the snapshots")
+    parser.add_argument(
+        "sources",
+        nargs="+",
+        help="labeltype sources (.json), the file name is the labeltype name",
+    )
+    parser.add_argument(
+        "-l", "--labelparameters", default=None, help="labelparameters (.csv)"
+    )
+    parser.add_argument(
+        "-r", "--rasters", default=None, help="raster stand-ins per uuid (.json)"
+    )
+    parser.add_argument("-t", "--time", default=None, help="time (default now)")
+    parser.add_argument(
+        "-u",
+        "--raster-updates",
+        default=None,
+        help="next update time per raster uuid (.json), null if it never updates",
+    )
+    parser.add_argument(
+        "-k", "--keep", type=int, default=7, help="versions to keep (default 7)"
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        dest="verbose",
+        default=False,
+        help="Verbose output",
+    )
+    return parser
+
+
+def main():  # pragma: no cover
+    """Write the nightly snapshot of each labeltype"""
+    options = get_parser().parse_args()
+    log_level = logging.DEBUG if options.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(levelname)s: %(message)s")
+    parcels = read_parcels(options.parcels)
+    labelparameters = None
+    if options.labelparameters:
+        labelparameters = read_labelparameters(options.labelparameters)
+    rasters = read_rasters(options.rasters) if options.rasters else None
+    raster_updates = None
+    if options.raster_updates:
+        with open(options.raster_updates) as f:
+            raster_updates = json.load(f)
+    for path in options.sources:
+        labeltype = os.path.splitext(os.path.basename(path))[0]
+        metadata = write_snapshot(
+            read_source(path),
+            parcels,
+            options.output_dir,
+            labeltype,
+            time=options.time,
+            keep=options.keep,
+            raster_updates=raster_updates,
+            labelparameters=labelparameters,
+            rasters=rasters,
+        )
+        logger.info("%s: snapshot %s", labeltype, metadata["version"])
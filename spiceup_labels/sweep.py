@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Evaluate a labeltype over the full product of its (discrete) inputs.
+
+The calendar and warning models have small discrete input domains: plant
+age in days, variety, live support, season onset day of year, warning
+flags. A sweep evaluates a labeltype for every combination of the input
+values (a virtual parcel per combination, vectorized per block of rows) and
+reduces the outputs to a fingerprint: a sha256 per output column and one for
+all columns.
+
+Store the fingerprint before a change (graph optimization, spreadsheet
+update) and check it after: equal fingerprints mean the labeltype computes
+the same labels for the whole input domain, so it is safe to PATCH.
+
+A domain (json) has labelparameter and raster values, as lists or as
+{"start": .., "stop": .., "step": ..} ranges, and optionally a time:
+{"labelparameters": {"days_plant_age": {"start": 0, "stop": 3650}},
+ "rasters": {"<uuid>": [1, 2, 3]}, "time": "2021-01-01"}
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import sys
+
+import numpy as np
+import pandas as pd
+
+from spiceup_labels.change_feed import hash_column
+from spiceup_labels.evaluate import evaluate
+from spiceup_labels.local_data import read_source
+from spiceup_labels.result_cache import graph_hash
+
+logger = logging.getLogger(__name__)
+
+
+def domain_values(values):
+    """Array of the values of an input, from a list or a range"""
+    if isinstance(values, dict):
+        return np.arange(values["start"], values["stop"], values.get("step", 1))
+    return np.asarray(values)
+
+
+def domain_size(domain):
+    sizes = [
+        len(domain_values(values))
+        for group in ("labelparameters", "rasters")
+        for values in domain.get(group, {}).values()
+    ]
+    return int(np.prod(sizes)) if sizes else 0
+
+
+def combinations(domain, first, last):
+    """Input values of combinations first up to last, as
+    (labelparameters, rasters) dicts with an array each"""
+    inputs = [
+        (group, name, domain_values(values))
+        for group in ("labelparameters", "rasters")
+        for name, values in domain.get(group, {}).items()
+    ]
+    shape = [len(values) for group, name, values in inputs]
+    indices = np.unravel_index(np.arange(first, last), shape)
+    result = {"labelparameters": {}, "rasters": {}}
+    for (group, name, values), index in zip(inputs, indices):
+        result[group][name] = values[index]
+    return result["labelparameters"], result["rasters"]
+
+
+def sweep(source, domain, block_size=1000000, columns=None):
+    """Yield the label tables of all combinations of domain, per block"""
+    size = domain_size(domain)
+    for first in range(0, size, block_size):
+        last = min(first + block_size, size)
+        labelparameters, rasters = combinations(domain, first, last)
+        parcels = pd.DataFrame(
+            {"x": np.zeros(last - first), "y": np.zeros(last - first)},
+            index=pd.Index(np.arange(first, last), name="object_id"),
+        )
+        labels = evaluate(
+            source,
+            parcels,
+            labelparameters=labelparameters,
+            rasters=rasters,
+            time=domain.get("time"),
+        )
+        if isinstance(labels, pd.Series):
+            labels = labels.to_frame(labels.name or "label")
+        yield labels[columns or labels.columns.difference(parcels.columns, sort=False)]
+
+
+def fingerprint(tables):
+    """{"rows", "columns": {column: sha256}, "fingerprint"} of label tables"""
+    digests, rows = {}, 0
+    for table in tables:
+        rows += len(table)
+        for column in table.columns:
+            digest = digests.setdefault(column, hashlib.sha256())
+            digest.update(hash_column(table[column].to_numpy()).tobytes())
+    columns = {column: digest.hexdigest() for column, digest in digests.items()}
+    total = hashlib.sha256(json.dumps(columns, sort_keys=True).encode("utf-8"))
+    return {"rows": rows, "columns": columns, "fingerprint": total.hexdigest()}
+
+
+def compare_fingerprints(expected, actual):
+    """Columns of which the outputs differ (or that are missing / new)"""
+    names = set(expected["columns"]) | set(actual["columns"])
+    return sorted(
+        name
+        for name in names
+        if expected["columns"].get(name) != actual["columns"].get(name)
+    )
+
+
+def get_parser():
+    """Return argument parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("source", help="labeltype source (.json)")
+    parser.add_argument("domain", help="input domain (.json)")
+    parser.add_argument(
+        "-o", "--output", default=None, help="write the fingerprint (.json)"
+    )
+    parser.add_argument(
+        "-c", "--check", default=None, help="compare with this fingerprint (.json)"
+    )
+    parser.add_argument(
+        "--columns", nargs="+", default=None, help="output columns (default all)"
+    )
+    parser.add_argument("-b", "--block-size", type=int, default=1000000)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        dest="verbose",
+        default=False,
+        help="Verbose output",
+    )
+    return parser
+
+
+def main():  # pragma: no cover
+    """Sweep the input domain of a labeltype, write or check its fingerprint"""
+    options = get_parser().parse_args()
+    log_level = logging.DEBUG if options.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(levelname)s: %(message)s")
+    source = read_source(options.source)
+    with open(options.domain) as f:
+        domain = json.load(f)
+    logger.info("sweeping %s combinations", domain_size(domain))
+    result = fingerprint(sweep(source, domain, options.block_size, options.columns))
+    result["source_hash"] = graph_hash(source)
+    logger.info("fingerprint %s", result["fingerprint"])
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if options.check:
+        with open(options.check) as f:
+            differences = compare_fingerprints(json.load(f), result)
+        if differences:
+            logger.error("outputs differ: %s", ", ".join(differences))
+            sys.exit(1)
+        logger.info("outputs are equal to %s", options.check)
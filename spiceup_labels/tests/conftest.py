@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Shared fixtures: a small labeltype source with local stand-in data"""
+
+import pandas as pd
+import pytest
+
+APP_DATA = "3ab1addf-00e5-47b0-849e-ba55cd3024b9"
+EPOCH_RASTER = "days-since-epoch-uuid"
+
+# plant age from epoch raster and labelparameters, similar to actual_plant_age
+GRAPH = {
+    "parcels": [
+        "geoblocks.geometry.sources.GeoDjangoSource",
+        "hydra_core",
+        "parcel",
+        {"id": "object_id", "code": "Plot"},
+        "geometry",
+    ],
+    "parcels_add_days_plant_age": [
+        "geoblocks.geometry.sources.AddDjangoFields",
+        "parcels",
+        "lizard_nxt",
+        "labelparameter",
+        {"label_type__uuid": APP_DATA, "name": "days_plant_age"},
+        {"object_id": "object_id"},
+        {"value": "days_plant_age"},
+        "start",
+        "end",
+    ],
+    "parcels_labeled": [
+        "geoblocks.geometry.sources.AddDjangoFields",
+        "parcels_add_days_plant_age",
+        "lizard_nxt",
+        "labelparameter",
+        {"label_type__uuid": APP_DATA, "name": "pepper_variety"},
+        {"object_id": "object_id"},
+        {"value": "pepper_variety"},
+        "start",
+        "end",
+    ],
+    "epoch": ["lizard_nxt.blocks.LizardRasterSource", EPOCH_RASTER],
+    "epoch_agg": [
+        "dask_geomodeling.geometry.aggregate.AggregateRaster",
+        "parcels_labeled",
+        "epoch",
+        "max",
+        "EPSG:4326",
+        0.00001,
+        None,
+        "epoch_label",
+    ],
+    "epoch_sb": [
+        "dask_geomodeling.geometry.base.GetSeriesBlock",
+        "epoch_agg",
+        "epoch_label",
+    ],
+    "age_sb": [
+        "dask_geomodeling.geometry.base.GetSeriesBlock",
+        "parcels_labeled",
+        "days_plant_age",
+    ],
+    "variety_sb": [
+        "dask_geomodeling.geometry.base.GetSeriesBlock",
+        "parcels_labeled",
+        "pepper_variety",
+    ],
+    "epoch_mod": [
+        "dask_geomodeling.geometry.field_operations.Modulo",
+        "epoch_sb",
+        365.25,
+    ],
+    "doy_now": ["dask_geomodeling.geometry.field_operations.Round", "epoch_mod"],
+    "plant_month": [
+        "dask_geomodeling.geometry.field_operations.Classify",
+        "age_sb",
+        [0, 365, 730, 1095],
+        [184, 549, 914],
+        False,
+    ],
+    "plant_year": [
+        "dask_geomodeling.geometry.field_operations.Classify",
+        "age_sb",
+        [365, 1095],
+        [1, 2, 3],
+        False,
+    ],
+    "days_x_1000": [
+        "dask_geomodeling.geometry.field_operations.Multiply",
+        "plant_month",
+        1000,
+    ],
+    "variety_10_20": [
+        "dask_geomodeling.geometry.field_operations.Classify",
+        "variety_sb",
+        [6],
+        [10, 20],
+        False,
+    ],
+    "task": [
+        "dask_geomodeling.geometry.field_operations.Add",
+        "days_x_1000",
+        "variety_10_20",
+    ],
+    "task_1": ["dask_geomodeling.geometry.field_operations.Add", "task", 10000000],
+    "young": ["dask_geomodeling.geometry.field_operations.Equal", "plant_year", 1],
+    "result": [
+        "dask_geomodeling.geometry.base.SetSeriesBlock",
+        "parcels_labeled",
+        "doy",
+        "doy_now",
+        "year",
+        "plant_year",
+        "task_1_id",
+        "task_1",
+        "age_01",
+        "young",
+        "label",
+        "label_value",
+    ],
+}
+SOURCE = {"version": 2, "graph": GRAPH, "name": "result"}
+
+
+@pytest.fixture
+def parcels():
+    return pd.DataFrame(
+        {"id": [1, 2, 3], "code": ["a", "b", "c"], "x": [104.0, 105.0, 106.0]},
+        index=pd.Index([1, 2, 3], name="object_id"),
+    )
+
+
+@pytest.fixture
+def labelparameters():
+    return pd.DataFrame(
+        {
+            "object_id": [1, 2, 3, 1, 2, 3],
+            "label_type": [APP_DATA] * 6,
+            "name": ["days_plant_age"] * 3 + ["pepper_variety"] * 3,
+            "value": [100.0, 800.0, 2000.0, 1.0, 7.0, 1.0],
+            "start": pd.to_datetime(["2020-01-01"] * 6),
+            "end": pd.NaT,
+        }
+    )
+
+
+@pytest.fixture
+def source():
+    return SOURCE
+
+
+@pytest.fixture
+def clock_source():
+    """SOURCE with the epoch raster aggregation replaced by a clock input"""
+    graph = dict(GRAPH)
+    del graph["epoch"]
+    graph["epoch_agg"] = [
+        "spiceup_labels.evaluate.DaysSinceEpoch",
+        "parcels_labeled",
+        EPOCH_RASTER,
+        "epoch_label",
+    ]
+    return {**SOURCE, "graph": graph}
+
+
+@pytest.fixture
+def epoch_raster():
+    return EPOCH_RASTER
+
+
+@pytest.fixture
+def rasters():
+    return {EPOCH_RASTER: 18600.0}
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Tests for async_client.py"""
+
+import asyncio
+import threading
+
+import pytest
+
+from spiceup_labels import async_client, server
+from spiceup_labels.label_writer import read_labels
+
+pytest.importorskip("aiohttp")
+
+
+def test_fetch_labels_with_retries(
+    tmp_path, monkeypatch, source, parcels, labelparameters, rasters
+):
+    parcels["y"] = 0.0
+    local = server.LabeltypeServer(
+        ("localhost", 0), parcels, labelparameters=labelparameters, rasters=rasters
+    )
+    local.labeltypes["calendar-uuid"] = source
+    compute, calls = local.compute, []
+
+    def flaky_compute(uuid, object_ids, time=None):
+        calls.append(object_ids)
+        if len(calls) == 1:
+            raise RuntimeError("overloaded")  # served as status 500
+        return compute(uuid, object_ids, time)
+
+    local.compute = flaky_compute
+    monkeypatch.setattr(async_client, "backoff_delay", lambda *args: 0.01)
+    threading.Thread(target=local.serve_forever, daemon=True).start()
+    try:
+        path = tmp_path / "labels.ndjson"
+        rows = asyncio.run(
+            async_client.write_fetched_labels(
+                path,
+                "calendar-uuid",
+                [1, 2, 3],
+                base_url=local.url,
+                batch_size=2,
+                concurrency=2,
+                time="2020-12-05",
+            )
+        )
+    finally:
+        local.shutdown()
+        local.server_close()
+    assert rows == 3
+    assert len(calls) == 3  # one batch retried
+    labels = read_labels(path).sort_index()
+    assert list(labels.index) == [1, 2, 3]
+    assert list(labels["year"]) == [1.0, 2.0, 3.0]
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Tests for backfill.py"""
+
+import pandas as pd
+import pytest
+
+from spiceup_labels import backfill, evaluate
+from spiceup_labels.label_writer import read_labels
+from spiceup_labels.timeline import evaluate_date_range
+
+
+def test_backfill_resumes(tmp_path, source, parcels, labelparameters, epoch_raster):
+    calls = []
+
+    def rasters(uuid, parcels, statistic, time):
+        calls.append(len(parcels))
+        return evaluate.days_since_epoch(time)
+
+    kwargs = dict(
+        days=2, partitions=2, extension=".ndjson", labelparameters=labelparameters
+    )
+    output_dir = str(tmp_path)
+
+    def failing(uuid, parcels, statistic, time):
+        if len(calls) == 3:
+            raise RuntimeError("interrupted")
+        return rasters(uuid, parcels, statistic, time)
+
+    with pytest.raises(RuntimeError):
+        backfill.backfill(
+            source,
+            parcels,
+            "2020-01-01",
+            "2020-01-05",
+            output_dir,
+            rasters=failing,
+            **kwargs
+        )
+    run = backfill.backfill_run(source, parcels, "2020-01-01", "2020-01-05", 2, 2)
+    assert len(backfill.read_manifest(output_dir, run)["units"]) == 3
+
+    calls.clear()
+    manifest = backfill.backfill(
+        source,
+        parcels,
+        "2020-01-01",
+        "2020-01-05",
+        output_dir,
+        rasters=rasters,
+        **kwargs
+    )
+    assert len(calls) == 1  # only the remaining unit is evaluated
+    assert sorted(manifest["units"]) == [
+        "20200101-20200102-p0001of0002",
+        "20200101-20200102-p0002of0002",
+        "20200103-20200104-p0001of0002",
+        "20200103-20200104-p0002of0002",
+    ]
+    labels = read_labels(tmp_path / "20200103-20200104-p0002of0002.ndjson")
+    expected = evaluate_date_range(
+        source,
+        parcels.loc[[3]],
+        pd.date_range("2020-01-03", "2020-01-04"),
+        labelparameters=labelparameters,
+        rasters=rasters,
+    )
+    assert labels.index.names == ["object_id", "time"]
+    assert labels.index.equals(expected.index)
+
+
+def test_backfill_refuses_other_run(tmp_path, source, parcels, rasters):
+    output_dir = str(tmp_path)
+    args = (source, parcels, "2020-01-01", "2020-01-03", output_dir)
+    kwargs = dict(days=2, extension=".ndjson", rasters=rasters)
+    backfill.backfill(*args, **kwargs)
+    # the same unit ids, but other parcels in the partitions
+    with pytest.raises(ValueError, match="parcels_hash, partitions"):
+        backfill.backfill(source, parcels.loc[[1, 2]], *args[2:], partitions=2)
+    with pytest.raises(ValueError, match="end"):
+        backfill.backfill(*args[:3], "2020-01-02", output_dir, **kwargs)
+    assert backfill.backfill(*args, **kwargs)["days"] == 2  # resumes
+
+
+def test_backfill_units(parcels):
+    units = list(backfill.backfill_units("2020-01-01", "2020-01-04", 2, parcels, 1))
+    assert [list(dates.strftime("%d")) for _, dates, _ in units] == [
+        ["01", "02"],
+        ["03"],
+    ]
+    with pytest.raises(ValueError):
+        list(backfill.backfill_units("2020-01-01", "2020-01-04", 2, parcels, 0))
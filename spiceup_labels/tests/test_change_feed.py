@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Tests for change_feed.py"""
+
+import numpy as np
+import pandas as pd
+
+from spiceup_labels import change_feed
+
+
+def labels(task_ids, tasks, object_ids=(1, 2, 3)):
+    return pd.DataFrame(
+        {"task_id": task_ids, "task": tasks},
+        index=pd.Index(object_ids, name="object_id"),
+    )
+
+
+def test_change_feed(tmp_path):
+    yesterday = labels([2001.0, 0.0, np.nan], ["2001_Irrigate", "", None])
+    path = tmp_path / "yesterday.npz"
+    change_feed.save_snapshot(yesterday, path)
+    previous = change_feed.load_snapshot(path)
+
+    # same values in compact dtype, parcel 2 gets a warning, 3 removed, 4 new
+    today = labels(
+        np.array([2001, 2006, 0], dtype="int16"),
+        ["2001_Irrigate", "2006_Drainage", ""],
+        object_ids=(1, 2, 4),
+    )
+    changes = list(change_feed.change_feed(today, previous))
+    assert changes == [
+        {
+            "object_id": 2,
+            "changed": ["task_id", "task"],
+            "values": {"task_id": 2006, "task": "2006_Drainage"},
+        },
+        {
+            "object_id": 4,
+            "changed": ["task_id", "task"],
+            "values": {"task_id": 0, "task": ""},
+        },
+        {"object_id": 3, "removed": True},
+    ]
+    output = tmp_path / "changes.ndjson"
+    assert change_feed.write_change_feed(changes, output) == 3
+    assert len(output.read_text().splitlines()) == 3
+
+
+def test_hashes_include_type(tmp_path):
+    yesterday = labels([1.0, np.nan, 3.0], [None, "None", "3"])
+    path = tmp_path / "yesterday.npz"
+    change_feed.save_snapshot(yesterday, path)
+    previous = change_feed.load_snapshot(path)  # without pickle
+    assert list(previous.index) == [1, 2, 3]
+
+    today = labels([1.0, None, 3.0], ["None", None, 3])
+    changes = list(change_feed.change_feed(today, previous))
+    assert [change["object_id"] for change in changes] == [1, 2, 3]
+    assert all(change["changed"] == ["task"] for change in changes)
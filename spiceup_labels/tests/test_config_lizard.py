@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Tests for config_lizard.py"""
+
+import pytest
+
+pytest.importorskip("osgeo")  # dask-geomodeling needs gdal
+
+from spiceup_labels import config_lizard  # noqa: E402
+
+
+def test_pivot_expands_to_chain():
+    labelparams = ["farm_area", "live_support", "pepper_variety"]
+    uuid = "3ab1addf-00e5-47b0-849e-ba55cd3024b9"
+    chain = config_lizard.labelparameter_blocks(labelparams, uuid)
+    assert list(chain) == [
+        "parcels_add_farm_area",
+        "parcels_add_live_support",
+        "parcels_labeled",
+    ]
+    pivot = config_lizard.labelparameter_blocks(labelparams, uuid, pivot=True)
+    assert list(pivot) == ["parcels_labeled"]
+    source = {"version": 2, "graph": pivot, "name": "parcels_labeled"}
+    expanded = config_lizard.expand_labelparameter_pivots(source)["graph"]
+    assert list(expanded)[-1] == "parcels_labeled"
+    # the same blocks, apart from the keys of the intermediate blocks
+    assert [block[:1] + block[2:] for block in expanded.values()] == [
+        block[:1] + block[2:] for block in chain.values()
+    ]
+    assert expanded["parcels_labeled_add_1"][1] == "parcels"
+
+
+def test_clock_inputs():
+    uuid = "days-since-epoch-uuid"
+    graph = {
+        "parcels": ["geoblocks.geometry.sources.GeoDjangoSource", "a", "b"],
+        "epoch": [config_lizard.LIZARD_RASTER_SOURCE, uuid],
+        "other": [config_lizard.LIZARD_RASTER_SOURCE, "other-uuid"],
+        "epoch_agg": [
+            config_lizard.AGGREGATE_RASTER,
+            "parcels",
+            "epoch",
+            "max",
+            "EPSG:4326",
+            0.00001,
+            None,
+            "epoch_label",
+        ],
+    }
+    source = config_lizard.clock_inputs({"graph": graph, "name": "epoch_agg"}, uuid)
+    assert "epoch" not in source["graph"]
+    assert source["graph"]["epoch_agg"] == [
+        config_lizard.DAYS_SINCE_EPOCH,
+        "parcels",
+        uuid,
+        "epoch_label",
+    ]
+    expanded = config_lizard.expand_clock_inputs(source)["graph"]
+    assert expanded["epoch_agg_raster"] == graph["epoch"]
+    assert expanded["epoch_agg"][5] == config_lizard.CLOCK_PIXEL_SIZE
+    assert expanded["epoch_agg"][7] == "epoch_label"
+
+
+class Serialized:
+    """Stand-in for a result seriesblock, serializing to graph"""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def serialize(self):
+        return {"version": 2, "graph": dict(self.graph), "name": "result"}
+
+
+def test_labeled_parcels_expand_once():
+    labelparams = ["farm_area", "live_support", "pepper_variety", "plant_date"]
+    uuid = "3ab1addf-00e5-47b0-849e-ba55cd3024b9"
+    parcels = ["geoblocks.geometry.sources.GeoDjangoSource", "lizard_nxt", "parcel"]
+    labeled_parcels = {"parcels": parcels}
+    labeled_parcels.update(
+        config_lizard.labelparameter_blocks(labelparams, uuid, pivot=True)
+    )
+    geometry = "dask_geomodeling.geometry"
+    # mimic parcels with labelparameters, as patch_calendar_tasks builds them
+    graph = {
+        "parcels": [f"{geometry}.sources.GeometryFileSource", "parcels.geojson"],
+        "lp_farm_area": [
+            f"{geometry}.sources.GeometryFileSource",
+            "labelparameters.geojson",
+        ],
+        "lp_plant_date": [
+            f"{geometry}.sources.GeometryFileSource",
+            "labelparameters.geojson",
+        ],
+        "wkt": [f"{geometry}.sources.GeometryWKTSource", "POINT (1 2)"],
+        "MergeGeometryBlocks_a": [
+            f"{geometry}.merge.MergeGeometryBlocks",
+            "parcels",
+            "lp_farm_area",
+        ],
+        "MergeGeometryBlocks_b": [
+            f"{geometry}.merge.MergeGeometryBlocks",
+            "parcels",
+            "lp_plant_date",
+        ],
+        "farm_area": [
+            f"{geometry}.base.GetSeriesBlock",
+            "MergeGeometryBlocks_a",
+            "farm_area",
+        ],
+        "plant_date": [
+            f"{geometry}.base.GetSeriesBlock",
+            "MergeGeometryBlocks_b",
+            "plant_date",
+        ],
+        "wkt_area": [f"{geometry}.base.GetSeriesBlock", "wkt", "farm_area"],
+        "result": [
+            f"{geometry}.base.SetSeriesBlock",
+            "parcels",
+            "a",
+            "farm_area",
+            "b",
+            "plant_date",
+        ],
+    }
+    source = config_lizard.get_labeltype_source(Serialized(graph), {}, labeled_parcels)
+    assert source["graph"]["farm_area"][1] == "parcels_labeled"
+    assert source["graph"]["plant_date"][1] == "parcels_labeled"
+    assert source["graph"]["wkt_area"][1] == "parcels_labeled"
+    expanded = source["graph"]  # Lizard does not know the pivot
+    assert config_lizard.PIVOT_LABELPARAMETERS not in [b[0] for b in expanded.values()]
+    add_django_fields = [
+        key
+        for key, block in expanded.items()
+        if block[0] == config_lizard.ADD_DJANGO_FIELDS
+    ]
+    # one join per labelparameter, however many mimic blocks use them
+    assert len(add_django_fields) == len(labelparams)
+    assert expanded["parcels_labeled_add_1"][1] == "parcels"
+    assert expanded["parcels"] == parcels
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Tests for evaluate.py"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from spiceup_labels import evaluate
+
+APP_DATA = "3ab1addf-00e5-47b0-849e-ba55cd3024b9"
+
+
+def test_evaluate(source, parcels, labelparameters, rasters):
+    result = evaluate.evaluate(source, parcels, labelparameters, rasters, "2020-12-05")
+    assert list(result["task_1_id"][:2]) == [10184010.0, 10914020.0]
+    assert np.isnan(result["task_1_id"][3])
+    assert list(result["year"]) == [1.0, 2.0, 3.0]
+    assert list(result["age_01"]) == [True, False, False]
+    assert (result["doy"] == round(18600 % 365.25)).all()
+    assert list(result["Plot"]) == ["a", "b", "c"]
+
+
+def test_compact_dtypes(source):
+    dtypes = evaluate.infer_dtypes(source)
+    assert dtypes["plant_month"] == np.int16
+    assert dtypes["doy_now"] == np.int16
+    assert dtypes["days_x_1000"] == np.int32
+    assert dtypes["task_1"] == np.int32
+    assert "young" not in dtypes  # boolean
+    assert "epoch_mod" not in dtypes  # modulo 365.25 is not integral
+
+
+def test_compact_bit_exact(source, parcels, labelparameters, rasters):
+    args = (source, parcels, labelparameters, rasters, "2020-12-05")
+    float_result = evaluate.evaluate(*args)
+    compact_result = evaluate.evaluate(*args, compact=True)
+    assert compact_result["year"].dtype == np.int16
+    assert compact_result["doy"].dtype == np.int16
+    # parcel 3 is too old for plant_month, so task_1 holds NaN and stays float
+    assert compact_result["task_1_id"].dtype == np.float64
+    evaluate.assert_bit_exact(compact_result, float_result)
+
+    young = parcels.loc[[1, 2]]
+    args = (source, young, labelparameters, rasters, "2020-12-05")
+    float_result = evaluate.evaluate(*args)
+    compact_result = evaluate.evaluate(*args, compact=True)
+    assert compact_result["task_1_id"].dtype == np.int32
+    evaluate.assert_bit_exact(compact_result, float_result)
+
+
+def test_assert_bit_exact_zeros_and_nan():
+    expected = pd.Series([-0.0, 0.0, np.nan])
+    evaluate.assert_bit_exact(pd.Series([0.0, -0.0, np.nan]), expected)
+    evaluate.assert_bit_exact(pd.Series([0, 0], dtype="int16"), expected[:2])
+    with pytest.raises(AssertionError):
+        evaluate.assert_bit_exact(pd.Series([0.0, 0.0, 1.0]), expected)
+    with pytest.raises(AssertionError):
+        evaluate.assert_bit_exact(pd.Series(["0", "0", None]), expected)
+
+
+def test_labelparameter_validity(source, parcels, labelparameters, rasters):
+    # a newer labelparameter replaces the older one, expired ones are ignored
+    update = pd.DataFrame(
+        {
+            "object_id": [1, 2],
+            "label_type": [APP_DATA] * 2,
+            "name": ["days_plant_age"] * 2,
+            "value": [400.0, 10.0],
+            "start": pd.to_datetime(["2020-06-01", "2020-06-01"]),
+            "end": pd.to_datetime([None, "2020-07-01"]),
+        }
+    )
+    labelparameters = pd.concat([labelparameters, update], ignore_index=True)
+    result = evaluate.evaluate(source, parcels, labelparameters, rasters, "2020-12-05")
+    assert list(result["days_plant_age"]) == [400.0, 800.0, 2000.0]
+
+
+def test_classify_like_pd_cut():
+    values = np.array([-1, 0, 0.5, 1, 2, 3, np.nan])
+    closed = evaluate.classify(values, [0, 1, 2], [10, 20], right=True)
+    expected = pd.cut(values, [0, 1, 2], right=True, labels=[10, 20]).astype(float)
+    np.testing.assert_array_equal(closed, expected)
+    open_ = evaluate.classify(values, [0, 1, 2], ["a", "b", "c", "d"], right=False)
+    assert list(open_[:-1]) == ["a", "b", "b", "c", "d", "d"]
+    assert pd.isna(open_[-1])
+
+
+def test_evaluate_chunks(source, parcels, labelparameters, epoch_raster):
+    args = (source, parcels)
+    kwargs = dict(
+        labelparameters=labelparameters,
+        rasters={epoch_raster: [18600.0, 18700.0, 18800.0]},  # per parcel
+        time="2020-12-05",
+    )
+    chunks = list(evaluate.evaluate_chunks(*args, chunk_size=2, **kwargs))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    pd.testing.assert_frame_equal(pd.concat(chunks), evaluate.evaluate(*args, **kwargs))
+
+
+def pivot_source(source):
+    """source with the AddDjangoFields chain replaced by one pivot block"""
+    graph = dict(source["graph"])
+    chain = [graph.pop("parcels_add_days_plant_age"), graph["parcels_labeled"]]
+    graph["parcels_labeled"] = [
+        "spiceup_labels.evaluate.PivotLabelparameters",
+        "parcels",
+        [[path, *args[1:]] for path, *args in chain],
+    ]
+    return {**source, "graph": graph}
+
+
+def test_pivot_labelparameters(source, parcels, labelparameters, rasters):
+    pivoted = pivot_source(source)
+    for time in ("2019-12-05", "2020-12-05"):
+        pd.testing.assert_frame_equal(
+            evaluate.evaluate(pivoted, parcels, labelparameters, rasters, time),
+            evaluate.evaluate(source, parcels, labelparameters, rasters, time),
+        )
+
+
+def test_days_since_epoch_clock(
+    source, clock_source, parcels, labelparameters, epoch_raster
+):
+    rasters = {epoch_raster: lambda parcels, time: evaluate.days_since_epoch(time)}
+    # one time, and a time per parcel row
+    for time in ("2020-12-05T10:00", pd.date_range("2020-12-30", periods=3)):
+        pd.testing.assert_frame_equal(
+            evaluate.evaluate(clock_source, parcels, labelparameters, time=time),
+            evaluate.evaluate(source, parcels, labelparameters, rasters, time),
+        )
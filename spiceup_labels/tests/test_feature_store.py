@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Tests for feature_store.py"""
+
+import pandas as pd
+import pytest
+
+from spiceup_labels import evaluate, feature_store
+
+
+def test_feature_sampler(source, parcels, labelparameters, epoch_raster):
+    shifted = dict(source["graph"])
+    shifted["epoch_shift"] = [
+        "dask_geomodeling.raster.temporal.Shift",
+        "epoch",
+        86400000,
+    ]
+    shifted["epoch_agg"] = list(shifted["epoch_agg"])
+    shifted["epoch_agg"][2] = "epoch_shift"
+    sources = [source, dict(source, graph=shifted), dict(source, name="doy_now")]
+    inputs = feature_store.raster_inputs(sources)
+    assert inputs == [
+        (epoch_raster, "max", pd.Timedelta(0)),
+        (epoch_raster, "max", pd.Timedelta(days=1)),
+    ]
+
+    calls = []
+
+    def rasters(uuid, parcels, statistic, time):
+        calls.append(time)
+        return evaluate.days_since_epoch(time)
+
+    time = "2020-12-05"
+    features = feature_store.build_features(sources, parcels, rasters, time)
+    assert len(calls) == 2
+    assert list(features.columns) == [
+        f"{epoch_raster}/max/2020-12-05",
+        f"{epoch_raster}/max/2020-12-04",
+    ]
+    sampler = feature_store.feature_sampler(features)
+    for labeltype in sources:
+        expected = evaluate.evaluate(labeltype, parcels, labelparameters, rasters, time)
+        actual = evaluate.evaluate(labeltype, parcels, labelparameters, sampler, time)
+        assert actual.equals(expected)
+    assert len(calls) == 2 + 3  # only the evaluations with rasters sampled
+    with pytest.raises(KeyError):
+        evaluate.evaluate(source, parcels, labelparameters, sampler, "2020-12-07")
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Tests for incremental.py"""
+
+import pandas as pd
+
+from spiceup_labels import incremental
+
+
+def test_labelparameter_dependencies(source):
+    assert incremental.labelparameter_dependencies(source) == {
+        "days_plant_age",
+        "pepper_variety",
+    }
+    doy_now = dict(source, name="doy_now")
+    assert incremental.labelparameter_dependencies(doy_now) == set()
+
+
+def test_incremental_recompute(source, parcels, labelparameters, rasters):
+    sources = {"calendar": source, "doy": dict(source, name="doy_now")}
+    changes = [
+        {
+            "object_id": 2,
+            "label_type": labelparameters["label_type"][0],
+            "name": "pepper_variety",
+            "value": 1.0,
+            "start": pd.Timestamp("2020-12-01"),
+            "end": pd.NaT,
+        },
+        {"object_id": 3, "name": "farm_area"},  # nothing depends on it
+    ]
+    results = list(
+        incremental.incremental_recompute(
+            changes,
+            sources,
+            parcels,
+            labelparameters,
+            rasters=rasters,
+            time="2020-12-05",
+        )
+    )
+    assert len(results) == 1
+    labeltype, table = results[0]
+    assert labeltype == "calendar"
+    assert list(table.index) == [2]
+    assert list(table["pepper_variety"]) == [1.0]
+    assert list(table["task_1_id"]) == [10914010.0]
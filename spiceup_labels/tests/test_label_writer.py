@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Tests for label_writer.py"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from spiceup_labels import label_writer
+
+
+def chunks():
+    index = pd.Index([1, 2], name="object_id")
+    yield pd.DataFrame(
+        {
+            "task_id": np.array([2001, 2002], dtype="int16"),
+            "task": ["2001_Irrigate", "2002_Irrigate more"],
+        },
+        index=index,
+    )
+    index = pd.Index([3, 4], name="object_id")
+    yield pd.DataFrame(
+        {"task_id": [2001.0, np.nan], "task": ["2001_Irrigate", None]}, index=index
+    )
+
+
+@pytest.mark.parametrize("extension", [".parquet", ".arrow", ".ndjson"])
+def test_write_read_labels(tmp_path, extension):
+    if extension != ".ndjson":
+        pytest.importorskip("pyarrow")
+    path = tmp_path / f"labels{extension}"
+    assert label_writer.write_labels(chunks(), path) == 4
+    table = label_writer.read_labels(path)
+    assert list(table.index) == [1, 2, 3, 4]
+    assert list(table["task_id"][:3]) == [2001, 2002, 2001]
+    assert pd.isna(table["task_id"][4])
+    assert pd.isna(table["task"][4])
+
+
+def test_arrow_keeps_compact_schema(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    path = tmp_path / "labels.arrow"
+    with label_writer.open_writer(path) as writer:
+        for chunk in chunks():
+            writer.write(chunk)
+    assert writer.schema.field("task_id").type == pa.int16()
+
+
+@pytest.mark.parametrize("extension", [".parquet", ".arrow"])
+def test_all_null_first_chunk(tmp_path, extension):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / f"labels{extension}"
+    first, second = chunks()
+    first["task"] = None
+    assert label_writer.write_labels([first, second], path) == 4
+    table = label_writer.read_labels(path)
+    assert list(table["task"].isna()) == [True, True, False, True]
+    assert table["task"][3] == "2001_Irrigate"
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        label_writer.open_writer(tmp_path / "labels.xlsx")
+
+
+def test_all_null_first_chunk_takes_later_type(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    path = tmp_path / "labels.arrow"
+    first, second = chunks()
+    first["task_id"] = None
+    with label_writer.open_writer(path) as writer:
+        writer.write(first)
+        writer.write(second)
+    assert writer.schema.field("task_id").type == pa.float64()
+    table = label_writer.read_labels(path)
+    assert table["task_id"][3] == 2001
+
+
+def test_declared_dtypes(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    path = tmp_path / "labels.parquet"
+    first, _ = chunks()
+    first["task_id"] = None
+    with label_writer.open_writer(path, dtypes={"task_id": "int16"}) as writer:
+        writer.write(first)
+    assert writer.schema.field("task_id").type == pa.int16()
+
+
+@pytest.mark.parametrize("extension", [".parquet", ".arrow", ".ndjson"])
+def test_no_chunks(tmp_path, extension):
+    if extension != ".ndjson":
+        pytest.importorskip("pyarrow")
+    path = tmp_path / f"labels{extension}"
+    assert label_writer.write_labels([], path, columns=["task"]) == 0
+    table = label_writer.read_labels(path)
+    assert table.empty
+    assert table.index.names == ["object_id"]
+
+
+@pytest.mark.parametrize("extension", [".parquet", ".arrow"])
+def test_index_columns_metadata(tmp_path, extension):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / f"labels{extension}"
+    index = pd.MultiIndex.from_tuples(
+        [(1, "2001_Irrigate")], names=["object_id", "task"]
+    )
+    labels = pd.DataFrame({"time": pd.to_datetime(["2020-01-01"])}, index=index)
+    label_writer.write_labels([labels], path)
+    assert label_writer.read_labels(path).index.names == ["object_id", "task"]
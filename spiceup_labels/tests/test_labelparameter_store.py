@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Tests for labelparameter_store.py"""
+
+import numpy as np
+import pandas as pd
+
+from spiceup_labels import evaluate
+from spiceup_labels.labelparameter_store import LabelparameterStore
+
+
+def test_store_as_of(source, parcels, labelparameters, rasters):
+    update = labelparameters.iloc[[0]].assign(
+        value=400.0, start=pd.Timestamp("2020-06-01"), end=pd.Timestamp("2020-07-01")
+    )
+    labelparameters = pd.concat([labelparameters, update], ignore_index=True)
+    with LabelparameterStore() as store:
+        assert store.ingest(labelparameters, chunk_size=4) == 7
+        assert len(store) == 7
+        table = store.pivot("2020-06-15", object_ids=[1, 2, 3, 4])
+        assert list(table.columns) == ["days_plant_age", "pepper_variety"]
+        assert list(table["days_plant_age"][:3]) == [400.0, 800.0, 2000.0]
+        assert np.isnan(table.loc[4]).all()
+        assert store.pivot("2020-07-01")["days_plant_age"][1] == 100.0
+        assert store.pivot("2019-01-01").empty
+        # the records are usable for evaluate
+        for time in ("2020-06-15", "2020-07-15"):
+            pd.testing.assert_frame_equal(
+                evaluate.evaluate(
+                    source, parcels, store.records(time), rasters, time=time
+                ),
+                evaluate.evaluate(source, parcels, labelparameters, rasters, time=time),
+            )
+
+
+def test_records_per_label_type(labelparameters):
+    other = labelparameters.assign(label_type="other", value=-1.0)
+    with LabelparameterStore() as store:
+        store.ingest(pd.concat([labelparameters, other], ignore_index=True))
+        records = store.records("2020-06-15")
+        assert len(records) == 12
+        assert set(records["label_type"]) == {"other", labelparameters["label_type"][0]}
+        assert (store.pivot("2020-06-15", label_type="other") == -1.0).all().all()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Tests for loadtest.py"""
+
+import threading
+
+from spiceup_labels import loadtest, server
+
+
+def test_load_against_local_server(source, parcels, labelparameters, rasters):
+    parcels["y"] = 0.0
+    local = server.LabeltypeServer(
+        ("localhost", 0), parcels, labelparameters=labelparameters, rasters=rasters
+    )
+    local.labeltypes["calendar-uuid"] = source
+    threading.Thread(target=local.serve_forever, daemon=True).start()
+    try:
+        schedule = loadtest.app_sessions(
+            [1, 2, 3], ["calendar-uuid", "unknown-uuid"], rate=50, duration=0.2
+        )
+        assert len(schedule) % 2 == 0 and len(schedule) > 0
+        results = loadtest.run_load(local.url, schedule, workers=4)
+    finally:
+        local.shutdown()
+        local.server_close()
+    report = loadtest.summarize(results)
+    assert report["overall"]["requests"] == len(schedule)
+    assert report["labeltypes"]["calendar-uuid"]["error_rate"] == 0.0
+    assert report["labeltypes"]["unknown-uuid"]["error_rate"] == 1.0
+    stats = report["labeltypes"]["calendar-uuid"]
+    assert 0 < stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+    assert report["overall"]["throughput"] > 0
+    assert (results["lag"] >= 0).all()
+    assert (results["latency"] >= results["lag"]).all()
+    assert stats["p99_lag_ms"] >= 0
+
+
+def test_parser_credentials_and_url():
+    options = loadtest.get_parser().parse_args(
+        ["https://demo.lizard.net", "--username", "user", "--password", "secret"]
+    )
+    assert (options.username, options.password) == ("user", "secret")
+    assert options.url == loadtest.COMPUTE_URL
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""Tests for manifest.py"""
+
+from spiceup_labels import manifest
+
+
+def test_write_load_manifest(tmp_path):
+    assert manifest.load_manifest(str(tmp_path)) is None
+    manifest.write_manifest(str(tmp_path), {"units": {"a": 1}})
+    assert manifest.load_manifest(str(tmp_path)) == {"units": {"a": 1}}
+    assert [p.name for p in tmp_path.iterdir()] == [manifest.MANIFEST]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""Tests for profiler.py"""
+
+import json
+
+from spiceup_labels import evaluate, profiler
+
+
+def test_profile(source, parcels, labelparameters, rasters):
+    result = profiler.profile(
+        source, parcels, repeat=2, labelparameters=labelparameters, rasters=rasters
+    )
+    blocks = len(evaluate.evaluation_order(source["graph"], source["name"]))
+    table = result.table("output_bytes")
+    assert len(table) == 2 * blocks
+    assert table["output_bytes"].is_monotonic_decreasing
+    assert table["block"][0] == "SetSeriesBlock"
+    by_type = result.by_block_type()
+    counts = dict(zip(by_type["block"], by_type["count"]))
+    assert counts["AddDjangoFields"] == 4
+    assert counts["AggregateRaster"] == 2
+    assert counts["Classify"] == 6
+    report = json.loads(json.dumps(result.report()))
+    assert report["total_seconds"] > 0
+    assert len(report["block_types"]) == len(by_type)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Tests for raster_cache.py"""
+
+import numpy as np
+import pandas as pd
+
+from spiceup_labels import raster_cache
+
+ONSET = "doy-start-dry-season-uuid"
+NPK = "n-tree-uuid"
+
+
+def test_raster_timestamp():
+    timestamps = {
+        ONSET: ["2020-11-01", "2020-12-01"],
+        NPK: raster_cache.STATIC,
+        "daily": "2020-12-05",
+    }
+    time = pd.Timestamp("2020-12-05T10:00")
+    resolve = raster_cache.raster_timestamp
+    assert resolve(timestamps, ONSET, time) == "2020-12-01T00:00:00"
+    assert resolve(timestamps, ONSET, pd.Timestamp("2020-11-15")) == (
+        "2020-11-01T00:00:00"
+    )
+    assert resolve(timestamps, NPK, time) == raster_cache.STATIC
+    assert resolve(timestamps, "daily", pd.Timestamp("2020-12-04")) is None
+    assert resolve(timestamps, "unknown", time) is None
+
+
+def test_cached_sampler(tmp_path, parcels):
+    sampled = []
+
+    def rasters(uuid, parcels, statistic, time):
+        sampled.append((uuid, list(parcels.index)))
+        return parcels["x"].to_numpy() + (time.month if uuid == ONSET else 0)
+
+    path = tmp_path / "rasters.sqlite"
+    timestamps = {ONSET: "2020-11-01", NPK: raster_cache.STATIC}
+    with raster_cache.RasterCache(path) as cache:
+        sample = cache.sampler(rasters, timestamps)
+        values = sample(ONSET, parcels.loc[[1, 2]], "max", pd.Timestamp("2020-11-02"))
+        assert values.tolist() == [115.0, 116.0]
+        sample(NPK, parcels, "max", pd.Timestamp("2020-11-02"))
+        assert len(cache) == 5
+
+    # the next day: only the new parcel is sampled
+    with raster_cache.RasterCache(path) as cache:
+        sample = cache.sampler(rasters, timestamps)
+        time = pd.Timestamp("2020-11-03")
+        values = sample(ONSET, parcels, "max", time)
+        assert values.tolist() == [115.0, 116.0, 117.0]
+        assert sample(NPK, parcels, "max", time).tolist() == [104.0, 105.0, 106.0]
+        assert sampled[2:] == [(ONSET, [3])]
+        assert (cache.hits, cache.sampled) == (5, 1)
+
+        # the onset raster publishes a new timestamp
+        timestamps[ONSET] = "2020-12-01"
+        values = sample(ONSET, parcels, "max", pd.Timestamp("2020-12-02"))
+        assert values.tolist() == [116.0, 117.0, 118.0]
+        assert sampled[3:] == [(ONSET, [1, 2, 3])]
+        assert cache.timestamps(ONSET) == ["2020-11-01T00:00:00", "2020-12-01T00:00:00"]
+        assert cache.prune(ONSET) == 1
+        assert cache.timestamps(ONSET) == ["2020-12-01T00:00:00"]
+
+        # times per row are not cached
+        times = pd.DatetimeIndex(["2020-12-02"] * 3)
+        assert np.array_equal(sample(ONSET, parcels, "max", times), values)
+        assert len(sampled) == 5
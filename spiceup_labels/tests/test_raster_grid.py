@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Tests for raster_grid.py"""
+
+import numpy as np
+
+from spiceup_labels import raster_grid
+
+
+def test_evaluate_grid(source, epoch_raster):
+    grid = raster_grid.grid_from_bbox((104.0, -1.0, 104.5, -0.7), 0.1)
+    assert (grid.width, grid.height) == (5, 3)
+    rasters = {epoch_raster: lambda parcels, time: 18600.0 + parcels["x"]}
+    labelparameters = {"days_plant_age": 800.0, "pepper_variety": 7.0}
+    blocks = list(
+        raster_grid.evaluate_grid(
+            source,
+            grid,
+            ["year", "doy"],
+            block_rows=2,
+            labelparameters=labelparameters,
+            rasters=rasters,
+        )
+    )
+    assert [first_row for first_row, arrays in blocks] == [0, 2]
+    year = np.vstack([arrays["year"] for first_row, arrays in blocks])
+    assert year.shape == (3, 5)
+    assert (year == 2).all()
+    # rasters are sampled at the pixel centers
+    doy = np.vstack([arrays["doy"] for first_row, arrays in blocks])
+    x = 104.05 + 0.1 * np.arange(5)
+    np.testing.assert_allclose(
+        doy, np.round((18600.0 + x) % 365.25)[None, :].repeat(3, 0)
+    )
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Tests for result_cache.py"""
+
+import pandas as pd
+
+from spiceup_labels import result_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_and_lru():
+    clock = FakeClock()
+    cache = result_cache.ResultCache(maxsize=2, ttl=10, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # a is now most recently used
+    cache.put("c", 3)  # evicts b
+    assert cache.get("b") is None
+    clock.now = 11
+    assert cache.get("a") is None  # expired
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 2, "hit_rate": 1 / 3}
+
+
+def test_graph_hash(source):
+    assert result_cache.graph_hash(source) == result_cache.graph_hash(dict(source))
+    other = dict(source, name="epoch_sb")
+    assert result_cache.graph_hash(source) != result_cache.graph_hash(other)
+
+
+def test_cached_evaluate(source, parcels, labelparameters):
+    sampled = []
+
+    def rasters(uuid, parcels, statistic, time):
+        sampled.append(list(parcels.index))
+        return [18600.0] * len(parcels)
+
+    cache = result_cache.ResultCache()
+    kwargs = dict(labelparameters=labelparameters, rasters=rasters, time="2020-12-05")
+    version = result_cache.daily_stamp("2020-12-05T10:00")
+    first = result_cache.cached_evaluate(
+        cache, source, parcels.loc[[1, 2]], version, **kwargs
+    )
+    second = result_cache.cached_evaluate(cache, source, parcels, version, **kwargs)
+    assert sampled == [[1, 2], [3]]  # only parcel 3 is evaluated the second time
+    pd.testing.assert_frame_equal(second.loc[[1, 2]], first)
+    assert list(second.index) == [1, 2, 3]
+    assert cache.hit_rate == 2 / 5
+
+
+def test_horizon_evaluate(source, parcels, labelparameters, epoch_raster):
+    sampled = []
+
+    def rasters(uuid, parcels, statistic, time):
+        sampled.append(list(parcels.index))
+        return [18600.0] * len(parcels)
+
+    cache = result_cache.ResultCache()
+    kwargs = dict(labelparameters=labelparameters, rasters=rasters)
+    first = result_cache.horizon_evaluate(
+        cache, source, parcels, "2020-12-05T10:00", **kwargs
+    )
+    assert (first["valid_until"] == pd.Timestamp("2020-12-06")).all()
+    result_cache.horizon_evaluate(cache, source, parcels, "2020-12-05T20:00", **kwargs)
+    assert sampled == [[1, 2, 3]]
+    result_cache.horizon_evaluate(cache, source, parcels, "2020-12-06T01:00", **kwargs)
+    assert sampled == [[1, 2, 3]] * 2  # expired
+
+    # valid for good as long as the raster does not update
+    kwargs["raster_updates"] = {epoch_raster: None}
+    second = result_cache.horizon_evaluate(
+        cache, source, parcels.loc[[2]], "2020-12-07", **kwargs
+    )
+    assert second["valid_until"].isna().all()
+    result_cache.horizon_evaluate(
+        cache, source, parcels.loc[[2]], "2021-06-01", **kwargs
+    )
+    assert sampled == [[1, 2, 3]] * 2 + [[2]]
+
+
+def test_horizon_outlives_ttl(source, parcels, labelparameters, epoch_raster):
+    sampled = []
+
+    def rasters(uuid, parcels, statistic, time):
+        sampled.append(list(parcels.index))
+        return [18600.0] * len(parcels)
+
+    clock = FakeClock()
+    cache = result_cache.ResultCache(ttl=3600, clock=clock)
+    kwargs = dict(labelparameters=labelparameters, rasters=rasters)
+    result_cache.horizon_evaluate(cache, source, parcels, "2020-12-05T01:00", **kwargs)
+    clock.now = 5 * 3600  # past the cache ttl, within valid_until
+    result_cache.horizon_evaluate(cache, source, parcels, "2020-12-05T06:00", **kwargs)
+    assert sampled == [[1, 2, 3]]
+    clock.now = 23 * 3600  # past valid_until
+    result_cache.horizon_evaluate(cache, source, parcels, "2020-12-06T00:00", **kwargs)
+    assert sampled == [[1, 2, 3]] * 2
+
+    # valid for good as long as the raster does not update
+    kwargs["raster_updates"] = {epoch_raster: None}
+    cache.clear()
+    result_cache.horizon_evaluate(cache, source, parcels, "2020-12-06T01:00", **kwargs)
+    clock.now = 1e9
+    result_cache.horizon_evaluate(cache, source, parcels, "2021-06-01", **kwargs)
+    assert sampled == [[1, 2, 3]] * 3
+    assert result_cache.horizon_ttl(pd.Timestamp("2020-12-06"), pd.NaT) == float("inf")
+
+
+def test_invalidate_changes(source, parcels, labelparameters, epoch_raster):
+    sampled = []
+
+    def rasters(uuid, parcels, statistic, time):
+        sampled.append(list(parcels.index))
+        return [18600.0] * len(parcels)
+
+    cache = result_cache.ResultCache()
+    kwargs = dict(
+        labelparameters=labelparameters,
+        rasters=rasters,
+        raster_updates={epoch_raster: None},
+    )
+    result_cache.horizon_evaluate(cache, source, parcels, "2020-12-05", **kwargs)
+    changes = [
+        {"object_id": 2, "name": "pepper_variety"},
+        {"object_id": 3, "name": "farm_area"},  # nothing depends on it
+    ]
+    affected = result_cache.invalidate_changes(cache, changes, {"calendar": source})
+    assert list(affected["calendar"]) == [2]
+    result_cache.horizon_evaluate(cache, source, parcels, "2020-12-06", **kwargs)
+    assert sampled == [[1, 2, 3], [2]]
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Tests for scheduler.py"""
+
+import pytest
+
+from spiceup_labels import scheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = scheduler.TokenBucket(4.0, clock=clock, sleep=clock.sleep)
+    for _ in range(9):
+        bucket.acquire()
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_schedule_resumes_in_priority_order(tmp_path):
+    path = tmp_path / "queue.sqlite"
+    queue = scheduler.ComputeQueue(path)
+    assert queue.enqueue("2021-03-01", ["warning", "calendar"], range(5), 2) == 6
+    assert queue.enqueue("2021-03-01", ["warning", "calendar"], range(5), 2) == 0
+    clock = FakeClock()
+    calls = []
+
+    def compute(labeltype, object_ids):
+        calls.append((labeltype, object_ids))
+        if len(calls) == 4:
+            raise KeyboardInterrupt  # the scheduler is stopped
+
+    with pytest.raises(KeyboardInterrupt):
+        scheduler.run_schedule(
+            queue, "2021-03-01", compute, 1.0, clock=clock, sleep=clock.sleep
+        )
+    assert [labeltype for labeltype, object_ids in calls] == ["warning"] * 3 + [
+        "calendar"
+    ]
+    queue.close()
+
+    # restarted: continues with the task that was running, then the rest
+    calls.clear()
+    queue = scheduler.ComputeQueue(path)
+
+    def flaky(labeltype, object_ids):
+        calls.append((labeltype, object_ids))
+        if object_ids == [4]:
+            raise ValueError("server error")
+
+    clock.now = 0.0
+    counts = scheduler.run_schedule(
+        queue, "2021-03-01", flaky, 100.0, window=60, clock=clock, sleep=clock.sleep
+    )
+    assert calls[:3] == [("calendar", [0, 1]), ("calendar", [2, 3]), ("calendar", [4])]
+    assert counts == {"done": 5, "failed": 1}
+    # 3 pending tasks in a 60 s window: a request per 20 s (also for retries)
+    assert len(calls) == 5
+    assert clock.now == pytest.approx(80.0)
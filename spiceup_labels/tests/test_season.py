@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""Tests for season.py, cross-checked against the season graph builders"""
+
+import ast
+import os
+
+import numpy as np
+import pandas as pd
+
+from spiceup_labels import evaluate, season
+
+PACKAGE = os.path.dirname(season.__file__)
+FIELD_OPERATIONS = "dask_geomodeling.geometry.field_operations."
+
+
+class Recorder:
+    """Stand-in for a SeriesBlock that records the serialized graph"""
+
+    def __init__(self, graph, path, *args):
+        self.graph = graph
+        self.key = f"block_{len(graph)}"
+        args = [arg.key if isinstance(arg, Recorder) else arg for arg in args]
+        graph[self.key] = [path, *args]
+
+    def _operation(name):
+        def operation(self, other):
+            return Recorder(self.graph, FIELD_OPERATIONS + name, self, other)
+
+        return operation
+
+    __add__ = _operation("Add")
+    __sub__ = _operation("Subtract")
+    __mul__ = _operation("Multiply")
+    __lt__ = _operation("Less")
+    __gt__ = _operation("Greater")
+    __eq__ = _operation("Equal")
+    __hash__ = None
+
+
+def builders(graph, filename, names):
+    """Namespace with the builder functions names of filename, building graph"""
+
+    def field_operation(name):
+        def build(*args):
+            return Recorder(graph, FIELD_OPERATIONS + name, *args)
+
+        return build
+
+    namespace = {
+        name: field_operation(name)
+        for name in ("Round", "Modulo", "Classify", "Mask", "Where")
+    }
+    with open(os.path.join(PACKAGE, filename)) as f:
+        tree = ast.parse(f.read())
+    functions = [
+        node
+        for node in tree.body
+        if isinstance(node, ast.FunctionDef) and node.name in names
+    ]
+    exec(compile(ast.Module(functions, type_ignores=[]), filename, "exec"), namespace)
+    return namespace
+
+
+def test_season_kernel_equals_graph():
+    plant_months = [7, 8, 9, 10, 11]
+    months_ideal = {
+        "months_ideal_dry_season": [1, 1002, 1003, 1004],
+        "months_ideal_dry_season_early": [1001, 2, 1003, 1004],
+        "months_ideal_dry_season_late": [1001, 1002, 3, 1004],
+        "months_ideal_rainy_season": [1001, 1002, 1003, 4],
+        "months_ideal_rainy_season_early": [1001, 1002, 1003, 1004],
+        "months_ideal_rainy_season_late": [1001, 1002, 1003, 1004],
+    }
+    rng = np.random.default_rng(1)
+    epoch = rng.integers(18000, 19000, 500).astype(float)
+    parcels = pd.DataFrame(
+        {
+            "epoch": epoch,
+            "dry": rng.uniform(100, 200, 500),
+            "rainy": rng.uniform(250, 340, 500),
+            "month": rng.choice([7, 8, 9, 10, 12, np.nan], 500),
+        },
+        index=pd.Index(np.arange(1, 501), name="object_id"),
+    )
+
+    graph = {"parcels": ["geoblocks.geometry.sources.GeoDjangoSource", "a", "b"]}
+    sb = {
+        column: Recorder(
+            graph, "dask_geomodeling.geometry.base.GetSeriesBlock", "parcels", column
+        )
+        for column in parcels.columns
+    }
+    calendar = builders(
+        graph,
+        "patch_calendar_tasks.py",
+        [
+            "season_conditions",
+            "season_state",
+            "ideal_season_state",
+        ],
+    )
+    warning = builders(graph, "patch_warning_based_tasks.py", ["check_rainy_season"])
+    days_until_jan_1 = (
+        calendar["Round"](calendar["Modulo"](sb["epoch"], 365.25)) * -1 + 365.25
+    )
+    conditions = calendar["season_conditions"](days_until_jan_1, sb["dry"], sb["rainy"])
+    season_states = calendar["season_state"](sb["month"], plant_months, months_ideal)
+    calendar.update(season_states)  # ideal_season_state reads them as globals
+    season_state = calendar["ideal_season_state"](season_states, conditions)
+    rainy_season = warning["check_rainy_season"](sb["epoch"], sb["dry"], sb["rainy"])
+    graph["result"] = [
+        "dask_geomodeling.geometry.base.SetSeriesBlock",
+        "parcels",
+        "season_state",
+        season_state.key,
+        "rainy_season",
+        rainy_season.key,
+    ]
+    expected = evaluate.evaluate({"graph": graph, "name": "result"}, parcels)
+
+    result = season.season_kernel(
+        season.day_of_year(parcels["epoch"]),
+        parcels["dry"],
+        parcels["rainy"],
+        parcels["month"],
+        plant_months,
+        months_ideal,
+    )
+    assert np.array_equal(result["season_state"], expected["season_state"])
+    assert np.array_equal(result["rainy_season"], expected["rainy_season"])
+    assert set(np.unique(result["season_state"])) == {0, 100, 200}
+
+    doy = season.day_of_year(parcels["epoch"])
+    days = season.days_until_season_change(doy, parcels["dry"], parcels["rainy"])
+    assert (days > 0).all()
+    # the season state does not change before
+    for offset in range(1, 15):
+        later = season.season_kernel(
+            doy + offset,
+            parcels["dry"],
+            parcels["rainy"],
+            parcels["month"],
+            plant_months,
+            months_ideal,
+        )
+        unchanged = offset < days
+        assert np.array_equal(
+            later["state_season"][unchanged], result["state_season"][unchanged]
+        )
+
+
+def test_season_kernel_broadcasts():
+    months_ideal = {f"months_ideal_{name}": [1] for name in season.IDEAL_STATES}
+    result = season.season_kernel(
+        np.arange(365).reshape(5, 73), 150, 300, 7, [7, 8], months_ideal
+    )
+    assert result["state_season"].shape == (5, 73)
+    rainy = result["rainy_season"].ravel()
+    assert not rainy[150:300].any()
+    assert rainy[300:].all() and rainy[:150].all()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Tests for server.py"""
+
+import threading
+
+import pytest
+import requests
+
+from spiceup_labels import evaluate, server
+
+
+@pytest.fixture
+def lizard(parcels, labelparameters, rasters):
+    parcels["y"] = [-1.0, -2.0, -3.0]
+    local = server.LabeltypeServer(
+        ("localhost", 0),
+        parcels,
+        organisation="G4AW SpiceUp",
+        labelparameters=labelparameters,
+        rasters=rasters,
+    )
+    thread = threading.Thread(target=local.serve_forever, daemon=True)
+    thread.start()
+    yield local
+    local.shutdown()
+    local.server_close()
+
+
+def test_labeltypes(lizard, source, parcels, labelparameters, rasters):
+    url = f"{lizard.url}/api/v3/labeltypes/3d77fb10/"
+    assert requests.get(url).status_code == 404
+    response = requests.patch(url, json={"source": source})
+    assert response.status_code == 200
+    assert float(response.headers["X-Compute-Time"]) >= 0
+    assert requests.get(url).json()["source"] == source
+
+    response = requests.get(url + "compute/?object_id=1,3&time=2020-12-05")
+    results = response.json()["results"]
+    expected = evaluate.evaluate(
+        source, parcels.loc[[1, 3]], labelparameters, rasters, "2020-12-05"
+    )
+    assert [result["object_id"] for result in results] == [1, 3]
+    assert [result["task_1_id"] for result in results] == [10184010.0, None]
+    assert [result["year"] for result in results] == list(expected["year"])
+
+
+def test_parcels_pagination(lizard):
+    url = f"{lizard.url}/api/v3/parcels/?in_bbox=103,-2.5,110,0"
+    first = requests.get(url + "&page=1&page_size=1").json()
+    assert first["count"] == 2
+    assert first["next"] and first["previous"] is None
+    feature = first["results"]["features"][0]
+    assert feature["id"] == 1
+    assert feature["properties"]["organisation"]["name"] == "G4AW SpiceUp"
+    assert feature["geometry"]["coordinates"][0][0] == pytest.approx(
+        [103.99995, -1.00005]
+    )
+    second = requests.get(url + "&page=2&page_size=1").json()
+    assert second["next"] is None
+    assert second["results"]["features"][0]["id"] == 2
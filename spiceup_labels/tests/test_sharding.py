@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Tests for sharding.py"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from spiceup_labels import sharding
+from spiceup_labels.label_writer import read_labels
+
+
+def test_morton_keys():
+    keys = sharding.morton_keys([0, 1, 0, 1], [0, 0, 1, 1], bits=1)
+    assert list(keys) == [0, 1, 2, 3]
+
+
+@pytest.mark.parametrize("bits", [0, 17])
+def test_morton_keys_bits(bits):
+    with pytest.raises(ValueError):
+        sharding.morton_keys([0, 1], [0, 1], bits=bits)
+
+
+@pytest.mark.parametrize("method", ["morton", "grid"])
+def test_shards_are_coherent(method):
+    rng = np.random.default_rng(0)
+    # two clusters of parcels, far apart
+    x = np.concatenate([rng.uniform(100, 101, 50), rng.uniform(110, 111, 50)])
+    y = rng.uniform(-1, 0, 100)
+    parcels = pd.DataFrame(
+        {"x": x, "y": y}, index=pd.Index(range(100), name="object_id")
+    )
+    shards = list(sharding.shard_parcels(parcels, 2, method, cell_size=5.0))
+    assert [len(shard) for key_range, shard in shards] == [50, 50]
+    assert set(shards[0][1].index) | set(shards[1][1].index) == set(range(100))
+    assert shards[0][1]["x"].max() < shards[1][1]["x"].min()
+
+
+def test_split_and_work(tmp_path, source, parcels, labelparameters, rasters):
+    pytest.importorskip("pyarrow")
+    parcels = parcels.drop(columns="id").assign(y=0.0)
+    manifest = sharding.write_shards(parcels, str(tmp_path), 2)
+    assert [shard["parcels"] for shard in manifest["shards"].values()] == [1, 2]
+    path = sharding.process_shard(
+        str(tmp_path),
+        "shard-0001",
+        source,
+        extension=".ndjson",
+        labelparameters=labelparameters,
+        rasters=rasters,
+    )
+    assert list(read_labels(path).index) == [1]
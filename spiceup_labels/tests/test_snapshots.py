@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Tests for snapshots.py"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from spiceup_labels import snapshots
+
+
+def test_snapshot_reader(tmp_path, source, parcels, labelparameters, rasters):
+    pytest.importorskip("pyarrow")
+    kwargs = dict(labelparameters=labelparameters, rasters=rasters)
+    directory = str(tmp_path)
+    for day in ("2020-12-04", "2020-12-05", "2020-12-06"):
+        metadata = snapshots.write_snapshot(
+            source, parcels.loc[[1, 2]], directory, "calendar", day, keep=2, **kwargs
+        )
+    assert metadata["version"] == "20201206T000000"
+    assert len(os.listdir(tmp_path / "calendar")) == 3  # 2 versions + current
+
+    new_parcel = pd.DataFrame(
+        {"id": [3], "code": ["c"], "x": [106.0]},
+        index=pd.Index([3], name="object_id"),
+    )
+    reader = snapshots.SnapshotReader(
+        directory, "calendar", source, parcels=new_parcel, time="2020-12-06", **kwargs
+    )
+    assert reader.version == "20201206T000000"
+    assert reader.get(1)["year"] == 1.0
+    labels = reader.lookup([2, 3, 4])
+    assert sorted(labels) == [2, 3]
+    assert labels[3]["year"] == 3.0  # computed live
+    assert labels[3].keys() == labels[2].keys()
+
+    # labels are valid for a day (the epoch raster updates daily)
+    assert labels[2]["valid_until"] == pd.Timestamp("2020-12-07")
+    reader.parcels = parcels
+    assert reader.lookup([2], "2020-12-06T23:00")[2]["year"] == 2.0
+    labels = reader.lookup([2], "2020-12-07")  # expired, computed live
+    assert labels[2]["valid_until"] == pd.Timestamp("2020-12-08")
+
+    # a posted labelparameter the labels depend on
+    changes = [{"object_id": 1, "name": "days_plant_age"}]
+    assert list(reader.invalidate(changes)) == [1]
+    reader.parcels = parcels.loc[[2]]
+    assert reader.get(1, "2020-12-06") is None  # not served from the snapshot
+
+    # a snapshot of another graph is not served
+    other = dict(source, name="doy_now")
+    assert snapshots.SnapshotReader(directory, "calendar", other).get(1) is None
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Tests for sweep.py"""
+
+import copy
+
+import numpy as np
+
+from spiceup_labels import evaluate, sweep
+
+
+def test_sweep_fingerprint(source, parcels, labelparameters, epoch_raster):
+    domain = {
+        "labelparameters": {
+            "days_plant_age": {"start": 0, "stop": 1200, "step": 7},
+            "pepper_variety": [1, 7],
+        },
+        "rasters": {epoch_raster: [18600.0, 18700.0]},
+        "time": "2020-12-05",
+    }
+    assert sweep.domain_size(domain) == 172 * 2 * 2
+    tables = list(sweep.sweep(source, domain, block_size=100))
+    assert [len(table) for table in tables[:2]] == [100, 100]
+    assert sum(len(table) for table in tables) == 688
+    # a combination equals evaluating it as a parcel
+    lp, rasters = sweep.combinations(domain, 101, 102)
+    assert lp["days_plant_age"].tolist() == [175]
+    assert lp["pepper_variety"].tolist() == [1]
+    assert rasters[epoch_raster].tolist() == [18700.0]
+    one = labelparameters[labelparameters["object_id"] == 2].copy()
+    one["value"] = [175.0, 1.0]
+    expected = evaluate.evaluate(
+        source, parcels.loc[[2]], one, {epoch_raster: 18700.0}, "2020-12-05"
+    )
+    assert tables[1]["task_1_id"].iloc[1] == expected["task_1_id"].iloc[0]
+
+    before = sweep.fingerprint(sweep.sweep(source, domain))
+    assert before == sweep.fingerprint(tables)  # independent of block size
+    assert sweep.compare_fingerprints(before, before) == []
+
+    changed = copy.deepcopy(source)
+    changed["graph"]["plant_year"][2] = [400, 1095]
+    after = sweep.fingerprint(sweep.sweep(changed, domain))
+    assert sweep.compare_fingerprints(before, after) == ["age_01", "year"]
+    assert before["fingerprint"] != after["fingerprint"]
+    assert not np.isnan(tables[0]["year"]).any()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Tests for timeline.py"""
+
+import numpy as np
+import pandas as pd
+
+from spiceup_labels import evaluate, timeline
+
+
+def test_evaluate_date_range(source, parcels, labelparameters, epoch_raster):
+    update = {
+        "object_id": 1,
+        "label_type": labelparameters["label_type"][0],
+        "name": "days_plant_age",
+        "value": 400.0,
+        "start": pd.Timestamp("2020-06-01"),
+        "end": pd.NaT,
+    }
+    labelparameters = pd.concat(
+        [labelparameters, pd.DataFrame([update])], ignore_index=True
+    )
+    rasters = {epoch_raster: lambda parcels, time: evaluate.days_since_epoch(time)}
+    dates = pd.date_range("2020-05-30", periods=4)
+    labels = timeline.evaluate_date_range(
+        source, parcels, dates, labelparameters=labelparameters, rasters=rasters
+    )
+    assert len(labels) == 12
+    assert list(labels.loc[1, "year"]) == [1.0, 1.0, 2.0, 2.0]
+    # the same as evaluating each date separately
+    for date in dates:
+        expected = evaluate.evaluate(
+            source, parcels, labelparameters, rasters, time=date
+        )
+        day = labels.xs(date, level="time")
+        pd.testing.assert_frame_equal(day, expected, check_names=False)
+
+    periods = timeline.task_timeline(labels, ["year"])
+    assert list(periods["object_id"]) == [1, 1, 2, 3]
+    assert list(periods["start"]) == list(dates[[0, 2, 0, 0]])
+    assert list(periods["end"]) == [dates[2]] + [pd.Timestamp("2020-06-03")] * 3
+
+
+def test_task_timeline():
+    dates = pd.date_range("2020-12-01", periods=4)
+    index = pd.MultiIndex.from_product([[1, 2], dates], names=["object_id", "time"])
+    labels = pd.DataFrame(
+        {
+            "task": ["a", "a", "b", "b", None, None, "c", "c"],
+            "task_id": [1.0, 1.0, 2.0, 3.0, np.nan, np.nan, 4.0, 4.0],
+        },
+        index=index,
+    ).iloc[
+        ::-1
+    ]  # the order of the labels does not matter
+    periods = timeline.task_timeline(labels, ["task", "task_id"])
+    assert list(periods.columns) == ["object_id", "start", "end", "task", "task_id"]
+    assert list(periods["object_id"]) == [1, 1, 1, 2, 2]
+    assert list(periods["start"]) == list(dates[[0, 2, 3, 0, 2]])
+    assert list(periods["end"]) == list(dates[[2, 3]]) + [
+        pd.Timestamp("2020-12-05"),
+        dates[2],
+        pd.Timestamp("2020-12-05"),
+    ]
+    assert list(periods["task"][:3]) == ["a", "b", "b"]
+    assert pd.isna(periods["task"][3])  # missing values form one period
+
+    # a single column
+    periods = timeline.task_timeline(labels, ["task"])
+    assert list(periods["start"]) == list(dates[[0, 2, 0, 2]])
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Tests for tracing.py"""
+
+import numpy as np
+import pandas as pd
+
+from spiceup_labels import evaluate, label_writer, tracing
+
+
+def test_sampled_is_stable():
+    object_ids = np.arange(100000)
+    mask = tracing.sampled(object_ids, rate=0.01, include=[3])
+    assert 800 < mask.sum() < 1200
+    assert mask[3]
+    np.testing.assert_array_equal(
+        mask[:500], tracing.sampled(object_ids[:500], 0.01, [3])
+    )
+
+
+def test_tracer(tmp_path, source, parcels, labelparameters, rasters):
+    kwargs = dict(labelparameters=labelparameters, rasters=rasters)
+    tracer = tracing.Tracer(object_ids=[2])
+    result = tracer.evaluate(source, parcels, **kwargs)
+    pd.testing.assert_frame_equal(result, evaluate.evaluate(source, parcels, **kwargs))
+    # a chunk without sampled parcels is not traced
+    tracer.evaluate(source, parcels.loc[[1, 3]], **kwargs)
+    table = tracer.table()
+    assert set(table.index) == {2}
+    values = table.set_index("key")["value"]
+    assert values["age_sb"] == "800.0"
+    assert values["plant_year"] == "2.0"
+    path = tmp_path / "trace.ndjson"
+    assert tracer.write(path) == len(table)
+    assert len(label_writer.read_labels(path)) == len(table)
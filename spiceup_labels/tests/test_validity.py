@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Tests for validity.py"""
+
+import pandas as pd
+
+from spiceup_labels import evaluate, validity
+
+
+def test_valid_until(source, parcels, labelparameters, rasters, epoch_raster):
+    time = pd.Timestamp("2020-12-05T10:00")
+    labels = evaluate.evaluate(source, parcels, labelparameters, rasters, time)
+    assert validity.raster_uuids(source) == {epoch_raster}
+
+    # the epoch raster is assumed to update daily
+    until = validity.valid_until(source, labels, time, labelparameters)
+    assert (until == pd.Timestamp("2020-12-06")).all()
+
+    labels["days_until_next_task"] = [3.0, 40.5, None]
+    lp = labelparameters.copy()
+    lp.loc[lp["object_id"] == 2, "end"] = pd.Timestamp("2021-01-01")
+    raster_updates = {epoch_raster: None}
+    # calendar tasks depend on the season: without onsets valid for today
+    until = validity.valid_until(source, labels, time, lp, raster_updates)
+    assert (until == pd.Timestamp("2020-12-06")).all()
+
+    # 2020-12-05 is day of year 338 (of the 365.25 day years of the labeltypes)
+    onsets = pd.DataFrame(
+        {"dry": [38.0, 38.0, 38.0], "rainy": [320.0, 328.0, 320.0]},
+        index=pd.Index([1, 2, 3], name="object_id"),
+    )
+    until = validity.valid_until(source, labels, time, lp, raster_updates, onsets)
+    assert until.name == "valid_until"
+    assert until.to_dict() == {
+        1: pd.Timestamp("2020-12-08"),  # next task
+        2: pd.Timestamp("2020-12-09"),  # season change before end and next task
+        3: pd.Timestamp("2020-12-06"),  # unknown next task: today only
+    }
+    raster_updates = {epoch_raster: "2020-12-07T06:00"}
+    until = validity.valid_until(source, labels, time, lp, raster_updates, onsets)
+    assert until[2] == pd.Timestamp("2020-12-07T06:00")
+
+    # other labeltypes (e.g. weather): the raster inputs give the horizon
+    labels = labels.drop(columns=list(validity.HORIZON_COLUMNS))
+    raster_updates = {epoch_raster: "2020-12-09T06:00"}
+    until = validity.valid_until(source, labels, time, None, raster_updates)
+    assert (until == pd.Timestamp("2020-12-09T06:00")).all()
+
+    # no horizon at all
+    until = validity.valid_until(source, labels, time, None, {epoch_raster: None})
+    assert until.isna().all()
+
+
+def test_season_horizon():
+    onsets = pd.DataFrame({"dry": [38.0], "rainy": [328.0]}, index=[1])
+    time = pd.Timestamp("2020-12-05T10:00")
+    until = validity.season_horizon(time, onsets, pd.Index([1, 2]))
+    assert until[0] == pd.Timestamp("2020-12-09")  # 14 days after rainy onset
+    assert until[1] == pd.Timestamp("2020-12-06")  # unknown onsets: today only
+
+
+def test_valid_until_clock(clock_source, parcels, labelparameters):
+    clock = clock_source
+    assert validity.raster_uuids(clock) == set()
+    labels = evaluate.evaluate(clock, parcels, labelparameters, time="2020-12-05")
+    until = validity.valid_until(clock, labels, "2020-12-05T10:00")
+    assert (until == pd.Timestamp("2020-12-06")).all()  # the time changes daily
+    labels["days_until_next_task"] = 10
+    onsets = pd.DataFrame({"dry": 38.0, "rainy": 320.0}, index=labels.index)
+    until = validity.valid_until(clock, labels, "2020-12-05T10:00", None, None, onsets)
+    assert (until == pd.Timestamp("2020-12-15")).all()
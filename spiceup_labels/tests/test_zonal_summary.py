@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Tests for zonal_summary.py"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from spiceup_labels import zonal_summary
+
+
+def test_region_groups():
+    geopandas = pytest.importorskip("geopandas")
+    from shapely.geometry import box
+
+    regions = geopandas.GeoDataFrame(
+        {"name": ["lampung", "bangka"]},
+        geometry=[box(104, -6, 106, -4), box(105, -3, 107, -1)],
+    )
+    parcels = pd.DataFrame(
+        {"x": [104.5, 105.5, 110.0], "y": [-5.0, -2.0, 0.0]},
+        index=pd.Index([1, 2, 3], name="object_id"),
+    )
+    groups = zonal_summary.region_groups(parcels, regions)
+    assert list(groups[:2]) == ["lampung", "bangka"]
+    assert pd.isna(groups[3])
+
+
+def test_incremental_summary():
+    groups = pd.Series(["a", "a", "b", None], index=[1, 2, 3, 4])
+    summary = zonal_summary.ZonalSummary(["score"], ["risk"])
+    chunks = [
+        pd.DataFrame({"score": [1.0, np.nan], "risk": ["low", "high"]}, index=[1, 2]),
+        pd.DataFrame({"score": [4.0, 5.0], "risk": ["low", "low"]}, index=[3, 4]),
+    ]
+    for chunk in chunks:
+        summary.update(chunk, groups)
+    result = summary.result()
+    assert list(result.index) == ["a", "b"]
+    assert list(result["parcels"]) == [2, 1]
+    assert list(result["score_count"]) == [1, 1]
+    assert list(result["score_mean"]) == [1.0, 4.0]
+    assert list(result["risk=low"]) == [1, 1]
+    assert list(result["risk=high"]) == [1, 0]
+    # the same as summarizing all at once
+    at_once = zonal_summary.ZonalSummary(["score"], ["risk"])
+    pd.testing.assert_frame_equal(
+        at_once.update(pd.concat(chunks), groups).result(), result
+    )
+
+
+def test_organisation_groups_from_shapefile(tmp_path):
+    geopandas = pytest.importorskip("geopandas")
+    from shapely.geometry import Point
+
+    from spiceup_labels.local_data import read_parcels
+
+    path = tmp_path / "parcels.shp"
+    geopandas.GeoDataFrame(
+        {"id": [1, 2], "organisation": ["G4AW SpiceUp", "other"]},
+        geometry=[Point(105, -5), Point(106, -2)],
+        crs="EPSG:4326",
+    ).to_file(path)
+    parcels = read_parcels(str(path))
+    assert "organisation" not in parcels  # truncated to organisati
+    groups = zonal_summary.organisation_groups(parcels)
+    assert groups.to_dict() == {1: "G4AW SpiceUp", 2: "other"}
+    groups = zonal_summary.organisation_groups(parcels, "organisati")
+    assert groups.to_dict() == {1: "G4AW SpiceUp", 2: "other"}
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Evaluate labeltypes over a date range in one vectorized pass.
+
+Each parcel is repeated for every date, so the time becomes an axis of the
+parcel table (indexed by object_id and time): the days since epoch raster
+(days_since_epoch_raster_sb) and the labelparameter validity are evaluated
+per row. One evaluation gives the task timeline of every parcel, e.g. the
+crop calendar tasks of the coming season.
+"""
+
+import numpy as np
+import pandas as pd
+
+from spiceup_labels.evaluate import as_timestamp, evaluate
+
+
+def date_range_parcels(parcels, dates):
+    """Parcels repeated for each date, indexed by (object_id, time)"""
+    dates = as_timestamp(pd.DatetimeIndex(dates))
+    rows = np.repeat(np.arange(len(parcels)), len(dates))
+    table = parcels.iloc[rows]
+    table.index = pd.MultiIndex.from_arrays(
+        [parcels.index[rows], np.tile(dates, len(parcels))],
+        names=[parcels.index.name or "object_id", "time"],
+    )
+    return table
+
+
+def evaluate_date_range(source, parcels, dates, **kwargs):
+    """Evaluate a labeltype for every parcel at every date.
+
+    dates is anything pd.DatetimeIndex accepts, e.g.
+    pd.date_range("2021-01-01", periods=365). Raster samplers receive a
+    DatetimeIndex with the time per row. Returns the label table indexed by
+    (object_id, time). kwargs are passed to evaluate."""
+    table = date_range_parcels(parcels, dates)
+    times = table.index.get_level_values("time")
+    return evaluate(source, table, time=times, **kwargs)
+
+
+def task_timeline(labels, columns):
+    """Collapse daily labels to periods in which columns stay the same.
+
+    labels is a result of evaluate_date_range. Returns a table with per parcel
+    and period the start and end (exclusive) time and the column values."""
+    labels = labels.sort_index()
+    object_ids = labels.index.get_level_values(0).to_numpy()
+    times = labels.index.get_level_values("time")
+    values = labels[columns]
+    shifted = values.shift(1)
+    changed = ~((values == shifted) | (values.isna() & shifted.isna())).all(axis=1)
+    changed = changed.to_numpy() | np.r_[True, object_ids[1:] != object_ids[:-1]]
+    starts = np.flatnonzero(changed)
+    ends = np.r_[starts[1:], len(labels)]
+    unique = times.unique().sort_values()
+    step = unique[1] - unique[0] if len(unique) > 1 else pd.Timedelta(days=1)
+    timeline = values.iloc[starts].reset_index()
+    timeline = timeline.rename(columns={"time": "start"})
+    timeline.insert(2, "end", times[ends - 1] + step)
+    return timeline
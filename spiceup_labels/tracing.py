@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Trace intermediate block values of sampled parcels, for debugging labels.
+
+When a farmer reports a wrong task, the intermediate values that led to it
+(plant_age_sb, state_season, identified_task_1, ...) explain why. A Tracer
+evaluates a labeltype like spiceup_labels.evaluate does, and records the
+series block outputs for a sample of parcels: a given list of object ids
+and/or a fraction of all parcels. The sample is a stable hash of the object
+id, so the same parcels are traced in every run.
+
+Chunks without sampled parcels are evaluated without a hook, so untraced
+parcels cost (next to) nothing. The trace is a long table (object_id, [time,]
+key, block, value) written with spiceup_labels.label_writer.
+"""
+
+import numpy as np
+import pandas as pd
+
+from spiceup_labels.evaluate import block_name, evaluate
+from spiceup_labels.label_writer import write_labels
+
+SAMPLE_BUCKETS = 1000000
+
+
+def sampled(object_ids, rate=0.0, include=()):
+    """Boolean mask of object_ids in the (stable, hash based) sample"""
+    object_ids = np.asarray(object_ids)
+    mask = np.isin(object_ids, list(include))
+    if rate > 0:
+        hashes = pd.util.hash_array(object_ids.astype("int64"), categorize=False)
+        mask |= hashes % SAMPLE_BUCKETS < rate * SAMPLE_BUCKETS
+    return mask
+
+
+class Tracer:
+    """Evaluate labeltypes, tracing the series blocks of sampled parcels"""
+
+    def __init__(self, rate=0.0, object_ids=(), keys=None):
+        self.rate = rate
+        self.object_ids = set(object_ids)
+        self.keys = None if keys is None else set(keys)
+        self.traced_ids = None
+        self.traces = []
+
+    def evaluate(self, source, parcels, **kwargs):
+        """evaluate(source, parcels, **kwargs), tracing the sampled parcels"""
+        mask = sampled(parcels.index, self.rate, self.object_ids)
+        if not mask.any():
+            return evaluate(source, parcels, **kwargs)
+        self.traced_ids = parcels.index[mask]
+        try:
+            return evaluate(source, parcels, hook=self, **kwargs)
+        finally:
+            self.traced_ids = None
+
+    def __call__(self, key, path, compute):
+        result = compute()
+        if not isinstance(result, pd.Series):
+            return result
+        if self.keys is not None and key not in self.keys:
+            return result
+        selected = result[result.index.get_level_values(0).isin(self.traced_ids)]
+        trace = pd.DataFrame(
+            {
+                "key": key,
+                "block": block_name(path),
+                "value": selected.astype(str).to_numpy(),
+            },
+            index=selected.index,
+        )
+        self.traces.append(trace)
+        return result
+
+    def table(self):
+        """The trace: key, block and value (as text) per traced parcel"""
+        if not self.traces:
+            return pd.DataFrame(
+                columns=["key", "block", "value"],
+                index=pd.Index([], name="object_id"),
+            )
+        return pd.concat(self.traces)
+
+    def write(self, path):
+        """Write the trace (.parquet, .arrow, .ndjson), return the row count"""
+        return write_labels(self.traces or [self.table()], path)
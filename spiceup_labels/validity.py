@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Until when computed labels stay valid.
+
+Labels only change when one of their inputs changes: the crop calendar task
+at the next task boundary (days_until_next_task), the season state at the
+next season condition boundary (computed from the season onsets with
+season.days_until_season_change), raster based labels when a raster
+publishes a new timestamp and all labels when a labelparameter they are
+computed from ends or a new one starts. Labels read from a clock input
+(DaysSinceEpoch) without horizon columns change daily.
+valid_until gives per parcel the earliest of these, so serving layers and
+caches (see result_cache.horizon_evaluate and snapshots) recompute a parcel
+only after that horizon instead of daily.
+"""
+
+import numpy as np
+import pandas as pd
+
+from spiceup_labels.evaluate import as_timestamp, block_name, days_since_epoch
+from spiceup_labels.incremental import labelparameter_columns
+from spiceup_labels.season import day_of_year, days_until_season_change
+
+VALID_UNTIL = "valid_until"
+
+# label columns with the (whole or fractional) days until the labels change
+HORIZON_COLUMNS = ("days_until_next_task",)
+
+# label columns of labeltypes of which the labels depend on the season state
+SEASON_COLUMNS = ("days_until_next_task",)
+
+
+def raster_uuids(source):
+    """Uuids of the rasters a labeltype source reads"""
+    return {
+        args[0]
+        for path, *args in source["graph"].values()
+        if block_name(path) == "LizardRasterSource"
+    }
+
+
+def has_clock_input(source):
+    """Whether a labeltype source reads the time through a clock input"""
+    return any(
+        block_name(path) == "DaysSinceEpoch" for path, *args in source["graph"].values()
+    )
+
+
+def next_raster_update(source, time, raster_updates=None):
+    """Earliest next update of the rasters of source after time.
+
+    raster_updates has per raster uuid the time of its next update, or None
+    for rasters that never update or of which the time dependency is covered
+    by the horizon columns (the days since epoch raster of the calendar
+    labeltype). Other rasters are assumed to update daily. NaT if none of
+    the rasters updates."""
+    raster_updates = raster_updates or {}
+    tomorrow = time.normalize() + pd.Timedelta(days=1)
+    updates = [
+        as_timestamp(raster_updates[uuid]) if uuid in raster_updates else tomorrow
+        for uuid in raster_uuids(source)
+        if uuid not in raster_updates or raster_updates[uuid] is not None
+    ]
+    return min(updates, default=pd.NaT)
+
+
+def labelparameter_changes(source, labelparameters, time):
+    """Per object_id the next start or end after time of the labelparameters
+    the source joins"""
+    names = set(labelparameter_columns(source).values())
+    if labelparameters is None or isinstance(labelparameters, dict) or not names:
+        return pd.Series(dtype="datetime64[ns]")
+    records = labelparameters[labelparameters["name"].isin(names)]
+    changes = pd.concat(
+        [
+            pd.DataFrame({"object_id": records["object_id"], "time": records[column]})
+            for column in ("start", "end")
+        ]
+    )
+    changes["time"] = pd.to_datetime(changes["time"])
+    changes = changes[changes["time"] > time]
+    return changes.groupby("object_id")["time"].min()
+
+
+def season_horizon(time, season_onsets, object_ids):
+    """Per object_id the start of the day the season state can change first.
+
+    season_onsets has per object_id the dry and rainy season onset (day of
+    year, the values of the season onset rasters)."""
+    today = as_timestamp(time).normalize()
+    onsets = season_onsets.reindex(object_ids)
+    doy = day_of_year(days_since_epoch(today))
+    days = days_until_season_change(doy, onsets["dry"], onsets["rainy"])
+    return today + pd.to_timedelta(_whole_days(days), unit="D")
+
+
+def _whole_days(days):
+    """Days rounded up, at least 1 (also for unknown days)"""
+    days = np.ceil(pd.to_numeric(days, errors="coerce"))
+    return np.where(days >= 1, days, 1)
+
+
+def _earliest(times, other):
+    """Elementwise earliest of two datetime Series, ignoring NaT"""
+    return times.where(times.notna() & ~(other < times), other)
+
+
+def valid_until(
+    source,
+    labels,
+    time=None,
+    labelparameters=None,
+    raster_updates=None,
+    season_onsets=None,
+):
+    """Per parcel (the index of labels) the time until which labels are valid.
+
+    labels are computed by source at time (a single time), of any labeltype:
+    the raster, clock and labelparameter inputs of the source limit the
+    horizon, and the horizon columns of the labels if it has them. Horizon
+    columns count from the start of that day, an unknown horizon means valid
+    for today only. Labels of labeltypes that depend on the season state
+    (SEASON_COLUMNS) are valid until the season can change, see
+    season_horizon, or for today only without season_onsets. NaT means the
+    labels stay valid until an input changes that valid_until does not know
+    of, e.g. a newly posted labelparameter (see
+    result_cache.invalidate_changes and SnapshotReader.invalidate)."""
+    time = as_timestamp(time)
+    today = time.normalize()
+    tomorrow = pd.Series(today + pd.Timedelta(days=1), index=labels.index)
+    horizon = pd.Series(
+        next_raster_update(source, time, raster_updates), index=labels.index
+    ).astype("datetime64[ns]")
+    horizon_columns = [column for column in HORIZON_COLUMNS if column in labels]
+    if has_clock_input(source) and not horizon_columns:
+        horizon = _earliest(horizon, tomorrow)
+    for column in horizon_columns:
+        days = _whole_days(labels[column].to_numpy())
+        until = today + pd.to_timedelta(days, unit="D")
+        horizon = _earliest(horizon, pd.Series(until, index=labels.index))
+    object_ids = labels.index.get_level_values(0)
+    if any(column in labels for column in SEASON_COLUMNS):
+        if season_onsets is None:
+            horizon = _earliest(horizon, tomorrow)
+        else:
+            until = season_horizon(time, season_onsets, object_ids)
+            horizon = _earliest(horizon, pd.Series(until, index=labels.index))
+    changes = labelparameter_changes(source, labelparameters, time)
+    if len(changes):
+        change = changes.reindex(object_ids).to_numpy()
+        horizon = _earliest(horizon, pd.Series(change, index=labels.index))
+    return horizon.rename(VALID_UNTIL)
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Summarize per parcel labels per organisation or region, for dashboards.
+
+The B2B labeltypes (GAP compliance, suitability and risk filters) are viewed
+as summaries per organisation or region. A ZonalSummary accumulates label
+tables chunk by chunk (e.g. the files of a backfill or snapshot), grouped by
+a group per parcel: the organisation column of the parcels (as extracted by
+get_parcels.py) or the region polygon a parcel lies in (found with a
+shapely STRtree). Per group it counts parcels, takes means of numeric
+columns and histograms of categorical columns. Dashboards read the result
+instead of scanning all parcels per view.
+"""
+
+import argparse
+import logging
+
+import numpy as np
+import pandas as pd
+
+from spiceup_labels.label_writer import read_labels, write_labels
+from spiceup_labels.local_data import read_parcels
+
+logger = logging.getLogger(__name__)
+
+
+def region_groups(parcels, regions, id_column="name"):
+    """Region id per parcel (Series indexed by object_id), of the region
+    polygon (rows of a GeoDataFrame) that contains the parcel location"""
+    import shapely
+
+    tree = shapely.STRtree(regions.geometry.to_numpy())
+    points = shapely.points(parcels["x"].to_numpy(), parcels["y"].to_numpy())
+    parcel, region = tree.query(points, predicate="within")
+    first = np.unique(parcel, return_index=True)[1]  # the first region
+    groups = pd.Series(np.nan, index=parcels.index, dtype=object)
+    groups.iloc[parcel[first]] = regions[id_column].to_numpy()[region[first]]
+    return groups
+
+
+# shapefiles truncate column names to 10 characters, see get_parcels.py
+ORGANISATION_COLUMNS = ("organisation", "organisati")
+
+
+def organisation_groups(parcels, column=None):
+    """Organisation per parcel (Series indexed by object_id), from column or
+    the first of ORGANISATION_COLUMNS in parcels"""
+    if column is None:
+        column = next(
+            (column for column in ORGANISATION_COLUMNS if column in parcels),
+            ORGANISATION_COLUMNS[0],
+        )
+    return parcels[column]
+
+
+class ZonalSummary:
+    """Counts, means and histograms of label columns per group"""
+
+    def __init__(self, numeric=(), categorical=()):
+        self.numeric = list(numeric)
+        self.categorical = list(categorical)
+        self.parcels = pd.Series(dtype=float)
+        self.sums = pd.DataFrame(columns=self.numeric, dtype=float)
+        self.counts = pd.DataFrame(columns=self.numeric, dtype=float)
+        self.histograms = {column: None for column in categorical}
+
+    def update(self, labels, groups):
+        """Add a label table, groups is the group per object_id"""
+        group = groups.reindex(labels.index.get_level_values(0)).to_numpy()
+        grouped = pd.notna(group)
+        labels, group = labels[grouped], group[grouped]
+        self.parcels = self.parcels.add(pd.Series(group).value_counts(), fill_value=0)
+        values = labels[self.numeric].astype(float).set_axis(group)
+        self.sums = self.sums.add(values.groupby(level=0).sum(), fill_value=0)
+        self.counts = self.counts.add(
+            values.notna().groupby(level=0).sum(), fill_value=0
+        )
+        for column in self.categorical:
+            histogram = pd.DataFrame(
+                {"group": group, "value": labels[column].to_numpy()}
+            ).value_counts()
+            if self.histograms[column] is not None:
+                histogram = self.histograms[column].add(histogram, fill_value=0)
+            self.histograms[column] = histogram
+        return self
+
+    def result(self):
+        """Table per group with parcels, <column>_count, <column>_mean and
+        a <column>=<value> count per category"""
+        table = pd.DataFrame({"parcels": self.parcels.astype("int64")})
+        table.index.name = "group"
+        for column in self.numeric:
+            counts = self.counts[column].reindex(table.index, fill_value=0)
+            sums = self.sums[column].reindex(table.index, fill_value=0)
+            table[f"{column}_count"] = counts.astype("int64")
+            table[f"{column}_mean"] = sums / counts.where(counts > 0)
+        for column, histogram in self.histograms.items():
+            if histogram is None:
+                continue
+            histogram = histogram.unstack("value", fill_value=0)
+            histogram = histogram.reindex(table.index, fill_value=0).astype("int64")
+            for value in sorted(histogram.columns, key=str):
+                table[f"{column}={value}"] = histogram[value]
+        return table.sort_index()
+
+
+def get_parser():
+    """Return argument parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("parcels", help="parcels (.shp, .geojson, .csv, .parquet)")
+    parser.add_argument("output", help="summary table (.parquet, .ndjson)")
+    parser.add_argument("labels", nargs="+", help="label tables")
+    parser.add_argument(
+        "-r",
+        "--regions",
+        default=None,
+        help="region polygons (default by organisation)",
+    )
+    parser.add_argument("--region-id", default="name", help="region id column")
+    parser.add_argument(
+        "--organisation",
+        default=None,
+        help="organisation column of the parcels (default organisation, or "
+        "organisati in shapefiles)",
+    )
+    parser.add_argument("-n", "--numeric", nargs="*", default=[])
+    parser.add_argument("-c", "--categorical", nargs="*", default=[])
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        dest="verbose",
+        default=False,
+        help="Verbose output",
+    )
+    return parser
+
+
+def main():  # pragma: no cover
+    """Summarize label tables per organisation or region"""
+    options = get_parser().parse_args()
+    log_level = logging.DEBUG if options.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(levelname)s: %(message)s")
+    parcels = read_parcels(options.parcels)
+    if options.regions:
+        import geopandas
+
+        regions = geopandas.read_file(options.regions)
+        groups = region_groups(parcels, regions, options.region_id)
+    else:
+        groups = organisation_groups(parcels, options.organisation)
+    summary = ZonalSummary(options.numeric, options.categorical)
+    for path in options.labels:
+        logger.debug("adding %s", path)
+        summary.update(read_labels(path), groups)
+    result = summary.result()
+    write_labels([result], options.output)
+    logger.info("%s groups written to %s", len(result), options.output)
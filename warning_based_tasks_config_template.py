@@ -11,6 +11,7 @@ from dask_geomodeling.geometry import *
 from dask_geomodeling.geometry.aggregate import AggregateRaster
 from dask_geomodeling.geometry.base import GetSeriesBlock, SetSeriesBlock
 from oauth2client.service_account import ServiceAccountCredentials
+from spiceup_labels.config_lizard import labelparameter_blocks
 
 labeltype_uuid = "lizard_uuid"  # e.g. "025a748d-4507-4b13-98af-ecae696bbeac"
 
@@ -85,30 +86,17 @@ labeled_parcels = {
     ]
 }
 
-add_to = "parcels"
-for lp in labelparams:
-    if lp == labelparams[-1]:
-        key = "parcels_labeled"
-    else:
-        key = f"parcels_add_{lp}"
-    if lp in general_labelparams:
-        param_labeltype_uuid = "3ab1addf-00e5-47b0-849e-ba55cd3024b9"
-    else:  # labelparam is in warning_labelparams
-        param_labeltype_uuid = (
-            labeltype_uuid  # i.e. "025a748d-4507-4b13-98af-ecae696bbeac"
-        )
-    labeled_parcels[key] = [
-        "geoblocks.geometry.sources.AddDjangoFields",
-        add_to,
-        "lizard_nxt",
-        "labelparameter",
-        {"label_type__uuid": param_labeltype_uuid, "name": lp},
-        {"object_id": "object_id"},
-        {"value": lp},
-        "start",
-        "end",
-    ]
-    add_to = key
+# general labelparams & warning labelparams have different labeltype uuids
+param_labeltype_uuids = {
+    lp: (
+        "3ab1addf-00e5-47b0-849e-ba55cd3024b9"
+        if lp in general_labelparams
+        else labeltype_uuid  # i.e. "025a748d-4507-4b13-98af-ecae696bbeac"
+    )
+    for lp in labelparams
+}
+# a chain of AddDjangoFields blocks, one join per labelparameter
+labeled_parcels.update(labelparameter_blocks(labelparams, param_labeltype_uuids))
 
 # # Option to write warning tasks to file
 # condition_cols = [col for col in warning_tasks.columns if 'condition' in col][:-1]